@@ -1,6 +1,7 @@
 # app/core/config.py
 
 import os
+import tempfile
 from pydantic import BaseModel, Field, AnyHttpUrl
 from dotenv import load_dotenv
 
@@ -22,6 +23,42 @@ class Settings(BaseModel):
     EMBEDDINGS_MODEL: str = os.getenv("EMBEDDINGS_MODEL", "nvidia/nv-embedqa-e5-v5")
     EMBEDDINGS_DIM: int = int(os.getenv("EMBEDDINGS_DIM", "1024"))
 
+    # Chunking
+    CHUNKER_DEFAULT: str = os.getenv("CHUNKER_DEFAULT", "sentence")
+    CHUNKER_BY_EXT: str = os.getenv("CHUNKER_BY_EXT", '{".xls": "rows", ".xlsx": "rows"}')
+    CHUNK_MAX_TOKENS: int = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+    CHUNK_OVERLAP_TOKENS: int = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+
+    # Parseo de documentos (pool de procesos)
+    PARSE_WORKERS: int = int(os.getenv("PARSE_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))
+    PARSE_TIMEOUT: float = float(os.getenv("PARSE_TIMEOUT", "300"))
+    PARSE_PDF_PAGES_PER_TASK: int = int(os.getenv("PARSE_PDF_PAGES_PER_TASK", "20"))
+
+    # Caché de parseo + embeddings por hash de archivo
+    PARSE_CACHE_ENABLED: bool = os.getenv("PARSE_CACHE_ENABLED", "true").lower() == "true"
+    PARSE_CACHE_DIR: str = os.getenv("PARSE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "altheia_parse_cache"))
+    PARSE_CACHE_MAX_MB: int = int(os.getenv("PARSE_CACHE_MAX_MB", "2048"))
+
+    # Pipeline de ingesta (colas acotadas)
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+    INGEST_EMBED_BATCH: int = int(os.getenv("INGEST_EMBED_BATCH", "32"))
+    INGEST_PROGRESS_INTERVAL: float = float(os.getenv("INGEST_PROGRESS_INTERVAL", "1"))
+
+    # Uploads
+    UPLOAD_MAX_MB: int = int(os.getenv("UPLOAD_MAX_MB", "100"))
+    UPLOAD_BLOCK_SIZE: int = int(os.getenv("UPLOAD_BLOCK_SIZE", str(1024 * 1024)))
+
+    # Jobs de ingesta asíncronos (Redis Streams)
+    INGEST_SPOOL_DIR: str = os.getenv("INGEST_SPOOL_DIR", tempfile.gettempdir())  # compartido entre nodos
+    INGEST_STREAM: str = os.getenv("INGEST_STREAM", "ingest:jobs")
+    INGEST_GROUP: str = os.getenv("INGEST_GROUP", "ingest-workers")
+    INGEST_LOCAL_WORKERS: int = int(os.getenv("INGEST_LOCAL_WORKERS", "1"))  # workers dentro del API
+    INGEST_CLAIM_IDLE_MS: int = int(os.getenv("INGEST_CLAIM_IDLE_MS", "120000"))
+
+    # Escritura diferida de mensajes de chat (INSERT multi-fila)
+    CHAT_WRITE_FLUSH_MS: float = float(os.getenv("CHAT_WRITE_FLUSH_MS", "10"))
+    CHAT_WRITE_BATCH: int = int(os.getenv("CHAT_WRITE_BATCH", "200"))
+
     # Milvus
     MILVUS_HOST: str = os.getenv("MILVUS_HOST", "127.0.0.1")    
     MILVUS_PORT: str = os.getenv("MILVUS_PORT", "19530")
@@ -30,6 +67,30 @@ class Settings(BaseModel):
     MILVUS_METRIC: str = os.getenv("MILVUS_METRIC", "IP")
     MILVUS_TOP_K: int = int(os.getenv("MILVUS_TOP_K", "5"))
 
+    # Parámetros ANN (0 = derivar automáticamente del tamaño de la colección)
+    MILVUS_EXPECTED_ENTITIES: int = int(os.getenv("MILVUS_EXPECTED_ENTITIES", "65536"))
+    MILVUS_NLIST: int = int(os.getenv("MILVUS_NLIST", "0"))
+    MILVUS_HNSW_M: int = int(os.getenv("MILVUS_HNSW_M", "16"))
+    MILVUS_HNSW_EF_CONSTRUCTION: int = int(os.getenv("MILVUS_HNSW_EF_CONSTRUCTION", "200"))
+    MILVUS_NPROBE: int = int(os.getenv("MILVUS_NPROBE", "0"))
+    MILVUS_EF: int = int(os.getenv("MILVUS_EF", "0"))
+    MILVUS_SEARCH_LIST: int = int(os.getenv("MILVUS_SEARCH_LIST", "0"))
+    MILVUS_INDEX_CACHE_TTL_S: float = float(os.getenv("MILVUS_INDEX_CACHE_TTL_S", "60"))  # otro proceso puede reconstruir el índice
+
+    # Política de flush y consistencia
+    MILVUS_FLUSH_POLICY: str = os.getenv("MILVUS_FLUSH_POLICY", "batched")  # auto | batched | always
+    MILVUS_FLUSH_INTERVAL: float = float(os.getenv("MILVUS_FLUSH_INTERVAL", "60"))
+    MILVUS_FLUSH_MAX_ROWS: int = int(os.getenv("MILVUS_FLUSH_MAX_ROWS", "50000"))
+    MILVUS_CONSISTENCY_LEVEL: str = os.getenv("MILVUS_CONSISTENCY_LEVEL", "Bounded")
+    MILVUS_RYW_WINDOW_S: int = int(os.getenv("MILVUS_RYW_WINDOW_S", "30"))
+
+    # Cuantización (IVF_SQ8 / IVF_PQ / HNSW_SQ) y re-scoring con los vectores originales
+    MILVUS_PQ_M: int = int(os.getenv("MILVUS_PQ_M", "64"))
+    MILVUS_PQ_NBITS: int = int(os.getenv("MILVUS_PQ_NBITS", "8"))
+    MILVUS_SQ_TYPE: str = os.getenv("MILVUS_SQ_TYPE", "SQ8")
+    MILVUS_RESCORE: bool = os.getenv("MILVUS_RESCORE", "false").lower() == "true"
+    MILVUS_RESCORE_FACTOR: int = int(os.getenv("MILVUS_RESCORE_FACTOR", "4"))
+
     # Active Directory
     AD_SERVER: str = os.getenv("AD_SERVER")
     AD_DOMAIN: str = os.getenv("AD_DOMAIN")
@@ -43,7 +104,51 @@ class Settings(BaseModel):
     # Memoria
     DATABASE_URL: str = os.getenv("DATABASE_URL")
     DATABASE_ADMIN_URL: str = os.getenv("DATABASE_ADMIN_URL")
+    DATABASE_READ_URL: str = os.getenv("DATABASE_READ_URL", "")  # réplica de lectura; vacío = primario
+
+    # Pools de conexión (primario y réplica)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", os.getenv("DB_POOL_SIZE", "10")))
+    DB_READ_MAX_OVERFLOW: int = int(os.getenv("DB_READ_MAX_OVERFLOW", os.getenv("DB_MAX_OVERFLOW", "20")))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))  # 0 detrás de PgBouncer (modo transacción)
+
     REDIS_URL: str = os.getenv("REDIS_URL")
+    MEMORY_WINDOW: int = int(os.getenv("MEMORY_WINDOW", "10"))  # mensajes recientes en caché
+    MEMORY_TTL_S: int = int(os.getenv("MEMORY_TTL_S", "21600"))
+    MEMORY_MAX_TOKENS: int = int(os.getenv("MEMORY_MAX_TOKENS", "1000"))  # presupuesto del slot `memory` del prompt
+
+    # Resumen acumulado de conversaciones largas
+    # Se resume cuando algo sale de la ventana cruda (MEMORY_WINDOW mensajes / MEMORY_MAX_TOKENS);
+    # quedan en crudo como mucho SUMMARY_KEEP_MESSAGES mensajes y MEMORY_MAX_TOKENS - SUMMARY_TRIGGER_TOKENS
+    # tokens, así el siguiente resumen llega tras ~SUMMARY_TRIGGER_TOKENS tokens nuevos
+    SUMMARY_TRIGGER_TOKENS: int = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "400"))
+    SUMMARY_KEEP_MESSAGES: int = int(os.getenv("SUMMARY_KEEP_MESSAGES", "4"))
+    SUMMARY_MAX_NEW_MESSAGES: int = int(os.getenv("SUMMARY_MAX_NEW_MESSAGES", "200"))
+    SUMMARY_MAX_WORDS: int = int(os.getenv("SUMMARY_MAX_WORDS", "250"))
+
+    # Memoria semántica de largo plazo (turnos pasados del usuario en Milvus)
+    MILVUS_MEMORY_COLLECTION: str = os.getenv("MILVUS_MEMORY_COLLECTION", "")  # vacío = "<MILVUS_COLLECTION>_memory"
+    MEMORY_NUM_PARTITIONS: int = int(os.getenv("MEMORY_NUM_PARTITIONS", "64"))
+    MEMORY_RECALL_TOP_K: int = int(os.getenv("MEMORY_RECALL_TOP_K", "3"))  # 0 = desactivada
+    MEMORY_RECALL_MIN_SCORE: float = float(os.getenv("MEMORY_RECALL_MIN_SCORE", "0.35"))  # ignorado con métrica L2
+    MEMORY_RECALL_MAX_TOKENS: int = int(os.getenv("MEMORY_RECALL_MAX_TOKENS", "600"))
+    MEMORY_TURN_MAX_CHARS: int = int(os.getenv("MEMORY_TURN_MAX_CHARS", "2000"))
+    MEMORY_EMBED_BATCH: int = int(os.getenv("MEMORY_EMBED_BATCH", "32"))
+    MEMORY_INDEX_DELAY_S: float = float(os.getenv("MEMORY_INDEX_DELAY_S", "0.5"))
+
+    # Retención de mensajes: particiones mensuales y archivo de chats fríos
+    CHAT_PARTITION_MONTHS_AHEAD: int = int(os.getenv("CHAT_PARTITION_MONTHS_AHEAD", "2"))
+    CHAT_ARCHIVE_AFTER_DAYS: int = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "90"))  # 0 = no archivar
+    CHAT_ARCHIVE_INTERVAL_S: int = int(os.getenv("CHAT_ARCHIVE_INTERVAL_S", "3600"))
+    CHAT_ARCHIVE_BATCH: int = int(os.getenv("CHAT_ARCHIVE_BATCH", "200"))  # sesiones por ciclo
+
+    # Rellenos de datos por lotes (services/backfill.py)
+    BACKFILL_BATCH: int = int(os.getenv("BACKFILL_BATCH", "10000"))  # filas por UPDATE / COMMIT
+    BACKFILL_PAUSE_S: float = float(os.getenv("BACKFILL_PAUSE_S", "0.05"))  # respiro entre lotes
     
     # Otros
     SERVICE_NAME: str = "altheia-rag"
@@ -5,12 +5,14 @@ from services.retrieval import retrieve_context
 from services.embeddings import get_embeddings
 from services.indexing import upsert_chunks
 from services.inference import call_llm, call_llm_stream
-from services.conversation import get_recent_history, store_message, get_or_create_session
+from services.summarizer import summarizer
+from services.semantic_memory import recall_turns, memory_indexer
+from services.conversation import get_recent_history, store_message, get_or_create_session, memory_window
 from services.db import get_db
 from jinja2 import Environment, FileSystemLoader
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from fastapi import Depends
-import logging, json
+import logging, json, uuid, asyncio
 import os
 
 
@@ -40,6 +42,22 @@ def render_prompt(template_name: str, **kwargs) -> str:
     template = env.get_template(template_name)
     return template.render(**kwargs)
 
+async def retrieve_with_memory(question: str, user_id: str, chat_id) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Un solo embedding de la pregunta para buscar en documentos y en la
+    memoria semántica del usuario (turnos de otros chats), en paralelo.
+    """
+    vector = (await get_embeddings([question], input_type="query"))[0]
+
+    async def recall():
+        try:
+            return await recall_turns(user_id, vector, exclude_chat_id=str(chat_id))
+        except Exception as e:
+            log.error(f"⚠️ Error consultando memoria semántica: {e}")
+            return []
+
+    return await asyncio.gather(retrieve_context(question, user_id=user_id, vector=vector), recall())
+
 async def run_rag_chat(
     question: str,
     user_id: str,
@@ -70,41 +88,54 @@ async def run_rag_chat(
     # 3️⃣ Crear o recuperar sesión
     session = await get_or_create_session(db, user_id, chat_id, title_chat)
 
-    # 4️⃣ Guardar mensaje del usuario
-    await store_message(db, session.id, user_id, "user", question)
-
-    # 5️⃣ Obtener memoria reciente (Redis)
-    memory_context = ""
-    # memory_context = await get_recent_history(session.id)
-
-    # 6️⃣ Recuperar contexto relevante según intención
-    if intent == "rephrase":
-        template = "rephrase.j2"
-        context_chunks = []
-    elif intent == "analyze_user_doc":
-        context_chunks = await retrieve_context(question, user_id=user_id)
-        template = "rag_chat.j2"
-    elif intent == "small_talk":
-        context_chunks = []
-        template = "chat_smalltalk.j2"
-    else:  # RAG normal
-        context_chunks = await retrieve_context(question, user_id=user_id)
-        template = "rag_chat.j2"
-
-    # 7️⃣ Construir prompt dinámico
-    prompt = render_prompt(
-        template,
-        question=question,
-        context=context_chunks,
-        memory=memory_context,
-        user_name=username,
-    )
+    # 4️⃣ Obtener memoria reciente (Redis, con PostgreSQL si la caché está fría),
+    # antes de guardar la pregunta para no duplicarla en el prompt
+    memory_context = memory_window(await get_recent_history(session.id, db), session.summary_until_id)
 
-    # 8️⃣ Inferencia
-    answer = await call_llm(prompt)
+    # 5️⃣ Guardar mensaje del usuario (diferido; se confirma junto con la respuesta)
+    question_id, answer_id = uuid.uuid4(), uuid.uuid4()
+    user_saved = await store_message(db, session.id, user_id, "user", question, wait=False, message_id=question_id)
+
+    try:
+        # 6️⃣ Recuperar contexto relevante según intención
+        recalled = []
+        if intent == "rephrase":
+            template = "rephrase.j2"
+            context_chunks = []
+        elif intent == "analyze_user_doc":
+            context_chunks, recalled = await retrieve_with_memory(question, user_id, session.id)
+            template = "rag_chat.j2"
+        elif intent == "small_talk":
+            context_chunks = []
+            template = "chat_smalltalk.j2"
+        else:  # RAG normal
+            context_chunks, recalled = await retrieve_with_memory(question, user_id, session.id)
+            template = "rag_chat.j2"
+
+        # 7️⃣ Construir prompt dinámico
+        prompt = render_prompt(
+            template,
+            question=question,
+            context=context_chunks,
+            memory=memory_context,
+            summary=session.summary,
+            recalled=recalled,
+            user_name=username,
+        )
+
+        # 8️⃣ Inferencia
+        answer = await call_llm(prompt)
 
-    # 9️⃣ Guardar respuesta
-    await store_message(db, session.id, user_id, "assistant", answer)
+        # 9️⃣ Guardar respuesta
+        await store_message(db, session.id, user_id, "assistant", answer, message_id=answer_id)
+    finally:
+        # Pregunta persistida antes de responder; si algo falla después de encolarla, su escritura se espera igual
+        try:
+            await user_saved
+        except Exception as e:
+            log.error(f"❌ Error guardando la pregunta del chat: {e}")
+    summarizer.schedule(session.id)
+    memory_indexer.submit(user_id, session.id, question_id, answer_id, question, answer)
 
     # log.info(f"💬 Respuesta generada para {user_id}: {answer[:100]}...")
 
@@ -114,6 +145,7 @@ async def run_rag_chat(
         "answer": answer,
         "context_used": len(context_chunks),
         "memory_used": len(memory_context),
+        "recalled_used": len(recalled),
     }
 
 
@@ -127,6 +159,7 @@ async def run_rag_chat_stream(
     """
     Versión con streaming del pipeline de chat
     """
+    user_saved = None
     try:
         # 1️⃣-6️⃣ Misma lógica que run_rag_chat (hasta construir el prompt)
         intent = await detect_intention(question)
@@ -146,23 +179,26 @@ async def run_rag_chat_stream(
         # Crear sesión
         session = await get_or_create_session(db, user_id, chat_id, title_chat)
         
-        # Guardar mensaje del usuario
-        await store_message(db, session.id, user_id, "user", question)
+        # Memoria reciente (antes de guardar la pregunta para no duplicarla)
+        memory_context = memory_window(await get_recent_history(session.id, db), session.summary_until_id)
+
+        # Guardar mensaje del usuario (diferido; se confirma antes del evento final)
+        question_id, answer_id = uuid.uuid4(), uuid.uuid4()
+        user_saved = await store_message(db, session.id, user_id, "user", question, wait=False, message_id=question_id)
         
         # Obtener contexto
-        memory_context = ""
-        # memory_context = await get_recent_history(session.id)
+        recalled = []
         if intent == "rephrase":
             template = "rephrase.j2"
             context_chunks = []
         elif intent == "analyze_user_doc":
-            context_chunks = await retrieve_context(question, user_id=user_id)
+            context_chunks, recalled = await retrieve_with_memory(question, user_id, session.id)
             template = "rag_chat.j2"
         elif intent == "small_talk":
             context_chunks = []
             template = "chat_smalltalk.j2"
         else:
-            context_chunks = await retrieve_context(question, user_id=user_id)
+            context_chunks, recalled = await retrieve_with_memory(question, user_id, session.id)
             template = "rag_chat.j2"
         
         # Construir prompt final
@@ -171,6 +207,8 @@ async def run_rag_chat_stream(
             question=question,
             context=context_chunks,
             memory=memory_context,
+            summary=session.summary,
+            recalled=recalled,
             user_name=username,
         )
         
@@ -180,6 +218,7 @@ async def run_rag_chat_stream(
             "intent": intent,
             "context_used": len(context_chunks),
             "memory_used": len(memory_context),
+            "recalled_used": len(recalled),
             "content": ""
         }
         yield f"data: {json.dumps(initial_data)}\n\n"        
@@ -192,13 +231,27 @@ async def run_rag_chat_stream(
                 # Enviar chunk al cliente
                 yield f"data: {json.dumps({'content': chunk})}\n\n"
         
-        # 8️⃣ Guardar respuesta completa al final
-        await store_message(db, session.id, user_id, "assistant", full_response)
+        # 8️⃣ Guardar respuesta completa y confirmar persistencia antes del evento final
+        await store_message(db, session.id, user_id, "assistant", full_response, message_id=answer_id)
+        saved, user_saved = user_saved, None
+        await saved
+        summarizer.schedule(session.id)
+        memory_indexer.submit(user_id, session.id, question_id, answer_id, question, full_response)
+        yield f"data: {json.dumps({'done': True, 'chat_id': str(session.id)})}\n\n"
 
     except Exception as e:
         error_data = {"error": f"Error en streaming: {str(e)}"}
         yield f"data: {json.dumps(error_data)}\n\n"
 
+    finally:
+        # La pregunta ya está encolada: si el turno falla o el cliente se
+        # desconecta, su escritura se espera igual (y un error se registra)
+        if user_saved is not None:
+            try:
+                await user_saved
+            except Exception as e:
+                log.error(f"❌ Error guardando la pregunta del chat: {e}")
+
 
 async def run_rephrase(text: str, style: str = "") -> str:
     prompt = render_prompt(
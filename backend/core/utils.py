@@ -1,86 +1,103 @@
 # backend/core/utils.py
 
 import os
-import tempfile
 import uuid
+import asyncio
+import tempfile
 import hashlib
 import logging
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Callable
 from fastapi import UploadFile, HTTPException
-from services.loader import load_file
-from services.indexing import chunk_text
+from core.config import settings
 
 log = logging.getLogger(__name__)
 
-async def read_chunk_file(file: UploadFile, user_id: str, chat_id: str = None, is_public: bool = False) -> Dict[str, Any]:
+async def prepare_upload(file: UploadFile, user_id: str, chat_id: str = None, is_public: bool = False) -> Dict[str, Any]:
     """
-    Procesar archivo y preparar chunks con metadata enriquecida
+    Copia el upload por bloques a un archivo único del spool (sin mantenerlo
+    en memoria), calcula su SHA-256 al vuelo y prepara la metadata. Los loaders
+    abren el spool por ruta. El caller es responsable de borrar `tmp_path`.
     """
     # Generar un doc_id único
     doc_uuid = str(uuid.uuid4())
     current_time = datetime.utcnow().isoformat()
 
     log.info(f"Processing file: {file.filename}, size: {file.size}, user: {user_id}")
-    
-    tmp_dir = tempfile.gettempdir()
-    tmp_path = os.path.join(tmp_dir, file.filename)
+
+    max_bytes = settings.UPLOAD_MAX_MB * 2**20
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"El archivo supera el máximo de {settings.UPLOAD_MAX_MB} MB")
+
+    # Spool único en el directorio compartido (los workers pueden estar en otros nodos)
+    ext = os.path.splitext(file.filename or "")[1].lower()
+    os.makedirs(settings.INGEST_SPOOL_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{doc_uuid}-", suffix=ext, dir=settings.INGEST_SPOOL_DIR)
 
     try:
-        # Leer contenido del archivo y calcular hash
-        file_content = await file.read()
-        file_hash = hashlib.md5(file_content).hexdigest()
-        
-        # Guardar archivo temporal
-        with open(tmp_path, "wb") as f:
-            f.write(file_content)
+        # Copiar por bloques calculando el SHA-256 de forma incremental
+        sha = hashlib.sha256()
+        file_size = 0
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                block = await file.read(settings.UPLOAD_BLOCK_SIZE)
+                if not block:
+                    break
+                file_size += len(block)
+                if file_size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"El archivo supera el máximo de {settings.UPLOAD_MAX_MB} MB")
+                sha.update(block)
+                await asyncio.to_thread(f.write, block)
+        file_hash = sha.hexdigest()
 
-        # Procesar texto
-        text = load_file(tmp_path)
-        parts = chunk_text(text)
+    except HTTPException:
+        os.remove(tmp_path)
+        raise
 
-        # Metadata enriquecida
-        base_metadata = {
-            "doc_version": 1,
-            "original_filename": file.filename,
-            "upload_timestamp": current_time,
-            "last_updated": current_time,
-            "uploaded_by": user_id,
-            "document_status": "active",  # Para filtros en retrieval
-            "file_size": file.size,
-            "file_hash": file_hash,
-            "source": "file",
-            "chunk_count": len(parts),
-            "chat_id": chat_id,  # Vincular al chat si existe
-            "content_type": file.content_type,
-        }
+    except Exception as e:
+        log.error(f"Error processing file {file.filename}: {str(e)}", exc_info=True)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
-        chunks = [{
-            "doc_id": doc_uuid,
-            "chunk_id": f"{doc_uuid}-{i}",
-            "text": chunk,
-            "metadata": {
-                **base_metadata,
-                "chunk_index": i,
-                "total_chunks": len(parts),
-            },
-            "user_id": "PUBLIC" if is_public else user_id
-        } for i, chunk in enumerate(parts)]            
+    # Metadata enriquecida
+    base_metadata = {
+        "doc_version": 1,
+        "original_filename": file.filename,
+        "upload_timestamp": current_time,
+        "last_updated": current_time,
+        "uploaded_by": user_id,
+        "document_status": "active",  # Para filtros en retrieval
+        "file_size": file_size,
+        "file_hash": file_hash,
+        "source": "file",
+        "chat_id": chat_id,  # Vincular al chat si existe
+        "content_type": file.content_type,
+    }
 
-        log.info(f"Prepared {len(chunks)} chunks for user {user_id}")
+    return {
+        "doc_id": doc_uuid,
+        "tmp_path": tmp_path,
+        "filename": file.filename,
+        "file_hash": file_hash,
+        "acl_user_id": "PUBLIC" if is_public else user_id,
+        "file_metadata": base_metadata  # Para registro en PostgreSQL
+    }
 
+def chunk_factory(upload: Dict[str, Any]) -> Callable[[int, str], Dict[str, Any]]:
+    """
+    Construye los dicts de chunk a medida que el pipeline los produce.
+    La metadata del archivo se registra una sola vez en el documento.
+    """
+    doc_uuid = upload["doc_id"]
+
+    def make_chunk(i: int, text: str) -> Dict[str, Any]:
         return {
             "doc_id": doc_uuid,
-            "chunks": chunks,
-            "chunks_count": len(chunks),
-            "file_hash": file_hash,
-            "file_metadata": base_metadata  # Para registro en PostgreSQL
+            "chunk_id": f"{doc_uuid}-{i}",
+            "text": text,
+            "metadata": {"chunk_index": i},
+            "user_id": upload["acl_user_id"],
         }
 
-    except Exception as e:
-        log.error(f"Error processing file {file.filename}: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
-
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
\ No newline at end of file
+    return make_chunk
\ No newline at end of file
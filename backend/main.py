@@ -1,10 +1,21 @@
 # backend/main.py
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from core.logging import configure_logging
-from routers import chat, admin, health, auth
+from routers import chat, admin, health, auth, ingest
+from core.config import settings
 from services.db import init_db
+from services.ingest_worker import start_workers
+from services.loader import shutdown_parse_pool
+from services.metrics import monitor_event_loop
+from services.write_coordinator import write_coordinator
+from services.message_writer import message_writer
+from services.summarizer import summarizer
+from services.semantic_memory import memory_indexer
+from services.archiver import run_archiver
+from services.backfill import run_backfills
 
 
 configure_logging()
@@ -13,11 +24,33 @@ configure_logging()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    chat_writer = asyncio.create_task(message_writer.run())
+    summaries = asyncio.create_task(summarizer.run())
+    memory_index = asyncio.create_task(memory_indexer.run())
+    # Workers de ingesta dentro del API (se pueden correr más en otros nodos)
+    workers = start_workers(settings.INGEST_LOCAL_WORKERS)
+    loop_monitor = asyncio.create_task(monitor_event_loop())
+    flusher = asyncio.create_task(write_coordinator.run_periodic())
+    # Particiones mensuales de chat_messages y archivo de chats fríos
+    archiver = asyncio.create_task(run_archiver())
+    # Rellenos de datos por lotes pendientes (una vez, fuera del arranque)
+    backfills = asyncio.create_task(run_backfills())
     yield
+    for task in [*workers, loop_monitor, summaries, memory_index, archiver, backfills]:
+        task.cancel()
+    await asyncio.gather(*workers, loop_monitor, summaries, memory_index, archiver, backfills, return_exceptions=True)
+    # El flusher se cancela al final para sellar lo que hayan escrito los workers
+    flusher.cancel()
+    await asyncio.gather(flusher, return_exceptions=True)
+    # Persistir los mensajes de chat pendientes antes de salir
+    chat_writer.cancel()
+    await asyncio.gather(chat_writer, return_exceptions=True)
+    shutdown_parse_pool()
 
 app = FastAPI(title="AltheIA RAG Service", version="1.0", lifespan=lifespan)
 
 app.include_router(health.router, prefix="/health", tags=["health"])
 app.include_router(chat.router, prefix="/chat", tags=["chat"])
 app.include_router(admin.router, prefix="/admin", tags=["admin"])
-app.include_router(auth.router, prefix="/auth", tags=["auth"])
\ No newline at end of file
+app.include_router(auth.router, prefix="/auth", tags=["auth"])
+app.include_router(ingest.router, prefix="/ingest", tags=["ingest"])
\ No newline at end of file
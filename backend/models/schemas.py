@@ -7,6 +7,11 @@ class ChatRequest(BaseModel):
     question: str = Field(min_length=1)
     chat_id: str
 
+class BatchRetrieveRequest(BaseModel):
+    queries: List[str] = Field(min_length=1, max_length=64)
+    top_k: Optional[int] = Field(default=None, ge=1, le=50)
+    search_params: Optional[dict[str, int]] = None  # override: nprobe / ef / search_list
+
 class RephraseRequest(BaseModel):
     text: str
     style: str | None = None
@@ -69,6 +74,20 @@ class GenericCountResponse(BaseModel):
 class FileIngestResponse(BaseModel):
     doc_id: str
     chunks: int
+    message: Optional[str] = None
+    job_id: Optional[str] = None
+    status: Optional[str] = None
+    stats: Optional[dict[str, Any]] = None  # RSS pico y throughput por etapa
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    doc_id: str
+    status: str
+    stage: Optional[str] = None
+    progress: Optional[dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
 
 class LoginRequest(BaseModel):
     username: str
@@ -3,15 +3,17 @@
 import tempfile
 import os, uuid, logging
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, Header, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, UploadFile, File, Form, HTTPException, Query
 from typing import Optional
 from services.auth_jwt import get_current_user
 from core.config import settings
 from core.errors import Unauthorized
 from services.loader import load_file
-from core.utils import read_chunk_file
+from core.utils import prepare_upload
+from services.ingest_worker import submit_upload, submit_version
 from services.indexing import ensure_collection, reset_collection_data, chunk_text, upsert_chunks, delete_docs
-from services.db import get_db
+from services.rebuild import rebuild_collection, get_rebuild_status
+from services.db import get_db, get_read_db
 from services.transaction_manager import transaction_manager
 from models.schemas import (
     IngestRequest, UpsertRequest, DeleteRequest,
@@ -32,7 +34,24 @@ def require_api_key(x_api_key: Optional[str] = Header(default=None)):
     return True
 
 @router.post("/recreate-collection", response_model=StatusResponse)
-async def admin_recreate_collection(_: bool = Depends(require_api_key)):    
+async def admin_recreate_collection(
+    background_tasks: BackgroundTasks,
+    mode: str = Query(default="drop", pattern="^(drop|rebuild)$"),
+    reembed: bool = False,
+    keep_old: bool = False,
+    _: bool = Depends(require_api_key)
+):
+    """
+    - mode=drop: borra la colección y la crea vacía (comportamiento original).
+    - mode=rebuild: crea una colección sombra, la repuebla (vectores guardados o
+      re-embedding) y repunta el alias sin dejar de servir búsquedas.
+    """
+    if mode == "rebuild":
+        if get_rebuild_status().get("status") == "running":
+            return {"status": "error", "message": "Ya hay una reconstrucción en curso"}
+        background_tasks.add_task(rebuild_collection, reembed=reembed, keep_old=keep_old)
+        return {"status": "ok", "message": "Reconstrucción iniciada, consulte /admin/rebuild-status"}
+
     try:
         result = reset_collection_data()
         if not result["success"]:
@@ -46,21 +65,23 @@ async def admin_recreate_collection(_: bool = Depends(require_api_key)):
         return {"status": "error", "message": str(e)}
 
 
+@router.get("/rebuild-status")
+async def admin_rebuild_status(_: bool = Depends(require_api_key)):
+    return get_rebuild_status()
+
+
 @router.post("/ingest-file-", response_model=FileIngestResponse)
 async def _admin_ingest_file(file: UploadFile = File(...), _: bool = Depends(require_api_key)):
 
     log.info(f"Received file: {file.filename}, size: {file.size}")
     
-    tmp_dir = tempfile.gettempdir()
-    tmp_path = os.path.join(tmp_dir, file.filename)
-
-    with open(tmp_path, "wb") as f:
-        f.write(await file.read())
+    upload = await prepare_upload(file, "PUBLIC", is_public=True)
+    tmp_path = upload["tmp_path"]
 
     try:
         text = load_file(tmp_path)
         parts = chunk_text(text)
-        doc_uuid = str(uuid.uuid4())
+        doc_uuid = upload["doc_id"]
 
         chunks = [{
             "doc_id": f"{doc_uuid}",
@@ -89,46 +110,16 @@ async def admin_ingest_file(
     db: AsyncSession = Depends(get_db)
 ):
     user_id = "PUBLIC"
-    transaction_id = None
     
     try:        
-        # 1. PREPARE: Procesar archivo y generar transaction
-        result = await read_chunk_file(file, user_id, is_public=True)
-        transaction_id = await transaction_manager.begin_upload_transaction(db, result["doc_id"], user_id)
-        
-        # 2. COMMIT FASE 1: Insertar en Milvus
-        await upsert_chunks(result["chunks"], transaction_id)
-        
-        # 3. COMMIT FASE 2: Registrar en PostgreSQL
-        document_data = {
-            "id": result["doc_id"],
-            "user_id": user_id,
-            "original_filename": file.filename,
-            "file_hash": result["file_hash"],
-            "chunks_count": result["chunks_count"],
-            "document_type": "public_base",  # ← Especificar que es documento público
-            "metadata": result.get("file_metadata", {})
-        }
-        await transaction_manager.commit_upload(db, transaction_id, document_data)
-
-        log.info(f"✅ Admin upload completado: {result['doc_id']} - {result['chunks_count']} chunks")
-        
-        return {
-            "doc_id": result["doc_id"], 
-            "chunks": result["chunks_count"],
-            "message": "Public document uploaded successfully"
-        }
+        upload = await prepare_upload(file, user_id, is_public=True)
+        return await submit_upload(db, upload, user_id, document_type="public_base")
 
     except HTTPException:
         raise
     
     except Exception as e:
         log.error(f"❌ Error en admin_ingest_file: {e}")
-        
-        # COMPENSACIÓN: Revertir cambios en caso de error
-        if transaction_id and 'result' in locals():
-            await transaction_manager.rollback_upload(db, transaction_id, result["doc_id"])
-        
         return {
             "doc_id": "", 
             "chunks": 0, 
@@ -136,6 +127,30 @@ async def admin_ingest_file(
         }
 
 
+@router.post("/documents/{doc_id}/versions", response_model=FileIngestResponse)
+async def admin_ingest_version(
+    doc_id: str,
+    file: UploadFile = File(...),
+    _: bool = Depends(require_api_key),
+    db: AsyncSession = Depends(get_db)
+):
+    document = await transaction_manager.get_document(db, doc_id)
+    if document is None or document.status != "active":
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+
+    upload = await prepare_upload(file, document.user_id, is_public=document.user_id == "PUBLIC")
+    return await submit_version(db, upload, document)
+
+
+@router.get("/duplicates", summary="Reporte de almacenamiento duplicado entre usuarios")
+async def admin_duplicates(limit: int = 100, db: AsyncSession = Depends(get_read_db), _: bool = Depends(require_api_key)):
+    report = await transaction_manager.duplicate_storage_report(db, limit)
+    # Estimación: vector float32 + texto promedio (~1 KB) por chunk redundante
+    bytes_per_chunk = settings.EMBEDDINGS_DIM * 4 + 1024
+    report["estimated_redundant_mb"] = round(report["redundant_chunks"] * bytes_per_chunk / 2**20, 2)
+    return report
+
+
 @router.post("/delete", response_model=DeleteResponse)
 async def admin_delete(req: DeleteRequest, user_id: str = Depends(get_current_user), _: bool = Depends(require_api_key)):
     await delete_docs(req.doc_ids, user_id)
@@ -1,17 +1,19 @@
 # app/routers/chat.py
 
 import os, tempfile, logging, json
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from models.schemas import ChatRequest, ChatResponse, FileIngestResponse, RephraseRequest, RephraseResponse
+from models.schemas import ChatRequest, ChatResponse, FileIngestResponse, RephraseRequest, RephraseResponse, BatchRetrieveRequest
 from core.graph import run_rag_chat, run_rag_chat_stream, run_rephrase
 from services.auth_jwt import get_current_user
-from core.utils import read_chunk_file
-from services.indexing import upsert_chunks
-from services.db import get_db
-from services.conversation import get_or_create_session, get_full_history, get_user_sessions
+from core.utils import prepare_upload
+from services.ingest_worker import submit_upload, submit_version
 from services.transaction_manager import transaction_manager
+from services.retrieval import retrieve_context_batch
+from services.db import get_db, get_read_db, AsyncSessionLocal
+from services.conversation import get_or_create_session, open_history_page, get_sessions_page, search_sessions
 
 log = logging.getLogger(__name__)
 router = APIRouter()
@@ -94,22 +96,67 @@ async def chat_stream(
 
 
 
+# ======================================================
+# 🔎 Endpoint de recuperación de contexto en lote
+# ======================================================
+@router.post("/retrieve/batch", summary="Recuperar contexto para varias preguntas")
+async def retrieve_batch(
+    req: BatchRetrieveRequest,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Recupera contexto para varias preguntas con un solo llamado de embeddings
+    y una sola búsqueda en Milvus. Devuelve un evento SSE por pregunta.
+    """
+    user_id = user["user"]
+
+    async def generate():
+        try:
+            async for item in retrieve_context_batch(req.queries, user_id=user_id, top_k=req.top_k, search_params=req.search_params):
+                yield f"data: {json.dumps(item, default=str)}\n\n"
+        except Exception as e:
+            log.exception(f"❌ Error en /chat/retrieve/batch: {e}")
+            yield f"data: {json.dumps({'error': f'Error: {str(e)}'})}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+
 # ======================================================
 # 🧾 Endpoint para recuperar historial completo
 # ======================================================
 @router.get("/history/{session_id}", summary="Recuperar historial de conversación")
 async def get_chat_history(
     session_id: str,
-    db: AsyncSession = Depends(get_db),
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
     user: dict = Depends(get_current_user)
 ):
     """
-    Devuelve todos los mensajes almacenados para una sesión específica.
+    Devuelve los mensajes más recientes de una sesión (en orden cronológico).
+    Para ver mensajes anteriores se pasa `before=next_cursor`. Un chat
+    archivado se restaura al abrirlo.
     """
 
     try:
-        history = await get_full_history(db, session_id)
-        return {"session_id": session_id, "history": history}
+        page = await open_history_page(db, session_id, user["user"], limit, before)
+        if page is None:
+            raise HTTPException(status_code=404, detail="Chat no encontrado")
+        return {"session_id": session_id, **page}
+
+    except HTTPException:
+        raise
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     except Exception as e:
         log.exception(f"❌ Error al recuperar historial: {e}")
@@ -120,17 +167,62 @@ async def get_chat_history(
 # 💭 Endpoint para recuperar las sesiones del usuario
 # ======================================================
 @router.get("/sessions")
-async def list_user_chats(db: AsyncSession = Depends(get_db), user: dict = Depends(get_current_user)):
+async def list_user_chats(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    consistent: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Sesiones del usuario de la más reciente a la más antigua, por páginas
+    (`cursor=next_cursor` para la siguiente). Con `consistent=true` se lee
+    del primario: el cliente lo pide justo después de crear un chat, que la
+    réplica puede no ver todavía.
+    """
     user_id = user["user"]
     try:
-        sessions = await get_user_sessions(db, user_id)
-        return sessions
+        if consistent:
+            async with AsyncSessionLocal() as primary:
+                return await get_sessions_page(primary, user_id, limit, cursor)
+        return await get_sessions_page(db, user_id, limit, cursor)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     except Exception as e:
         log.exception(f"❌ Error al recuperar las sesiones del usuario '{user_id}': {e}")
         raise HTTPException(status_code=500, detail=str(e))        
 
 
+# ======================================================
+# 🔎 Endpoint para buscar en el historial del usuario
+# ======================================================
+@router.get("/search", summary="Buscar en el historial de chats")
+async def search_user_chats(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Sesiones del usuario cuyos mensajes coinciden con `q`, de la más relevante
+    a la menos, con un fragmento resaltado (`**término**`). Siguiente página
+    con `cursor=next_cursor`.
+    """
+    user_id = user["user"]
+    try:
+        return {"query": q, **await search_sessions(db, user_id, q, limit, cursor)}
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
+        log.exception(f"❌ Error al buscar en los chats del usuario '{user_id}': {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ======================================================
 # 🧩 Endpoint para iniciar un nuevo chat
 # ======================================================
@@ -165,47 +257,37 @@ async def user_ingest_file(
     db: AsyncSession = Depends(get_db)
 ):
     user_id = user["user"]
-    transaction_id = None
     
     try:        
-        # 1. PREPARE: Procesar archivo y generar transaction
-        result = await read_chunk_file(file, user_id)
-        transaction_id = await transaction_manager.begin_upload_transaction(db, result["doc_id"], user_id)
-        
-        # 2. COMMIT FASE 1: Insertar en Milvus
-        await upsert_chunks(result["chunks"], transaction_id)
-        
-        # 3. COMMIT FASE 2: Registrar en PostgreSQL
-        document_data = {
-            "id": result["doc_id"],
-            "user_id": user_id,
-            "original_filename": file.filename,
-            "file_hash": result["file_hash"],
-            "chunks_count": result["chunks_count"],
-            "metadata": result.get("file_metadata", {})
-        }
-        await transaction_manager.commit_upload(db, transaction_id, document_data)
-
-        log.info(f"✅ Upload completado: {result['doc_id']} - {result['chunks_count']} chunks")
-        
-        return {
-            "doc_id": result["doc_id"], 
-            "chunks": result["chunks_count"],
-            "message": "Document uploaded successfully"
-        }
+        upload = await prepare_upload(file, user_id)
+        return await submit_upload(db, upload, user_id)
 
     except HTTPException:
         raise
 
     except Exception as e:
         log.error(f"❌ Error en user_ingest_file: {e}")
-        
-        # COMPENSACIÓN: Revertir cambios en caso de error
-        if transaction_id and 'result' in locals():
-            await transaction_manager.rollback_upload(db, transaction_id, result["doc_id"])
-        
         return {
             "doc_id": "", 
             "chunks": 0, 
             "message": f"Error processing file: {str(e)}"
-        }
\ No newline at end of file
+        }
+
+
+# ==================================================================
+# 🔁 Endpoint para subir una nueva versión de un documento existente
+# ==================================================================
+@router.post("/documents/{doc_id}/versions", response_model=FileIngestResponse)
+async def user_ingest_version(
+    doc_id: str,
+    file: UploadFile = File(...),
+    user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    user_id = user["user"]
+    document = await transaction_manager.get_document(db, doc_id)
+    if document is None or document.user_id != user_id or document.status != "active":
+        raise HTTPException(status_code=404, detail="Documento no encontrado")
+
+    upload = await prepare_upload(file, user_id)
+    return await submit_version(db, upload, document)
\ No newline at end of file
@@ -1,6 +1,7 @@
 # app/routers/health.py
 
 from fastapi import APIRouter
+from services import metrics
 
 router = APIRouter()
 
@@ -11,3 +12,7 @@ def live():
 @router.get("/ready")
 def ready():
     return {"status": "ready"}
+
+@router.get("/metrics")
+def get_metrics():
+    return metrics.snapshot()
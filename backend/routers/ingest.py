@@ -0,0 +1,41 @@
+# app/routers/ingest.py
+
+import logging
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, HTTPException, Header
+from core.config import settings
+from models.schemas import IngestJobResponse
+from services.auth_jwt import get_current_user
+from services.db import get_db
+from services.transaction_manager import transaction_manager
+
+log = logging.getLogger(__name__)
+router = APIRouter()
+
+# ======================================================
+# 📊 Estado de un job de ingesta
+# ======================================================
+@router.get("/jobs/{job_id}", response_model=IngestJobResponse, summary="Estado de un job de ingesta")
+async def get_ingest_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db),
+    user: dict = Depends(get_current_user),
+    x_api_key: Optional[str] = Header(default=None)
+):
+    job = await transaction_manager.get_job(db, job_id)
+    # Cada usuario ve sus jobs; los de documentos PUBLIC solo con la API key de admin (ver routers/admin.py)
+    is_admin = x_api_key is not None and x_api_key == settings.API_KEY
+    if job is None or not (job.user_id == user["user"] or (job.user_id == "PUBLIC" and is_admin)):
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+
+    return {
+        "job_id": str(job.id),
+        "doc_id": job.doc_id,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
@@ -0,0 +1,93 @@
+# backend/scripts/bench_chunker.py
+"""
+Benchmark de chunkers: throughput (MB/s) y recall de recuperación.
+
+El recall se mide con un archivo JSONL de preguntas de evaluación:
+    {"question": "...", "answer": "fragmento literal esperado en el contexto"}
+Para cada chunker se embeben los chunks y las preguntas, se toma el top-k por
+similitud coseno y se cuenta un acierto si algún chunk contiene la respuesta.
+
+Uso (desde backend/):
+    python -m scripts.bench_chunker docs/*.pdf --qa eval.jsonl --top-k 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from services.loader import load_file
+from services.chunking import CHUNKERS, get_chunker
+from services.embeddings import get_embeddings
+
+EMBED_BATCH = 64
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+async def _embed(texts: List[str], input_type: str) -> np.ndarray:
+    vectors = []
+    for i in range(0, len(texts), EMBED_BATCH):
+        vectors.extend(await get_embeddings(texts[i:i + EMBED_BATCH], input_type=input_type))
+    arr = np.asarray(vectors, dtype=np.float32)
+    return arr / np.linalg.norm(arr, axis=1, keepdims=True).clip(min=1e-12)
+
+
+def throughput(texts: Dict[str, str], chunker_name: str | None, repeat: int) -> Dict:
+    total_bytes = sum(len(t.encode("utf-8")) for t in texts.values())
+    chunks: List[str] = []
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        chunks = []
+        for path, text in texts.items():
+            chunker = CHUNKERS[chunker_name] if chunker_name else get_chunker(os.path.splitext(path)[1])
+            chunks.extend(chunker([text]))
+    elapsed = (time.perf_counter() - t0) / repeat
+    return {
+        "chunks": chunks,
+        "mb_s": total_bytes / 2**20 / max(elapsed, 1e-9),
+        "avg_words": float(np.mean([len(c.split()) for c in chunks])) if chunks else 0.0,
+    }
+
+
+async def recall(chunks: List[str], qa: List[Dict], top_k: int) -> float:
+    chunk_vecs = await _embed(chunks, "passage")
+    query_vecs = await _embed([q["question"] for q in qa], "query")
+    top = np.argsort(-(query_vecs @ chunk_vecs.T), axis=1)[:, :top_k]
+    hits = 0
+    for q, idx in zip(qa, top):
+        answer = _normalize(q["answer"])
+        hits += any(answer in _normalize(chunks[i]) for i in idx)
+    return hits / max(len(qa), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de chunkers")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--qa", default=None, help="JSONL con question/answer para medir recall")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = {path: load_file(path) for path in args.files}
+    qa = []
+    if args.qa:
+        with open(args.qa, "r", encoding="utf-8") as f:
+            qa = [json.loads(line) for line in f if line.strip()]
+
+    variants = {"words (actual)": "words", "configurado por tipo": None}
+    print(f"{'chunker':>22} | {'MB/s':>8} | {'chunks':>7} | {'palabras/chunk':>14} | recall@{args.top_k}")
+    for label, name in variants.items():
+        res = throughput(texts, name, args.repeat)
+        rec = asyncio.run(recall(res["chunks"], qa, args.top_k)) if qa else float("nan")
+        print(f"{label:>22} | {res['mb_s']:8.2f} | {len(res['chunks']):7d} | {res['avg_words']:14.1f} | {rec:.4f}")
+
+
+if __name__ == "__main__":
+    main()
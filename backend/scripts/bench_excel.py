@@ -0,0 +1,79 @@
+# backend/scripts/bench_excel.py
+"""
+Benchmark del loader de Excel: pandas (read_excel + astype(str)) vs.
+streaming con openpyxl read_only. Cada variante corre en un proceso nuevo
+para medir su pico de RSS de forma aislada.
+
+Uso (desde backend/):
+    python -m scripts.bench_excel --generate 100000 --cols 12 --out /tmp/bench.xlsx
+    python -m scripts.bench_excel /tmp/bench.xlsx
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+
+from services.loader import iter_excel, iter_excel_pandas
+from services.chunking import chunk_rows
+
+
+def generate(path: str, rows: int, cols: int):
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Datos")
+    ws.append([f"columna_{c}" for c in range(cols)])
+    for r in range(rows):
+        ws.append([f"valor {r}-{c}" if c % 3 else r * c for c in range(cols)])
+    wb.save(path)
+
+
+def _run(variant: str, path: str, out):
+    loader = iter_excel if variant == "openpyxl" else iter_excel_pandas
+    t0 = time.perf_counter()
+    first_chunk_s = None
+    chunks = 0
+    total_bytes = 0
+    for chunk in chunk_rows(loader(path)):
+        if first_chunk_s is None:
+            first_chunk_s = time.perf_counter() - t0
+        chunks += 1
+        total_bytes += len(chunk)
+    out.put({
+        "variant": variant,
+        "seconds": time.perf_counter() - t0,
+        "first_chunk_s": first_chunk_s or 0.0,
+        "chunks": chunks,
+        "mb_text": total_bytes / 2**20,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de loaders de Excel")
+    parser.add_argument("file", nargs="?")
+    parser.add_argument("--generate", type=int, default=0, help="Generar un libro sintético con N filas")
+    parser.add_argument("--cols", type=int, default=12)
+    parser.add_argument("--out", default="/tmp/bench_excel.xlsx")
+    args = parser.parse_args()
+
+    path = args.file
+    if args.generate:
+        generate(args.out, args.generate, args.cols)
+        path = args.out
+        print(f"Libro generado: {path} ({args.generate} filas x {args.cols} columnas)")
+
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'loader':>10} | {'segundos':>9} | {'1er chunk s':>11} | {'chunks':>7} | {'MB texto':>8} | {'RSS pico MB':>11}")
+    for variant in ("pandas", "openpyxl"):
+        out = ctx.Queue()
+        proc = ctx.Process(target=_run, args=(variant, path, out))
+        proc.start()
+        r = out.get()
+        proc.join()
+        print(f"{r['variant']:>10} | {r['seconds']:9.2f} | {r['first_chunk_s']:11.2f} | {r['chunks']:7d} | {r['mb_text']:8.1f} | {r['peak_rss_mb']:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
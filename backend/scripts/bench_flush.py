@@ -0,0 +1,85 @@
+# backend/scripts/bench_flush.py
+"""
+Compara políticas de flush en una colección temporal de Milvus.
+
+Simula N ingestas de M chunks (vectores aleatorios, sin servicio de
+embeddings) y, por política, reporta la latencia de escritura por documento
+y el número/tamaño de segmentos resultantes:
+  - always:  flush tras cada documento (comportamiento anterior)
+  - batched: flush cada --flush-every documentos
+  - auto:    sin flush explícito (Milvus sella por tamaño/tiempo)
+
+Uso (desde backend/):
+    python -m scripts.bench_flush --docs 200 --chunks 50
+"""
+
+import argparse
+import time
+import uuid
+
+import numpy as np
+from pymilvus import Collection, connections, utility
+
+from core.config import settings
+from services.indexing import create_physical_collection, write_chunks
+
+
+def _summary(values):
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    return f"p50={pick(0.5):.1f} ms p95={pick(0.95):.1f} ms max={ordered[-1]:.1f} ms"
+
+
+def segment_report(name: str) -> str:
+    """Segmentos persistidos (sellados) y en query nodes (incluye growing)."""
+    persistent = utility.get_persistent_segment_info(name)
+    querying = utility.get_query_segment_info(name)
+    rows = [s.num_rows for s in persistent] or [0]
+    growing = sum(1 for s in querying if "Growing" in str(s.state))
+    return (
+        f"sellados={len(persistent)} (filas min/med/máx {min(rows)}/{int(np.median(rows))}/{max(rows)}) "
+        f"en consulta={len(querying)} growing={growing}"
+    )
+
+
+def run(policy: str, docs: int, chunks: int, flush_every: int):
+    name = f"bench_flush_{policy}_{uuid.uuid4().hex[:6]}"
+    col = create_physical_collection(name, docs * chunks)
+    rng = np.random.default_rng(0)
+    latencies = []
+    try:
+        t_total = time.perf_counter()
+        for d in range(docs):
+            doc_id = uuid.uuid4().hex
+            rows = [
+                {"chunk_id": f"{doc_id}-{i}", "doc_id": doc_id, "text": "x", "metadata": {}, "user_id": "bench"}
+                for i in range(chunks)
+            ]
+            vectors = rng.random((chunks, settings.EMBEDDINGS_DIM), dtype=np.float32).tolist()
+            t0 = time.perf_counter()
+            write_chunks(col, rows, vectors)
+            if policy == "always" or (policy == "batched" and (d + 1) % flush_every == 0):
+                col.flush()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - t_total
+        print(f"[{policy}] {docs} docs en {elapsed:.1f} s | escritura por doc {_summary(latencies)}")
+        print(f"[{policy}] segmentos: {segment_report(name)}")
+    finally:
+        utility.drop_collection(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de políticas de flush en Milvus")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=50)
+    parser.add_argument("--flush-every", type=int, default=50)
+    parser.add_argument("--policies", default="always,batched,auto")
+    args = parser.parse_args()
+
+    connections.connect("default", host=settings.MILVUS_HOST, port=settings.MILVUS_PORT)
+    for policy in args.policies.split(","):
+        run(policy.strip(), args.docs, args.chunks, args.flush_every)
+
+
+if __name__ == "__main__":
+    main()
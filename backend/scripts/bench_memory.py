@@ -0,0 +1,86 @@
+# backend/scripts/bench_memory.py
+"""
+Costo por turno de la memoria de conversación en Redis.
+
+Un turno = leer el historial reciente + escribir pregunta y respuesta.
+Compara:
+  - legacy:    RPUSH y LTRIM por separado (2 viajes por mensaje) + LRANGE
+  - pipelined: services.memory (MULTI/EXEC de 1 viaje por mensaje) + LRANGE/EXPIRE
+  - cold:      caché fría -> lectura en PostgreSQL + siembra en Redis
+
+Uso (desde backend/):
+    python -m scripts.bench_memory --turns 500 --chat-id <uuid de un chat con historial>
+"""
+
+import time
+import uuid
+import json
+import asyncio
+import argparse
+
+from core.config import settings
+from services.db import AsyncSessionLocal, engine
+from services.memory import redis_client, save_message, get_history, clear_history
+from services.conversation import get_recent_history
+
+
+def _summary(values):
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    return f"p50={pick(0.5):.2f} ms p95={pick(0.95):.2f} ms max={ordered[-1]:.2f} ms"
+
+
+async def legacy_turn(chat_id: str, text: str):
+    key = f"chat:{chat_id}:history"
+    await redis_client.lrange(key, 0, -1)
+    for role in ("user", "assistant"):
+        await redis_client.rpush(key, json.dumps({"role": role, "content": text}))
+        await redis_client.ltrim(key, -settings.MEMORY_WINDOW, -1)
+
+
+async def pipelined_turn(chat_id: str, text: str):
+    await get_history(chat_id)
+    for role in ("user", "assistant"):
+        await save_message(chat_id, role, text)
+
+
+async def cold_turn(chat_id: str, text: str):
+    await clear_history(chat_id)
+    async with AsyncSessionLocal() as db:
+        await get_recent_history(chat_id, db)
+
+
+async def run(name: str, turn, chat_id: str, turns: int, text: str):
+    # Calentar la clave para los modos con caché caliente
+    await redis_client.rpush(f"chat:{chat_id}:history", json.dumps({"role": "user", "content": text}))
+    latencies = []
+    for _ in range(turns):
+        t0 = time.perf_counter()
+        await turn(chat_id, text)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    print(f"[{name:9}] {turns} turnos | {_summary(latencies)}")
+
+
+async def main(args):
+    text = "x " * args.message_words
+    bench_chat = args.chat_id or str(uuid.uuid4())
+    try:
+        await run("legacy", legacy_turn, f"bench-{uuid.uuid4().hex[:8]}", args.turns, text)
+        await run("pipelined", pipelined_turn, f"bench-{uuid.uuid4().hex[:8]}", args.turns, text)
+        await run("cold", cold_turn, bench_chat, args.turns, text)
+    finally:
+        for key in await redis_client.keys("chat:bench-*:history"):
+            await redis_client.delete(key)
+        if not args.chat_id:
+            await clear_history(bench_chat)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de memoria Redis por turno")
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--message-words", type=int, default=80)
+    parser.add_argument("--chat-id", default=None, help="chat existente para medir la lectura en frío desde PostgreSQL")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
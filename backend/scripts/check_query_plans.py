@@ -0,0 +1,259 @@
+# backend/scripts/check_query_plans.py
+"""
+Regresión de planes de consulta del esquema de chat y documentos.
+
+Crea un esquema temporal en PostgreSQL, aplica create_all + migraciones,
+siembra un volumen sintético grande y ejecuta EXPLAIN (ANALYZE, FORMAT JSON)
+de las consultas de services/conversation.py, services/transaction_manager.py,
+services/cleanup_worker.py y services/archiver.py, construidas por sus
+funciones *_query y compiladas con el dialecto de PostgreSQL (no hay SQL
+copiado a mano que se desincronice). Falla (exit 1) si una consulta deja de usar su
+índice esperado, hace Seq Scan sobre una tabla grande o excede su presupuesto
+de latencia. Pensado para correr en CI contra un PostgreSQL desechable.
+
+chat_messages está particionada: los índices y Seq Scan de cada partición
+se atribuyen al índice / tabla padre; un Seq Scan sobre una partición casi
+vacía (p. ej. chat_messages_default) no cuenta.
+
+Uso (desde backend/):
+    python -m scripts.check_query_plans --sessions 20000 --messages-per-session 50
+    python -m scripts.check_query_plans --keep    # conserva el esquema para inspección
+"""
+
+import sys
+import json
+import uuid
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.sql import Executable
+
+from services.db import engine, Base
+from services.migrations import apply_migrations, ENSURE_PARTITIONS_SQL
+from services.backfill import build_search_index
+from services import conversation, transaction_manager, archiver, cleanup_worker
+
+LARGE_TABLES = {"chat_messages", "chat_sessions", "documents", "upload_transactions", "document_versions"}
+
+SEED = [
+    """INSERT INTO chat_sessions (id, user_id, title, created_at, updated_at)
+       SELECT gen_random_uuid(), 'user' || (g % CAST(:users AS int)), 'Chat ' || g,
+              now() - make_interval(mins => g), now() - make_interval(secs => g)
+       FROM generate_series(1, CAST(:sessions AS int)) g""",
+    """INSERT INTO chat_messages (id, chat_id, role, content, timestamp)
+       SELECT gen_random_uuid(), s.id, CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END,
+              repeat('lorem ipsum ', 20) || CASE WHEN random() < 0.001 THEN 'la conexión VPN se cae' ELSE 'dolor sit amet' END,
+              s.created_at + make_interval(secs => g)
+       FROM chat_sessions s, generate_series(1, CAST(:per_session AS int)) g""",
+    """INSERT INTO documents (id, user_id, original_filename, file_hash, current_version, document_type,
+                             status, chunks_count, created_at, last_updated, metadata)
+       SELECT gen_random_uuid(), 'user' || (g % CAST(:users AS int)), 'file' || g || '.pdf',
+              encode(sha256((CASE WHEN g % 10 = 0 THEN g - 1 ELSE g END)::text::bytea), 'hex'),
+              1, 'user_private', CASE WHEN g % 20 = 0 THEN 'deleted' ELSE 'active' END,
+              (g % 300) + 1, now() - make_interval(mins => g), now(), '{}'::json
+       FROM generate_series(1, CAST(:documents AS int)) g""",
+    """INSERT INTO document_versions (id, document_id, version, file_hash, doc_id, created_at, chunks_count)
+       SELECT gen_random_uuid(), d.id, 1, d.file_hash, d.id::text, d.created_at, d.chunks_count
+       FROM documents d""",
+    """INSERT INTO upload_transactions (id, doc_id, user_id, status, created_at, updated_at)
+       SELECT gen_random_uuid(), gen_random_uuid()::text, 'user' || (g % CAST(:users AS int)),
+              CASE WHEN g % 100 = 0 THEN 'pending' ELSE 'completed' END,
+              now() - make_interval(mins => g), now()
+       FROM generate_series(1, CAST(:transactions AS int)) g""",
+]
+
+
+def query_cases(sample: Dict[str, Any]) -> List[Tuple[str, Executable, Optional[str], float, List[Executable]]]:
+    """
+    (nombre, sentencia, índice esperado o None, presupuesto ms, sentencias previas)
+
+    Las sentencias las construyen los propios servicios (funciones *_query),
+    así el plan que se comprueba es el de la consulta que corre en producción.
+    Las sentencias previas se ejecutan antes, en la misma transacción.
+    """
+    chat_id, user_id = sample["chat_id"], sample["user_id"]
+    delete_messages, delete_archive, delete_chat = conversation.delete_session_queries(chat_id)
+    return [
+        # services/conversation.py
+        ("conversation.get_or_create_session", conversation.session_query(chat_id), "chat_sessions_pkey", 5, []),
+        ("conversation.get_history_page", conversation.history_page_query(chat_id, 50), "ix_chat_messages_chat_ts", 10, []),
+        ("conversation.get_history_page(before)",
+         conversation.history_page_query(chat_id, 50, conversation.encode_cursor(sample["msg_ts"], sample["msg_id"])),
+         "ix_chat_messages_chat_ts", 10, []),
+        ("conversation.get_sessions_page", conversation.sessions_page_query(user_id, 50), "ix_chat_sessions_user_updated", 10, []),
+        ("conversation.get_sessions_page(cursor)",
+         conversation.sessions_page_query(user_id, 50, conversation.encode_cursor(sample["session_ts"], chat_id)),
+         "ix_chat_sessions_user_updated", 10, []),
+        ("conversation.search_sessions", conversation.search_sessions_query(user_id, "vpn", 20),
+         "ix_chat_messages_user_search", 50, []),
+        # Término presente en todos los mensajes: solo debe recorrer los del usuario
+        ("conversation.search_sessions(término común)", conversation.search_sessions_query(user_id, "lorem", 20),
+         "ix_chat_messages_user_search", 150, []),
+        ("conversation.open_history_page(dueño)", conversation.session_access_query(chat_id), "chat_sessions_pkey", 5, []),
+        ("conversation.delete_session(mensajes)", delete_messages, "ix_chat_messages_chat_ts", 20, []),
+        ("conversation.delete_session(archivo)", delete_archive, None, 5, [delete_messages]),
+        ("conversation.delete_session(sesión)", delete_chat, "chat_sessions_pkey", 20, [delete_messages, delete_archive]),
+        # services/transaction_manager.py
+        ("transaction_manager.get_document", transaction_manager.document_query(sample["doc_id"]), "documents_pkey", 5, []),
+        ("transaction_manager.commit_version", transaction_manager.document_query(sample["doc_id"], for_update=True),
+         "documents_pkey", 5, []),
+        ("transaction_manager.get_job", transaction_manager.job_query(sample["tx_id"]), "upload_transactions_pkey", 5, []),
+        ("transaction_manager.update_job", transaction_manager.update_job_query(sample["tx_id"], stage="embedding"),
+         "upload_transactions_pkey", 5, []),
+        ("transaction_manager.find_active_document",
+         transaction_manager.active_document_query(sample["doc_user_id"], sample["file_hash"]),
+         "uq_documents_user_file_hash_active", 5, []),
+        ("transaction_manager.duplicate_storage_report", transaction_manager.duplicate_report_query(100), None, 500, []),
+        # services/archiver.py
+        ("archiver.archive_cold_sessions", archiver.cold_sessions_query(datetime.now() - timedelta(days=7), 200),
+         "ix_chat_messages_chat_ts", 500, []),
+        ("archiver.archive_session(borrado)", archiver.archived_messages_delete(chat_id, sample["msg_ts"], sample["msg_id"]),
+         "ix_chat_messages_chat_ts", 20, []),
+        ("archiver.restore_session", archiver.archive_for_restore_query(chat_id), "chat_archives_pkey", 5, []),
+        # services/cleanup_worker.py
+        ("cleanup_worker.cleanup_orphaned_chunks", cleanup_worker.stale_transactions_query(datetime.utcnow() - timedelta(hours=1)),
+         "ix_upload_transactions_pending_created", 50, []),
+    ]
+
+
+def compile_statement(statement: Executable, dialect) -> Tuple[str, Any]:
+    """SQL y parámetros de una sentencia de SQLAlchemy, compilada con el dialecto de PostgreSQL de la conexión."""
+    compiled = statement.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+    if compiled.positional:
+        return compiled.string, tuple(compiled.params[k] for k in compiled.positiontup)
+    return compiled.string, compiled.params
+
+
+def walk_plan(node: Dict[str, Any], indexes: Set[str], seq_scans: Set[str], catalog: Dict[str, Any]):
+    if node.get("Index Name"):
+        indexes.add(catalog["parents"].get(node["Index Name"], node["Index Name"]))
+    if node.get("Node Type") == "Seq Scan":
+        relation = node.get("Relation Name")
+        if catalog["tuples"].get(relation, 0) > 1000:
+            seq_scans.add(catalog["parents"].get(relation, relation))
+    for child in node.get("Plans", []):
+        walk_plan(child, indexes, seq_scans, catalog)
+
+
+async def load_catalog(conn, schema: str) -> Dict[str, Any]:
+    """Partición / índice de partición -> padre, y filas estimadas por tabla."""
+    parents = dict((await conn.execute(text(
+        "SELECT c.relname, p.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = :schema"
+    ), {"schema": schema})).all())
+    tuples = dict((await conn.execute(text(
+        "SELECT c.relname, c.reltuples FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = :schema AND c.relkind = 'r'"
+    ), {"schema": schema})).all())
+    return {"parents": parents, "tuples": tuples}
+
+
+async def prepare(schema: str, args):
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+        await conn.execute(text(f'SET search_path TO "{schema}"'))
+        try:
+            await conn.run_sync(Base.metadata.create_all)
+            await apply_migrations(conn)
+            await conn.execute(text(ENSURE_PARTITIONS_SQL.format(months=2)))
+            params = {
+                "users": args.users, "sessions": args.sessions, "per_session": args.messages_per_session,
+                "documents": args.documents, "transactions": args.transactions,
+            }
+            for sql in SEED:
+                await conn.execute(text(sql), params)
+            # El índice de búsqueda lo crea services/backfill.py (aquí no hay filas que rellenar)
+            await build_search_index(conn)
+            await conn.execute(text("ANALYZE"))
+        finally:
+            await conn.execute(text("RESET search_path"))
+
+
+async def pick_sample(conn) -> Dict[str, Any]:
+    session = (await conn.execute(text(
+        "SELECT id, user_id, updated_at FROM chat_sessions ORDER BY updated_at DESC OFFSET 10 LIMIT 1"
+    ))).one()
+    message = (await conn.execute(text(
+        "SELECT id, timestamp FROM chat_messages WHERE chat_id = :c ORDER BY timestamp DESC OFFSET 5 LIMIT 1"
+    ), {"c": session.id})).one()
+    document = (await conn.execute(text(
+        "SELECT id, user_id, file_hash FROM documents WHERE status = 'active' LIMIT 1"
+    ))).one()
+    tx_id = (await conn.execute(text("SELECT id FROM upload_transactions LIMIT 1"))).scalar_one()
+    return {
+        "chat_id": session.id, "user_id": session.user_id, "session_ts": session.updated_at,
+        "msg_id": message.id, "msg_ts": message.timestamp,
+        "doc_id": document.id, "doc_user_id": document.user_id, "file_hash": document.file_hash,
+        "tx_id": tx_id,
+    }
+
+
+async def check(schema: str, budget_scale: float) -> int:
+    failures = 0
+    async with engine.connect() as conn:
+        await conn.execute(text(f'SET LOCAL search_path TO "{schema}"'))
+        sample = await pick_sample(conn)
+        catalog = await load_catalog(conn, schema)
+        await conn.rollback()
+
+        for name, statement, expected_index, budget_ms, setup in query_cases(sample):
+            # Cada EXPLAIN ANALYZE corre en una transacción que se revierte (DELETE/UPDATE incluidos)
+            await conn.execute(text(f'SET LOCAL search_path TO "{schema}"'))
+            for previous in setup:
+                await conn.execute(previous)
+            sql, params = compile_statement(statement, conn.dialect)
+            result = await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+            raw = result.scalar_one()
+            await conn.rollback()
+
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+            indexes, seq_scans = set(), set()
+            walk_plan(plan["Plan"], indexes, seq_scans, catalog)
+            elapsed = plan["Execution Time"]
+
+            problems = []
+            if expected_index and expected_index not in indexes:
+                problems.append(f"no usa {expected_index} (usa {sorted(indexes) or 'ninguno'})")
+            if expected_index and seq_scans & LARGE_TABLES:
+                problems.append(f"Seq Scan en {sorted(seq_scans & LARGE_TABLES)}")
+            if elapsed > budget_ms * budget_scale:
+                problems.append(f"{elapsed:.1f} ms > presupuesto {budget_ms * budget_scale:.0f} ms")
+
+            status = "FAIL" if problems else "ok"
+            print(f"[{status:4}] {name:45} {elapsed:8.2f} ms  {', '.join(problems)}")
+            failures += bool(problems)
+    return failures
+
+
+async def main(args) -> int:
+    schema = f"qp_check_{uuid.uuid4().hex[:8]}"
+    print(f"Sembrando datos sintéticos en el esquema '{schema}'...")
+    try:
+        await prepare(schema, args)
+        failures = await check(schema, args.budget_scale)
+    finally:
+        if not args.keep:
+            async with engine.begin() as conn:
+                await conn.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
+        await engine.dispose()
+    print(f"\n{failures} consultas con regresión" if failures else "\nTodas las consultas dentro de plan y presupuesto")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regresión de planes de consulta (EXPLAIN ANALYZE)")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--messages-per-session", type=int, default=50)
+    parser.add_argument("--documents", type=int, default=50000)
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="multiplica todos los presupuestos (p. ej. 3 en CI lento)")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(main(args)))
@@ -0,0 +1,109 @@
+# backend/scripts/migrate_index.py
+"""
+Reconstruye en sitio el índice vectorial de la colección con otro tipo
+(p. ej. IVF_FLAT -> IVF_SQ8 / IVF_PQ / HNSW_SQ) y reporta el cambio de
+memoria y de recall@k (con y sin re-scoring sobre los vectores originales).
+
+La colección queda sin servir búsquedas mientras el índice se reconstruye.
+
+Uso (desde backend/):
+    python -m scripts.migrate_index --index-type IVF_SQ8 --sample 200
+    python -m scripts.migrate_index --index-type IVF_PQ --dry-run
+"""
+
+import argparse
+from typing import Dict, List
+
+import numpy as np
+from pymilvus import connections, Collection, utility
+
+from core.config import settings
+from services.index_params import build_index_params, build_search_params, describe_index, estimate_vector_bytes, invalidate_index_cache
+from services.retrieval import exact_score
+from scripts.tune_index import exact_topk, sample_queries
+
+
+def measured_memory(name: str) -> int:
+    """Memoria reportada por los query nodes para los segmentos cargados."""
+    try:
+        return sum(int(getattr(seg, "mem_size", 0)) for seg in utility.get_query_segment_info(name))
+    except Exception:
+        return 0
+
+
+def recall_at_k(col: Collection, queries: np.ndarray, truth: List[List[str]], k: int, rescore_factor: int = 1) -> float:
+    limit = k * rescore_factor
+    param = build_search_params(col, limit)
+    output_fields = ["chunk_id", "embedding"] if rescore_factor > 1 else ["chunk_id"]
+    res = col.search(data=queries.tolist(), anns_field="embedding", param=param, limit=limit, output_fields=output_fields)
+
+    recalls = []
+    for query, hits, expected in zip(queries.tolist(), res, truth):
+        if rescore_factor > 1:
+            scored = [(hit.entity.get("chunk_id"), exact_score(query, hit.entity.get("embedding"))) for hit in hits]
+            scored.sort(key=lambda x: x[1], reverse=settings.MILVUS_METRIC.upper() != "L2")
+            found = {cid for cid, _ in scored[:k]}
+        else:
+            found = {hit.entity.get("chunk_id") for hit in hits}
+        recalls.append(len(found & set(expected)) / max(len(expected), 1))
+    return float(np.mean(recalls))
+
+
+def snapshot(col: Collection, queries: np.ndarray, truth: List[List[str]], k: int) -> Dict:
+    info = describe_index(col)
+    return {
+        "index": f"{info['index_type']} {info['params']}",
+        "estimated_mb": estimate_vector_bytes(info["index_type"], info["params"]) * col.num_entities / 2**20,
+        "measured_mb": measured_memory(col.name) / 2**20,
+        "recall": recall_at_k(col, queries, truth, k),
+        "recall_rescored": recall_at_k(col, queries, truth, k, settings.MILVUS_RESCORE_FACTOR),
+    }
+
+
+def print_report(before: Dict, after: Dict, k: int):
+    print(f"\n{'':>22} | {'antes':>28} | {'después':>28}")
+    print(f"{'índice':>22} | {before['index']:>28} | {after['index']:>28}")
+    for key, label in [("estimated_mb", "memoria estimada MB"), ("measured_mb", "memoria medida MB"),
+                       ("recall", f"recall@{k}"), ("recall_rescored", f"recall@{k} re-scoring")]:
+        print(f"{label:>22} | {before[key]:>28.4f} | {after[key]:>28.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migración en sitio del índice vectorial de Milvus")
+    parser.add_argument("--collection", default=settings.MILVUS_COLLECTION)
+    parser.add_argument("--index-type", required=True, help="IVF_FLAT | IVF_SQ8 | IVF_PQ | HNSW | HNSW_SQ")
+    parser.add_argument("--sample", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=settings.MILVUS_TOP_K)
+    parser.add_argument("--dry-run", action="store_true", help="Solo mostrar estado actual y estimación")
+    args = parser.parse_args()
+
+    connections.connect("default", host=settings.MILVUS_HOST, port=settings.MILVUS_PORT)
+    col = Collection(args.collection)
+    col.load()
+
+    new_params = build_index_params(col.num_entities, args.index_type)
+    queries = sample_queries(col, args.sample, None)
+    truth = exact_topk(col, queries, args.top_k)
+    before = snapshot(col, queries, truth, args.top_k)
+
+    if args.dry_run:
+        est = estimate_vector_bytes(new_params["index_type"], new_params["params"]) * col.num_entities / 2**20
+        print(f"Índice actual: {before['index']} ({before['estimated_mb']:.1f} MB estimados, recall@{args.top_k}={before['recall']:.4f})")
+        print(f"Índice propuesto: {new_params} ({est:.1f} MB estimados)")
+        return
+
+    print(f"Reconstruyendo índice de '{col.name}' -> {new_params}")
+    col.release()
+    col.drop_index()
+    col.create_index(field_name="embedding", index_params=new_params)
+    utility.wait_for_index_building_complete(col.name)
+    invalidate_index_cache(col.name)
+    col.load()
+
+    after = snapshot(col, queries, truth, args.top_k)
+    print_report(before, after, args.top_k)
+    print(f"\nRecuerda fijar MILVUS_INDEX_TYPE={new_params['index_type']} en el .env.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# backend/scripts/migrate_schema.py
+"""
+Migración en línea al esquema actual de Milvus (v3: solo ids, ACL y vectores).
+
+1. Crea la colección física "<MILVUS_COLLECTION>_v<SCHEMA_VERSION>".
+2. Copia todos los chunks (incluidos los vectores) por lotes con upsert,
+   que es idempotente: se puede re-ejecutar para ponerse al día. Si el
+   origen todavía guarda `text`/`metadata` (v1/v2), los vuelca a la tabla
+   document_chunks de PostgreSQL en el mismo recorrido. Mientras copia, el
+   API duplica sus escrituras en la nueva colección (marca en Redis) y al
+   final una pasada por chunk_id recoge lo que la copia no vio.
+3. Cambia el alias MILVUS_COLLECTION para que apunte a la nueva colección.
+   Si MILVUS_COLLECTION todavía es una colección física (esquema v1), se
+   renombra a "<MILVUS_COLLECTION>_v1" y se crea el alias; entre ambos pasos
+   hay una ventana de milisegundos sin colección.
+
+Uso (desde backend/):
+    python -m scripts.migrate_schema --batch-size 1000
+    python -m scripts.migrate_schema --copy-only    # sin cambiar el alias
+"""
+
+import argparse
+import asyncio
+import time
+
+from pymilvus import connections, Collection, utility
+
+from core.config import settings
+from services.indexing import SCHEMA_VERSION, physical_name, resolve_collection_name, create_physical_collection
+from services.index_params import invalidate_index_cache
+from services.rebuild import copy_chunks, catch_up
+from services.write_coordinator import write_coordinator
+from services.db import init_db
+
+def _print_progress(t0: float):
+    def on_batch(copied: int):
+        elapsed = time.perf_counter() - t0
+        print(f"  copiados {copied} chunks ({copied / max(elapsed, 1e-6):.0f} chunks/s)")
+    return on_batch
+
+
+async def _migrate(alias: str, source_name: str, source: Collection, target: Collection, batch_size: int, copy_only: bool):
+    await init_db()  # crea document_chunks si el API aún no arrancó con este esquema
+    await write_coordinator.set_rebuild_target(target.name)
+    try:
+        copied = await copy_chunks(source, target, batch_size, on_batch=_print_progress(time.perf_counter()))
+        diff = await catch_up(source, target, batch_size)
+        print(f"Copia terminada: {copied} chunks, puesta al día {diff}")
+        if copy_only:
+            return
+        await asyncio.to_thread(swap_alias, alias, source_name, target.name)
+        invalidate_index_cache(alias)
+        print(f"Alias '{alias}' -> '{target.name}'")
+    finally:
+        await write_coordinator.set_rebuild_target(None)
+
+
+def swap_alias(alias: str, source_name: str, target_name: str):
+    if source_name != alias:
+        # Ya es un alias: el cambio es atómico
+        utility.alter_alias(collection_name=target_name, alias=alias)
+        return
+    # Esquema v1: la colección física ocupa el nombre del alias
+    legacy = f"{alias}_v1"
+    utility.rename_collection(alias, legacy)
+    utility.create_alias(collection_name=target_name, alias=alias)
+    print(f"Colección anterior conservada como '{legacy}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migración de esquema Milvus con cambio de alias")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--copy-only", action="store_true")
+    args = parser.parse_args()
+
+    connections.connect("default", host=settings.MILVUS_HOST, port=settings.MILVUS_PORT)
+    alias = settings.MILVUS_COLLECTION
+    target_name = physical_name(SCHEMA_VERSION)
+
+    source_name = resolve_collection_name(alias)
+    if source_name == target_name:
+        print(f"'{alias}' ya apunta a '{target_name}', nada que migrar.")
+        return
+
+    source = Collection(source_name)
+    source.load()
+    target = Collection(target_name) if utility.has_collection(target_name) else create_physical_collection(target_name, source.num_entities)
+
+    print(f"Copiando {source.num_entities} entidades de '{source_name}' a '{target_name}'...")
+    asyncio.run(_migrate(alias, source_name, source, target, args.batch_size, args.copy_only))
+
+
+if __name__ == "__main__":
+    main()
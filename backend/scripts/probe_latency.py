@@ -0,0 +1,78 @@
+# backend/scripts/probe_latency.py
+"""
+Sonda de latencia del API durante una ingesta.
+
+Consulta /health/live a intervalos fijos mientras (opcionalmente) sube un
+archivo, y reporta p50/p95/máx del lado cliente junto con el retraso del
+event loop medido por el servidor (/health/metrics).
+
+Uso (desde backend/):
+    python -m scripts.probe_latency --url http://localhost:8080 --file grande.pdf --api-key $API_KEY
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+def _summary(values):
+    if not values:
+        return "sin datos"
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    return f"n={len(ordered)} p50={pick(0.5):.1f} ms p95={pick(0.95):.1f} ms max={ordered[-1]:.1f} ms"
+
+
+async def probe(client: httpx.AsyncClient, url: str, duration: float, hz: float):
+    latencies = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        t0 = time.perf_counter()
+        await client.get(f"{url}/health/live")
+        latencies.append((time.perf_counter() - t0) * 1000)
+        await asyncio.sleep(max(1 / hz - (time.perf_counter() - t0), 0))
+    return latencies
+
+
+async def wait_job(client: httpx.AsyncClient, url: str, job_id: str, headers: dict):
+    while True:
+        r = await client.get(f"{url}/ingest/jobs/{job_id}", headers=headers)
+        if r.status_code != 200 or r.json().get("status") in ("completed", "failed"):
+            return r.json() if r.status_code == 200 else {"status": r.status_code}
+        await asyncio.sleep(1)
+
+
+async def main(args):
+    headers = {"X-Api-Key": args.api_key} if args.api_key else {}
+    cookies = {"access_token": args.token} if args.token else {}
+    async with httpx.AsyncClient(timeout=60, cookies=cookies) as client:
+        baseline = await probe(client, args.url, 5, args.hz)
+        print(f"Reposo:   {_summary(baseline)}")
+
+        if args.file:
+            with open(args.file, "rb") as f:
+                r = await client.post(f"{args.url}/admin/ingest-file", files={"file": (args.file, f)}, headers=headers)
+            job = r.json()
+            print(f"Ingesta encolada: {job}")
+            probe_task = asyncio.create_task(probe(client, args.url, args.duration, args.hz))
+            if job.get("job_id") and args.token:
+                print(f"Job: {await wait_job(client, args.url, job['job_id'], headers)}")
+            during = await probe_task
+            print(f"Ingesta:  {_summary(during)}")
+
+        server = (await client.get(f"{args.url}/health/metrics")).json()
+        lag = server.get("histograms", {}).get("event_loop_lag_ms")
+        print(f"Retraso del event loop (servidor): {lag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sonda de latencia durante ingesta")
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--file", default=None)
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--token", default=None, help="Cookie access_token para consultar el job")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--hz", type=float, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,172 @@
+# backend/scripts/tune_index.py
+"""
+Ajuste offline de los parámetros de búsqueda ANN.
+
+Compara los resultados de Milvus contra una búsqueda exacta (fuerza bruta)
+sobre una muestra de consultas, reporta la frontera recall@k vs. latencia y,
+opcionalmente, escribe el valor elegido en el .env.
+
+Uso (desde backend/):
+    python -m scripts.tune_index --sample 200 --top-k 5 --target-recall 0.95 --write
+    python -m scripts.tune_index --queries preguntas.txt --write
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from dotenv import find_dotenv, set_key
+from pymilvus import connections, Collection
+
+from core.config import settings
+from services.embeddings import get_embeddings
+from services.index_params import SEARCH_PARAM_BY_INDEX, describe_index
+
+SWEEP_VALUES = {
+    "nprobe": [1, 2, 4, 8, 16, 32, 64, 128, 256],
+    "ef": [16, 32, 64, 128, 256, 512],
+    "search_list": [16, 32, 64, 100, 200, 400],
+}
+ENV_KEYS = {"nprobe": "MILVUS_NPROBE", "ef": "MILVUS_EF", "search_list": "MILVUS_SEARCH_LIST"}
+
+
+def _scores(queries: np.ndarray, block: np.ndarray) -> np.ndarray:
+    """Similitud exacta según la métrica configurada (mayor = mejor)."""
+    metric = settings.MILVUS_METRIC.upper()
+    if metric == "L2":
+        return 2 * queries @ block.T - (block ** 2).sum(axis=1)[None, :]
+    if metric == "COSINE":
+        block = block / np.linalg.norm(block, axis=1, keepdims=True).clip(min=1e-12)
+    return queries @ block.T
+
+
+def exact_topk(col: Collection, queries: np.ndarray, k: int, batch_size: int = 4096) -> List[List[str]]:
+    """
+    Top-k exacto recorriendo toda la colección por lotes (memoria acotada).
+    """
+    if settings.MILVUS_METRIC.upper() == "COSINE":
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True).clip(min=1e-12)
+
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((len(queries), 0), dtype=object)
+
+    iterator = col.query_iterator(batch_size=batch_size, expr="chunk_id != ''", output_fields=["chunk_id", "embedding"])
+    while True:
+        rows = iterator.next()
+        if not rows:
+            iterator.close()
+            break
+        block = np.asarray([r["embedding"] for r in rows], dtype=np.float32)
+        ids = np.asarray([r["chunk_id"] for r in rows], dtype=object)
+
+        scores = np.concatenate([best_scores, _scores(queries, block)], axis=1)
+        all_ids = np.concatenate([best_ids, np.broadcast_to(ids, (len(queries), len(ids)))], axis=1)
+        keep = min(k, scores.shape[1])
+        top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(all_ids, top, axis=1)
+
+    return [list(row) for row in best_ids]
+
+
+def sample_queries(col: Collection, n: int, queries_file: str | None) -> np.ndarray:
+    if queries_file:
+        with open(queries_file, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+        vectors = asyncio.run(get_embeddings(texts, input_type="query"))
+        return np.asarray(vectors, dtype=np.float32)
+
+    rows = col.query(expr="chunk_id != ''", output_fields=["embedding"], limit=max(n * 10, n))
+    rows = random.sample(rows, min(n, len(rows)))
+    return np.asarray([r["embedding"] for r in rows], dtype=np.float32)
+
+
+def sweep(col: Collection, queries: np.ndarray, truth: List[List[str]], key: str, k: int) -> List[Dict]:
+    points = []
+    for value in SWEEP_VALUES[key]:
+        if key != "nprobe" and value < k:
+            continue
+        param = {"metric_type": settings.MILVUS_METRIC, "params": {key: value}}
+        latencies, recalls = [], []
+        for q, expected in zip(queries, truth):
+            t0 = time.perf_counter()
+            res = col.search(data=[q.tolist()], anns_field="embedding", param=param, limit=k, output_fields=["chunk_id"])
+            latencies.append((time.perf_counter() - t0) * 1000)
+            found = {hit.entity.get("chunk_id") for hit in res[0]}
+            recalls.append(len(found & set(expected)) / max(len(expected), 1))
+        points.append({
+            key: value,
+            "recall": float(np.mean(recalls)),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+        })
+    return points
+
+
+def pareto_frontier(points: List[Dict]) -> List[Dict]:
+    frontier, best_recall = [], -1.0
+    for p in sorted(points, key=lambda p: p["p95_ms"]):
+        if p["recall"] > best_recall:
+            frontier.append(p)
+            best_recall = p["recall"]
+    return frontier
+
+
+def choose(points: List[Dict], target: float) -> Tuple[Dict, bool]:
+    ok = [p for p in points if p["recall"] >= target]
+    if ok:
+        return min(ok, key=lambda p: p["p95_ms"]), True
+    return max(points, key=lambda p: p["recall"]), False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ajuste de parámetros de búsqueda ANN en Milvus")
+    parser.add_argument("--collection", default=settings.MILVUS_COLLECTION)
+    parser.add_argument("--sample", type=int, default=200, help="Número de consultas de muestra")
+    parser.add_argument("--queries", default=None, help="Archivo con una pregunta por línea (opcional)")
+    parser.add_argument("--top-k", type=int, default=settings.MILVUS_TOP_K)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--write", action="store_true", help="Escribir el valor elegido en el .env")
+    args = parser.parse_args()
+
+    connections.connect("default", host=settings.MILVUS_HOST, port=settings.MILVUS_PORT)
+    col = Collection(args.collection)
+    col.load()
+
+    info = describe_index(col)
+    key = SEARCH_PARAM_BY_INDEX.get(info["index_type"])
+    print(f"Colección: {col.name} | entidades: {col.num_entities} | índice: {info['index_type']} {info['params']}")
+    if key is None:
+        print("El índice no tiene parámetros de búsqueda ajustables.")
+        return
+
+    queries = sample_queries(col, args.sample, args.queries)
+    print(f"Consultas de muestra: {len(queries)} — calculando top-{args.top_k} exacto...")
+    truth = exact_topk(col, queries, args.top_k)
+
+    points = sweep(col, queries, truth, key, args.top_k)
+    print(f"\n{key:>12} | recall@{args.top_k} | p50 ms | p95 ms")
+    for p in points:
+        print(f"{p[key]:>12} | {p['recall']:.4f}   | {p['p50_ms']:6.2f} | {p['p95_ms']:6.2f}")
+
+    print("\nFrontera recall vs. latencia:")
+    for p in pareto_frontier(points):
+        print(f"  {key}={p[key]} recall={p['recall']:.4f} p95={p['p95_ms']:.2f} ms")
+
+    chosen, reached = choose(points, args.target_recall)
+    status = "alcanza" if reached else "NO alcanza"
+    print(f"\nElegido: {key}={chosen[key]} ({status} recall objetivo {args.target_recall})")
+
+    if args.write:
+        env_path = find_dotenv(usecwd=True) or ".env"
+        set_key(env_path, ENV_KEYS[key], str(chosen[key]))
+        print(f"Escrito {ENV_KEYS[key]}={chosen[key]} en {env_path}")
+
+    col.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# backend/services/archiver.py
+"""
+Retención de chat_messages.
+
+La tabla está particionada por mes (migración 5); este worker crea por
+adelantado las particiones de los próximos meses y mueve los chats fríos
+(sin mensajes en CHAT_ARCHIVE_AFTER_DAYS días) a `chat_archives`: un JSON
+comprimido con zlib por sesión. Al abrir un chat archivado sus mensajes se
+restauran en chat_messages dentro de una transacción (ver
+services/conversation.py).
+"""
+
+import json
+import zlib
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Any
+from sqlalchemy import select, update, delete, func, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from core.config import settings
+from services.db import AsyncSessionLocal, ChatSession, ChatMessage, ChatArchive
+from services.migrations import ensure_partitions
+from services import metrics
+
+log = logging.getLogger(__name__)
+
+RESTORE_BATCH = 1000  # filas por INSERT (límite de parámetros de asyncpg)
+
+
+def _pack(rows) -> bytes:
+    messages = [
+        {"id": str(m.id), "role": m.role, "content": m.content, "timestamp": m.timestamp.isoformat()}
+        for m in rows
+    ]
+    return zlib.compress(json.dumps(messages, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _unpack(payload: bytes, chat_id: uuid.UUID) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": uuid.UUID(m["id"]),
+            "chat_id": chat_id,
+            "role": m["role"],
+            "content": m["content"],
+            "timestamp": datetime.fromisoformat(m["timestamp"]),
+        }
+        for m in json.loads(zlib.decompress(payload))
+    ]
+
+
+# Sentencias compartidas con scripts/check_query_plans.py (EXPLAIN ANALYZE)
+def archived_messages_delete(chat_id, last_timestamp: datetime, last_id):
+    # Rango en vez de la lista de ids: un IN con miles de ids supera el límite de parámetros de asyncpg
+    return (
+        delete(ChatMessage)
+        .where(ChatMessage.chat_id == chat_id, tuple_(ChatMessage.timestamp, ChatMessage.id) <= tuple_(last_timestamp, last_id))
+    )
+
+
+def cold_sessions_query(cutoff: datetime, limit: int):
+    last_message = (
+        select(func.max(ChatMessage.timestamp))
+        .where(ChatMessage.chat_id == ChatSession.id)
+        .scalar_subquery()
+    )
+    return (
+        select(ChatSession.id)
+        .where(ChatSession.archived_at.is_(None), ChatSession.updated_at < cutoff, last_message < cutoff)
+        .limit(limit)
+    )
+
+
+def archive_for_restore_query(chat_id: uuid.UUID):
+    return select(ChatArchive).where(ChatArchive.chat_id == chat_id).with_for_update()
+
+
+async def archive_session(chat_id: uuid.UUID, cutoff: datetime) -> bool:
+    """
+    Archiva un chat si sigue frío. La sesión se bloquea (SKIP LOCKED) para no
+    competir con una restauración; solo se borran los mensajes hasta el
+    último copiado en orden (timestamp, id), así un mensaje que llegue a la
+    vez se queda en chat_messages.
+    """
+    async with AsyncSessionLocal() as db:
+        locked = (await db.execute(
+            select(ChatSession.id)
+            .where(ChatSession.id == chat_id, ChatSession.archived_at.is_(None))
+            .with_for_update(skip_locked=True)
+        )).scalar_one_or_none()
+        if locked is None:
+            return False
+
+        rows = (await db.execute(
+            select(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.timestamp)
+            .where(ChatMessage.chat_id == chat_id)
+            .order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+        )).all()
+        if not rows or rows[-1].timestamp >= cutoff:
+            return False
+
+        payload = _pack(rows)
+        db.add(ChatArchive(
+            chat_id=chat_id,
+            archived_at=datetime.now(),
+            message_count=len(rows),
+            last_message_at=rows[-1].timestamp,
+            payload=payload,
+        ))
+        await db.execute(archived_messages_delete(chat_id, rows[-1].timestamp, rows[-1].id))
+        # updated_at se conserva para no reordenar la lista de chats
+        await db.execute(
+            update(ChatSession)
+            .where(ChatSession.id == chat_id)
+            .values(archived_at=datetime.now(), updated_at=ChatSession.updated_at)
+        )
+        await db.commit()
+
+    metrics.incr("chat_archived_sessions")
+    metrics.incr("chat_archived_messages", len(rows))
+    metrics.observe("chat_archive_payload_kb", len(payload) / 1024)
+    return True
+
+
+async def archive_cold_sessions(limit: int = None) -> int:
+    """Archiva hasta `limit` chats sin mensajes desde hace CHAT_ARCHIVE_AFTER_DAYS días."""
+    limit = limit or settings.CHAT_ARCHIVE_BATCH
+    cutoff = datetime.now() - timedelta(days=settings.CHAT_ARCHIVE_AFTER_DAYS)
+
+    async with AsyncSessionLocal() as db:
+        candidates = (await db.execute(cold_sessions_query(cutoff, limit))).scalars().all()
+
+    archived = 0
+    for chat_id in candidates:
+        try:
+            archived += await archive_session(chat_id, cutoff)
+        except Exception as e:
+            log.error(f"❌ Error archivando el chat {chat_id}: {e}")
+    return archived
+
+
+async def restore_session(chat_id) -> bool:
+    """
+    Devuelve los mensajes archivados de un chat a chat_messages. El archivo
+    se bloquea (FOR UPDATE): si dos peticiones abren el chat a la vez, la
+    segunda espera y ya no encuentra nada que restaurar.
+    """
+    t0 = time.perf_counter()
+    chat_uuid = uuid.UUID(str(chat_id))
+    async with AsyncSessionLocal() as db:
+        archive = (await db.execute(archive_for_restore_query(chat_uuid))).scalar_one_or_none()
+        if archive is None:
+            return False
+
+        rows = _unpack(archive.payload, chat_uuid)
+        for i in range(0, len(rows), RESTORE_BATCH):
+            await db.execute(
+                pg_insert(ChatMessage.__table__).values(rows[i:i + RESTORE_BATCH]).on_conflict_do_nothing()
+            )
+        await db.delete(archive)
+        await db.execute(
+            update(ChatSession)
+            .where(ChatSession.id == chat_uuid)
+            .values(archived_at=None, updated_at=ChatSession.updated_at)
+        )
+        await db.commit()
+
+    metrics.incr("chat_restored_sessions")
+    metrics.observe("chat_restore_ms", (time.perf_counter() - t0) * 1000)
+    log.info(f"♻️ Chat {chat_id} restaurado desde el archivo ({len(rows)} mensajes)")
+    return True
+
+
+async def run_archiver():
+    """Tarea del lifespan: particiones por adelantado y archivo de chats fríos."""
+    while True:
+        try:
+            await ensure_partitions()
+            if settings.CHAT_ARCHIVE_AFTER_DAYS > 0:
+                total = 0
+                while True:
+                    archived = await archive_cold_sessions()
+                    total += archived
+                    if archived < settings.CHAT_ARCHIVE_BATCH:
+                        break
+                if total:
+                    log.info(f"🧊 {total} chats fríos archivados")
+        except Exception as e:
+            log.error(f"❌ Error en el archivado de chats: {e}")
+        await asyncio.sleep(settings.CHAT_ARCHIVE_INTERVAL_S)
@@ -0,0 +1,181 @@
+# backend/services/backfill.py
+"""
+Rellenos de datos que no deben correr dentro de una migración.
+
+Las migraciones se aplican al arrancar, bajo el advisory lock de
+services/migrations.py: un UPDATE de toda chat_messages ahí reescribe cada
+fila en una sola transacción y retiene el arranque (y las filas) hasta
+terminar. Aquí el relleno avanza por lotes de BACKFILL_BATCH filas (keyset
+por id, un COMMIT por lote) en una tarea del lifespan, y los índices que
+dependen de él se crean al final. Cada relleno terminado queda registrado
+en `schema_backfills` y no se repite.
+
+Uso manual (desde backend/):
+    python -m services.backfill
+"""
+
+import time
+import asyncio
+import logging
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from core.config import settings
+from services.db import engine
+from services import metrics
+
+log = logging.getLogger(__name__)
+
+# Distinta de la de las migraciones: el relleno no retiene el arranque de otras réplicas
+LOCK_KEY = 7342002
+
+SEARCH_INDEX = "ix_chat_messages_user_search"
+LEGACY_SEARCH_INDEXES = ["ix_chat_messages_search", "chat_messages_legacy_search"]
+
+# search_vector (si el mensaje es anterior al trigger de la migración 4) y
+# user_id (migración 7) de los mensajes con id en (:last, :upto]
+BACKFILL_CHAT_MESSAGES_SQL = """UPDATE chat_messages m
+SET search_vector = coalesce(m.search_vector, to_tsvector('spanish', coalesce(m.content, ''))),
+    user_id = coalesce(m.user_id, (SELECT s.user_id FROM chat_sessions s WHERE s.id = m.chat_id))
+WHERE m.id > :last AND m.id <= :upto AND (m.search_vector IS NULL OR m.user_id IS NULL)"""
+
+
+async def finished_backfills(conn: AsyncConnection) -> set:
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_backfills ("
+        " name TEXT PRIMARY KEY,"
+        " finished_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+    ))
+    return set((await conn.execute(text("SELECT name FROM schema_backfills"))).scalars())
+
+
+async def backfill_chat_messages(conn: AsyncConnection, batch: int = None) -> int:
+    """
+    Rellena search_vector y user_id de chat_messages por lotes. `conn` debe
+    estar en AUTOCOMMIT: cada UPDATE es su propia transacción, así ningún
+    lote retiene bloqueos más de lo que tarda. Devuelve las filas tocadas.
+    """
+    batch = batch or settings.BACKFILL_BATCH
+    last, total = "00000000-0000-0000-0000-000000000000", 0
+    while True:
+        t0 = time.perf_counter()
+        upto = (await conn.execute(
+            text("SELECT max(id) FROM (SELECT id FROM chat_messages WHERE id > CAST(:last AS uuid) ORDER BY id LIMIT :n) b"),
+            {"last": last, "n": batch},
+        )).scalar_one_or_none()
+        if upto is None:
+            return total
+        result = await conn.execute(text(BACKFILL_CHAT_MESSAGES_SQL), {"last": last, "upto": upto})
+        total += result.rowcount
+        last = str(upto)
+        metrics.observe("backfill_batch_ms", (time.perf_counter() - t0) * 1000)
+        if settings.BACKFILL_PAUSE_S:
+            await asyncio.sleep(settings.BACKFILL_PAUSE_S)
+
+
+async def _drop_if_invalid(conn: AsyncConnection, index: str):
+    # Un CREATE INDEX CONCURRENTLY interrumpido deja un índice inválido que IF NOT EXISTS no reconstruiría
+    invalid = (await conn.execute(text(
+        "SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(:i) AND NOT indisvalid"
+    ), {"i": index})).scalar_one_or_none()
+    if invalid:
+        await conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index}"'))
+
+
+async def build_search_index(conn: AsyncConnection):
+    """
+    Índice GIN (user_id, search_vector) para search_sessions (requiere
+    btree_gin, migración 7). En la tabla particionada se crea el índice padre
+    con ON ONLY, cada partición con CONCURRENTLY y luego se adjuntan: así
+    ninguna escritura queda bloqueada mientras se construye. Las particiones
+    nuevas (ensure_partitions) lo heredan solas. Después borra el índice GIN
+    anterior, que ya no usa ninguna consulta.
+    """
+    relkind = (await conn.execute(text(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass('chat_messages')"
+    ))).scalar_one()
+
+    if relkind == "p":
+        await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON ONLY chat_messages USING gin (user_id, search_vector)"))
+        partitions = (await conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass('chat_messages') ORDER BY c.relname"
+        ))).scalars().all()
+        for partition in partitions:
+            attached = (await conn.execute(text(
+                "SELECT 1 FROM pg_inherits i JOIN pg_index x ON x.indexrelid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:parent) AND x.indrelid = to_regclass(:partition)"
+            ), {"parent": SEARCH_INDEX, "partition": partition})).scalar_one_or_none()
+            if attached:
+                continue
+            index = f"{partition}_user_search"
+            await _drop_if_invalid(conn, index)
+            await conn.execute(text(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index}" ON "{partition}" USING gin (user_id, search_vector)'
+            ))
+            await conn.execute(text(f'ALTER INDEX {SEARCH_INDEX} ATTACH PARTITION "{index}"'))
+    else:
+        await _drop_if_invalid(conn, SEARCH_INDEX)
+        await conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {SEARCH_INDEX} ON chat_messages USING gin (user_id, search_vector)"
+        ))
+
+    # Un índice padre de tabla particionada no admite DROP CONCURRENTLY: DROP con
+    # lock_timeout; si no consigue el bloqueo el índice viejo se queda (solo cuesta escrituras)
+    for index in LEGACY_SEARCH_INDEXES:
+        try:
+            await conn.execute(text("SET lock_timeout = '5s'"))
+            await conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        except Exception as e:
+            log.warning(f"⚠️ No se pudo borrar el índice {index}: {e}")
+        finally:
+            await conn.execute(text("RESET lock_timeout"))
+
+
+async def _chat_messages_search_user(conn: AsyncConnection):
+    rows = await backfill_chat_messages(conn)
+    log.info(f"🔎 {rows} mensajes de chat rellenados; creando {SEARCH_INDEX}")
+    await build_search_index(conn)
+
+
+BACKFILLS = [
+    ("chat_messages_search_user", "search_vector y user_id de chat_messages + índice GIN (user_id, search_vector)",
+     _chat_messages_search_user),
+]
+
+
+async def run_backfills():
+    """
+    Tarea del lifespan: aplica los rellenos pendientes una sola vez. Solo
+    una réplica los corre (pg_try_advisory_lock); el resto sigue de largo.
+    """
+    try:
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            done = await finished_backfills(conn)
+            pending = [b for b in BACKFILLS if b[0] not in done]
+            if not pending:
+                return
+            if not (await conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": LOCK_KEY})).scalar_one():
+                return
+            try:
+                # Otra réplica pudo terminarlos mientras se esperaba el lock
+                done = await finished_backfills(conn)
+                for name, description, run in [b for b in pending if b[0] not in done]:
+                    log.info(f"🛠️ Relleno {name}: {description}")
+                    t0 = time.perf_counter()
+                    await run(conn)
+                    await conn.execute(
+                        text("INSERT INTO schema_backfills (name) VALUES (:n) ON CONFLICT DO NOTHING"), {"n": name}
+                    )
+                    log.info(f"✅ Relleno {name} terminado en {time.perf_counter() - t0:.0f} s")
+            finally:
+                await conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": LOCK_KEY})
+    except Exception as e:
+        log.error(f"❌ Error en los rellenos de datos: {e}")
+
+
+if __name__ == "__main__":
+    from core.logging import configure_logging
+
+    configure_logging()
+    asyncio.run(run_backfills())
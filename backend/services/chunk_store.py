@@ -0,0 +1,173 @@
+# backend/services/chunk_store.py
+
+import uuid
+import hashlib
+import logging
+from typing import Dict, Any, List, Iterable, Optional, Tuple
+from sqlalchemy import select, update, delete, or_, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from services.db import AsyncSessionLocal, DocumentChunk, Document
+
+log = logging.getLogger(__name__)
+
+# Campos de metadata que son del documento (viven una sola vez en documents.metadata)
+DOCUMENT_KEYS = {
+    "doc_version", "original_filename", "upload_timestamp", "last_updated", "uploaded_by",
+    "document_status", "file_size", "file_hash", "source", "chat_id", "content_type", "filename",
+}
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _doc_uuid(doc_id) -> Optional[uuid.UUID]:
+    """
+    UUID del documento, o None para ids que no lo son (p. ej. "doc_test" en
+    test_vectorstore.py o ids que llegan a /admin/delete).
+    """
+    try:
+        return uuid.UUID(str(doc_id))
+    except ValueError:
+        return None
+
+
+def chunk_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Quita de la metadata de un chunk los campos a nivel de documento."""
+    return {k: v for k, v in (metadata or {}).items() if k not in DOCUMENT_KEYS}
+
+
+async def save_chunks(chunks: List[Dict[str, Any]]):
+    """
+    Guarda texto y metadata propia de los chunks (upsert por chunk_id, un
+    solo INSERT multi-fila por lote).
+    """
+    if not chunks:
+        return
+    rows = []
+    for c in chunks:
+        meta = chunk_metadata(c.get("metadata"))
+        rows.append({
+            "chunk_id": c["chunk_id"],
+            "doc_id": _doc_uuid(c["doc_id"]),  # NULL si no es UUID: el chunk se hidrata igual
+            "chunk_index": meta.get("chunk_index"),
+            "content_hash": chunk_hash(c["text"]),
+            "text": c["text"],
+            "metadata": meta,
+        })
+    stmt = pg_insert(DocumentChunk.__table__).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["chunk_id"],
+        set_={col: stmt.excluded[col] for col in ("doc_id", "chunk_index", "content_hash", "text", "metadata")},
+    )
+    async with AsyncSessionLocal() as db:
+        await db.execute(stmt)
+        await db.commit()
+
+
+async def fetch_chunks(chunk_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Hidrata en una sola consulta el texto y la metadata (documento + chunk) de
+    los chunks pedidos. Omite los de documentos que no están activos.
+    """
+    chunk_ids = list(dict.fromkeys(chunk_ids))
+    if not chunk_ids:
+        return {}
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(DocumentChunk.chunk_id, DocumentChunk.text,
+                   DocumentChunk.chunk_metadata.label("chunk_metadata"),
+                   Document.doc_metadata.label("doc_metadata"), Document.status)
+            .outerjoin(Document, Document.id == DocumentChunk.doc_id)
+            .where(DocumentChunk.chunk_id.in_(chunk_ids))
+            .where(or_(Document.status.is_(None), Document.status == "active"))
+        )
+        return {
+            r.chunk_id: {
+                "text": r.text,
+                "metadata": {**(r.doc_metadata or {}), **(r.chunk_metadata or {}), "document_status": r.status or "active"},
+            }
+            for r in result.all()
+        }
+
+
+async def fetch_texts(chunk_ids: List[str]) -> Dict[str, str]:
+    if not chunk_ids:
+        return {}
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(DocumentChunk.chunk_id, DocumentChunk.text).where(DocumentChunk.chunk_id.in_(chunk_ids))
+        )
+        return {r.chunk_id: r.text for r in result.all()}
+
+
+async def doc_chunk_hashes(doc_id: str) -> Dict[str, List[Tuple[str, Optional[int]]]]:
+    """
+    Chunks actuales de un documento: hash de contenido -> [(chunk_id,
+    chunk_index)] en orden de aparición (un texto repetido tiene varias
+    ocurrencias).
+    """
+    doc_uuid = _doc_uuid(doc_id)
+    if doc_uuid is None:
+        return {}
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(DocumentChunk.chunk_id, DocumentChunk.content_hash, DocumentChunk.chunk_index)
+            .where(DocumentChunk.doc_id == doc_uuid)
+            .order_by(DocumentChunk.chunk_index.asc().nulls_last(), DocumentChunk.chunk_id)
+        )
+        existing: Dict[str, List[Tuple[str, Optional[int]]]] = {}
+        for r in result.all():
+            existing.setdefault(r.content_hash, []).append((r.chunk_id, r.chunk_index))
+        return existing
+
+
+async def reindex_chunks(indexes: Dict[str, int]):
+    """Actualiza chunk_index (columna y metadata) de chunks reutilizados que cambiaron de posición."""
+    if not indexes:
+        return
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(DocumentChunk.chunk_id, DocumentChunk.chunk_metadata)
+            .where(DocumentChunk.chunk_id.in_(list(indexes)))
+        )
+        rows = [
+            {"cid": r.chunk_id, "idx": indexes[r.chunk_id], "meta": {**(r.chunk_metadata or {}), "chunk_index": indexes[r.chunk_id]}}
+            for r in result.all()
+        ]
+        if rows:
+            await db.execute(
+                update(DocumentChunk.__table__)
+                .where(DocumentChunk.__table__.c.chunk_id == bindparam("cid"))
+                .values(chunk_index=bindparam("idx"), metadata=bindparam("meta")),
+                rows,
+            )
+        await db.commit()
+
+
+async def delete_doc_chunks(doc_ids: List[str]):
+    """
+    Borra los chunks de los documentos. Los de ids que no son UUID se
+    guardaron con doc_id NULL (ver save_chunks): se borran por el prefijo
+    "{doc_id}-" de su chunk_id.
+    """
+    uuids = [u for u in (_doc_uuid(d) for d in doc_ids) if u is not None]
+    others = [d for d in doc_ids if _doc_uuid(d) is None]
+    conditions = [DocumentChunk.doc_id.in_(uuids)] if uuids else []
+    conditions += [
+        DocumentChunk.doc_id.is_(None) & DocumentChunk.chunk_id.startswith(f"{d}-", autoescape=True)
+        for d in others
+    ]
+    if not conditions:
+        return
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(DocumentChunk).where(or_(*conditions)))
+        await db.commit()
+
+
+async def delete_chunk_rows(chunk_ids: List[str]):
+    if not chunk_ids:
+        return
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(DocumentChunk).where(DocumentChunk.chunk_id.in_(chunk_ids)))
+        await db.commit()
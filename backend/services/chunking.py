@@ -0,0 +1,250 @@
+# backend/services/chunking.py
+
+import re
+import json
+import logging
+from typing import Iterable, Iterator, List, Callable, Dict
+from core.config import settings
+
+log = logging.getLogger(__name__)
+
+# Versión del algoritmo de chunking (cambiarla invalida cachés de chunks)
+CHUNKER_VERSION = "3"
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?…;:])\s+(?=[¿¡\"“(\[]?[A-ZÁÉÍÓÚÑ0-9])")
+_HEADING_RE = re.compile(r"^(#{1,6}\s+\S.*|\d+(\.\d+)*\.?\s+[A-ZÁÉÍÓÚÑ].{0,80}|(?=[^a-záéíóúñ]*[A-ZÁÉÍÓÚÑ])[A-ZÁÉÍÓÚÑ0-9 ,:/-]{4,80})$")
+_TABLE_RE = re.compile(r"\|.*\||\t")
+
+# Línea de contexto del chunker de filas; las filas de datos se escapan con escape_row
+ROW_HEADER_PREFIX = "# "
+
+
+def count_tokens(text: str) -> int:
+    """
+    Aproximación de tokens (palabras + signos) sin depender de un tokenizer.
+    """
+    return len(_TOKEN_RE.findall(text))
+
+
+def iter_blocks(stream: Iterable[str]) -> Iterator[str]:
+    """
+    Agrupa un flujo de texto (páginas, hojas, trozos) en párrafos, de forma
+    perezosa: solo se mantiene en memoria el párrafo en construcción.
+    Encabezados y filas de tabla se emiten como bloques propios.
+    """
+    pending = ""
+    current: List[str] = []
+    for piece in stream:
+        pending += piece
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            line = line.strip()
+            if not line:
+                if current:
+                    yield " ".join(current)
+                    current = []
+            elif _TABLE_RE.search(line) or _HEADING_RE.match(line):
+                if current:
+                    yield " ".join(current)
+                    current = []
+                yield line
+            else:
+                current.append(line)
+    if pending.strip():
+        current.append(pending.strip())
+    if current:
+        yield " ".join(current)
+
+
+def _split_by_tokens(sentence: str, max_tokens: int) -> Iterator[str]:
+    """
+    Corta una oración larga en trozos de a lo sumo `max_tokens` tokens,
+    respetando palabras; una palabra que sola excede el presupuesto (p. ej.
+    una URL o "-----") se corta por sus propios tokens.
+    """
+    current, size = [], 0
+    for word in sentence.split():
+        tokens = count_tokens(word)
+        if tokens > max_tokens:
+            pieces = _TOKEN_RE.findall(word)
+            for i in range(0, len(pieces), max_tokens):
+                part = pieces[i:i + max_tokens]
+                if current and size + len(part) > max_tokens:
+                    yield " ".join(current)
+                    current, size = [], 0
+                current.append("".join(part))
+                size += len(part)
+            continue
+        if current and size + tokens > max_tokens:
+            yield " ".join(current)
+            current, size = [], 0
+        current.append(word)
+        size += tokens
+    if current:
+        yield " ".join(current)
+
+
+def _units(block: str, max_tokens: int) -> Iterator[str]:
+    """
+    Divide un bloque en oraciones; si una oración excede el presupuesto,
+    se corta por tokens.
+    """
+    if _TABLE_RE.search(block) or _HEADING_RE.match(block):
+        sentences = [block]
+    else:
+        sentences = _SENTENCE_RE.split(block)
+    for sentence in sentences:
+        if count_tokens(sentence) <= max_tokens:
+            yield sentence
+        else:
+            yield from _split_by_tokens(sentence, max_tokens)
+
+
+def _chunk_units(units: Iterable[tuple], max_tokens: int, overlap_tokens: int) -> Iterator[str]:
+    """
+    Acumula unidades (texto, tokens, es_encabezado) hasta el presupuesto de
+    tokens. Cada chunk nuevo arranca con las últimas unidades del anterior
+    (hasta `overlap_tokens`) y un encabezado siempre abre chunk nuevo.
+    """
+    current: List[tuple] = []
+    size = 0
+    fresh = 0  # tokens nuevos (no solapados) en el chunk actual
+
+    for text, tokens, is_heading in units:
+        if current and fresh and (size + tokens > max_tokens or is_heading):
+            yield "\n".join(t for t, _, _ in current)
+            tail, tail_size = [], 0
+            if not is_heading:
+                # El solapamiento cuenta dentro del presupuesto del chunk nuevo
+                budget = min(overlap_tokens, max_tokens - tokens)
+                for unit in reversed(current):
+                    if tail_size + unit[1] > budget:
+                        break
+                    tail.insert(0, unit)
+                    tail_size += unit[1]
+            current, size, fresh = tail, tail_size, 0
+        current.append((text, tokens, is_heading))
+        size += tokens
+        fresh += tokens
+
+    if current and fresh:
+        yield "\n".join(t for t, _, _ in current)
+
+
+def chunk_sentences(stream: Iterable[str], max_tokens: int = None, overlap_tokens: int = None) -> Iterator[str]:
+    """
+    Chunker por oraciones/párrafos con presupuesto de tokens y solapamiento.
+    """
+    max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+
+    def units():
+        for block in iter_blocks(stream):
+            is_heading = bool(_HEADING_RE.match(block)) and not _TABLE_RE.search(block)
+            for unit in _units(block, max_tokens):
+                yield unit, count_tokens(unit), is_heading
+                is_heading = False
+
+    return _chunk_units(units(), max_tokens, overlap_tokens)
+
+
+def _iter_lines(stream: Iterable[str]) -> Iterator[str]:
+    pending = ""
+    for piece in stream:
+        pending += piece
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+def escape_row(line: str) -> str:
+    """
+    Escapa una fila de datos con "\\" si empieza por "#" o "\\", para que
+    chunk_rows no la tome por una línea de contexto (p. ej. "# de pedido").
+    """
+    return "\\" + line if line.startswith(("#", "\\")) else line
+
+
+def chunk_rows(stream: Iterable[str], max_tokens: int = None, overlap_tokens: int = 0) -> Iterator[str]:
+    """
+    Chunker por líneas (hojas de cálculo, CSV): nunca corta una fila.
+    Una línea "# ..." (p. ej. hoja + encabezados de columna) es contexto:
+    cierra el chunk actual y se repite al inicio de cada chunk siguiente,
+    recortado a la mitad del presupuesto para dejar sitio a las filas.
+    """
+    max_tokens = max_tokens or settings.CHUNK_MAX_TOKENS
+    header, header_tokens = None, 0
+    current: List[str] = []
+    size = 0
+
+    def emit() -> str:
+        return "\n".join(([header] if header else []) + current)
+
+    for line in _iter_lines(stream):
+        if line.startswith(ROW_HEADER_PREFIX):
+            if current:
+                yield emit()
+                current, size = [], 0
+            header = next(_split_by_tokens(line[len(ROW_HEADER_PREFIX):], max(max_tokens // 2, 1)), None)
+            header_tokens = count_tokens(header) if header else 0
+            continue
+        if line.startswith("\\"):
+            line = line[1:]
+        tokens = count_tokens(line)
+        if current and size + tokens > max_tokens - header_tokens:
+            yield emit()
+            current, size = [], 0
+        current.append(line)
+        size += tokens
+
+    if current:
+        yield emit()
+
+
+def chunk_words(stream: Iterable[str], max_tokens: int = 150, overlap_tokens: int = 0) -> Iterator[str]:
+    """
+    Chunker original: ventanas fijas de palabras sin solapamiento.
+    """
+    current: List[str] = []
+    pending = ""
+    for piece in stream:
+        pending += piece
+        words = pending.split()
+        # La última palabra puede continuar en el siguiente trozo
+        pending = words.pop() if words and not pending[-1:].isspace() else ""
+        for word in words:
+            current.append(word)
+            if len(current) >= max_tokens:
+                yield " ".join(current)
+                current = []
+    if pending:
+        current.append(pending)
+    if current:
+        yield " ".join(current)
+
+
+CHUNKERS: Dict[str, Callable[..., Iterator[str]]] = {
+    "sentence": chunk_sentences,
+    "rows": chunk_rows,
+    "words": chunk_words,
+}
+
+
+def get_chunker(ext: str) -> Callable[..., Iterator[str]]:
+    """
+    Devuelve el chunker configurado para la extensión (CHUNKER_BY_EXT) o el
+    chunker por defecto (CHUNKER_DEFAULT).
+    """
+    by_ext = json.loads(settings.CHUNKER_BY_EXT or "{}")
+    name = by_ext.get(ext.lower(), settings.CHUNKER_DEFAULT)
+    if name not in CHUNKERS:
+        raise ValueError(f"Chunker no soportado: {name}")
+    return CHUNKERS[name]
+
+
+def chunk_stream(stream: Iterable[str], ext: str) -> Iterator[str]:
+    return get_chunker(ext)(stream)
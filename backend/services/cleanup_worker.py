@@ -11,6 +11,13 @@ from services.indexing import delete_docs
 
 log = logging.getLogger(__name__)
 
+def stale_transactions_query(cutoff_time: datetime):
+    """Transacciones pendientes anteriores a `cutoff_time` (compartida con scripts/check_query_plans.py)."""
+    return select(UploadTransaction).where(and_(
+        UploadTransaction.status == 'pending',
+        UploadTransaction.created_at < cutoff_time
+    ))
+
 async def cleanup_orphaned_chunks():
     """
     Limpieza periódica de chunks huérfanos (transacciones pendientes antiguas)
@@ -22,13 +29,7 @@ async def cleanup_orphaned_chunks():
             # Encontrar transacciones pendientes con más de 1 hora
             cutoff_time = datetime.utcnow() - timedelta(hours=1)
             
-            result = await db.execute(
-                select(UploadTransaction)
-                .where(and_(
-                    UploadTransaction.status == 'pending',
-                    UploadTransaction.created_at < cutoff_time
-                ))
-            )
+            result = await db.execute(stale_transactions_query(cutoff_time))
             stale_transactions = result.scalars().all()
             
             for tx in stale_transactions:
@@ -2,12 +2,21 @@
 
 import json
 import uuid
+import base64
+import asyncio
 from datetime import datetime, timezone
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import tuple_, func, cast
+from sqlalchemy.dialects.postgresql import REGCONFIG
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from services.db import ChatSession, ChatMessage
-from services.memory import redis_client, save_message, get_history
+from services.db import AsyncSessionLocal, ChatSession, ChatMessage, ChatArchive
+from core.config import settings
+from services.memory import redis_client, save_message, get_history, seed_history, clear_history
+from services.chunking import count_tokens
+from services.message_writer import message_writer
+from services.semantic_memory import forget_chat
+from services.archiver import restore_session
 import logging
 
 log = logging.getLogger("services.conversation")
@@ -15,15 +24,23 @@ log = logging.getLogger("services.conversation")
 # ======================================================
 # 🧩 Función: Crear o recuperar una sesión existente
 # ======================================================
+# Las funciones *_query construyen las sentencias sin ejecutarlas: las
+# comparten los servicios y scripts/check_query_plans.py (EXPLAIN ANALYZE)
+def session_query(chat_id):
+    return select(ChatSession).where(ChatSession.id == chat_id)
+
 async def get_or_create_session(db: AsyncSession, user_id: str, chat_id: Optional[str] = None, title: str = None) -> ChatSession:
     """
     Devuelve una sesión existente o crea una nueva.
     Si no se pasa chat_id, crea un nuevo hilo.
     """
     if chat_id:
-        result = await db.execute(select(ChatSession).where(ChatSession.id == chat_id))
+        result = await db.execute(session_query(chat_id))
         session = result.scalar_one_or_none()
         if session:
+            if session.archived_at is not None:
+                # Chat frío que recibe un turno nuevo: sus mensajes vuelven a chat_messages
+                await restore_session(session.id)
             return session
 
     # Si no existe, creamos una nueva
@@ -36,100 +53,322 @@ async def get_or_create_session(db: AsyncSession, user_id: str, chat_id: Optiona
     )
     db.add(new_session)
     await db.commit()
-    await db.refresh(new_session)
     log.info(f"🆕 Nueva sesión creada: {new_session.id} para {user_id}")
     return new_session
 
 # ======================================================
 # 💬 Función: Guardar mensaje (usuario o asistente)
 # ======================================================
-async def store_message(db: AsyncSession, chat_id: str, user_id: str, role: str, content: str):
+async def store_message(
+    db: AsyncSession,
+    chat_id: str,
+    user_id: str,
+    role: str,
+    content: str,
+    wait: bool = True,
+    message_id: Optional[uuid.UUID] = None,
+) -> asyncio.Future:
     """
-    Guarda un mensaje tanto en PostgreSQL como en Redis.
+    Guarda un mensaje en PostgreSQL vía la cola de escritura diferida
+    (services/message_writer.py). Con `wait=False` devuelve el futuro sin
+    esperar: quien llama debe esperarlo antes de dar el turno por cerrado.
+    `message_id` permite referenciar el mensaje (p. ej. en la memoria semántica).
     """
-    message = ChatMessage(
-        id=str(uuid.uuid4()),
-        chat_id=chat_id,
-        role=role,
-        content=content,
-        timestamp=datetime.now()
-    )
-    db.add(message)
-    await db.commit()
+    message_id = message_id or uuid.uuid4()
+    persisted = message_writer.submit({
+        "id": message_id,
+        "chat_id": uuid.UUID(str(chat_id)),
+        "user_id": user_id,
+        "role": role,
+        "content": content,
+        "timestamp": datetime.now(),
+    })
 
-    # Memoria corta: Redis
-    # await save_message(chat_id, role, content)
+    # Memoria corta: Redis (write-through; un fallo de caché no rompe el turno)
+    try:
+        await save_message(str(chat_id), role, content, message_id=str(message_id))
+    except Exception as e:
+        log.warning(f"⚠️ No se pudo actualizar la memoria Redis de {chat_id}: {e}")
 
-    log.info(f"💾 Mensaje guardado: chat={chat_id} role={role}")
-    return message
+    if wait:
+        await persisted
+        log.info(f"💾 Mensaje guardado: chat={chat_id} role={role}")
+    return persisted
 
 # ======================================================
-# 🧩 Función: Obtener historial completo de un chat
+# 🔖 Cursores opacos para paginación por keyset
 # ======================================================
-async def get_full_history(db: AsyncSession, chat_id: str) -> List[Dict]:
+def encode_cursor(ts: datetime, row_id) -> str:
+    raw = json.dumps([ts.isoformat(), str(row_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    """Lanza ValueError si el cursor no es válido."""
+    try:
+        ts, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(ts), uuid.UUID(row_id)
+    except Exception as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+
+# ======================================================
+# 🧩 Función: Obtener historial de un chat (por páginas)
+# ======================================================
+def history_page_query(chat_id, limit: int = 50, before: Optional[str] = None):
+    query = (
+        select(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.timestamp)
+        .where(ChatMessage.chat_id == chat_id)
+    )
+    if before:
+        ts, row_id = decode_cursor(before)
+        query = query.where(tuple_(ChatMessage.timestamp, ChatMessage.id) < tuple_(ts, row_id))
+    return query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(limit + 1)
+
+async def get_history_page(db: AsyncSession, chat_id: str, limit: int = 50, before: Optional[str] = None) -> Dict:
     """
-    Recupera todo el historial persistente (desde PostgreSQL).
+    Devuelve los `limit` mensajes más recientes anteriores a `before`
+    (orden (timestamp, id)), en orden cronológico, y el cursor de la página
+    anterior. Usa el índice (chat_id, timestamp, id).
     """
     log.info(f"Chat ID: {chat_id}")
 
-    result = await db.execute(
-        select(ChatMessage).where(ChatMessage.chat_id == chat_id).order_by(ChatMessage.timestamp.asc())
-    )
-    messages = result.scalars().all()
-    
-    log.info(f"{len(messages)} recovered messages")
+    result = await db.execute(history_page_query(chat_id, limit, before))
+    rows = result.all()
 
-    return [
-        {"role": m.role, "content": m.content, "timestamp": m.timestamp.isoformat()}
-        for m in messages
-    ]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    log.info(f"{len(rows)} recovered messages")
+
+    return {
+        "history": [
+            {"id": str(m.id), "role": m.role, "content": m.content, "timestamp": m.timestamp.isoformat()}
+            for m in reversed(rows)
+        ],
+        "next_cursor": encode_cursor(rows[-1].timestamp, rows[-1].id) if has_more else None,
+    }
+
+def session_access_query(chat_id):
+    return select(ChatSession.user_id, ChatSession.archived_at).where(ChatSession.id == chat_id)
+
+async def open_history_page(db: AsyncSession, chat_id: str, user_id: str, limit: int = 50, before: Optional[str] = None) -> Optional[Dict]:
+    """
+    Igual que get_history_page, pero si el chat está archivado lo restaura
+    primero y lee la página del primario (la réplica aún no ve la restauración).
+    Devuelve None si el chat no existe o no es de `user_id`: la restauración
+    es una escritura y solo la puede provocar el dueño.
+    """
+    session = (await db.execute(session_access_query(chat_id))).one_or_none()
+    if session is None:
+        # La réplica puede no ver todavía un chat recién creado
+        async with AsyncSessionLocal() as primary:
+            session = (await primary.execute(session_access_query(chat_id))).one_or_none()
+    if session is None or session.user_id != user_id:
+        return None
+    if session.archived_at is None:
+        return await get_history_page(db, chat_id, limit, before)
+
+    await restore_session(chat_id)
+    async with AsyncSessionLocal() as primary:
+        return await get_history_page(primary, chat_id, limit, before)
 
 # ===================================================================
-# 🧩 Función: Obtener las sesiones de un usuario (chats anteriores)
+# 🧩 Función: Obtener las sesiones de un usuario (por páginas)
 # ===================================================================
-async def get_user_sessions(db: AsyncSession, user_id:str ) -> List[Dict]:
+def sessions_page_query(user_id: str, limit: int = 50, cursor: Optional[str] = None):
+    query = (
+        select(ChatSession.id, ChatSession.title, ChatSession.created_at, ChatSession.updated_at)
+        .where(ChatSession.user_id == user_id)
+    )
+    if cursor:
+        ts, row_id = decode_cursor(cursor)
+        query = query.where(tuple_(ChatSession.updated_at, ChatSession.id) < tuple_(ts, row_id))
+    return query.order_by(ChatSession.updated_at.desc(), ChatSession.id.desc()).limit(limit + 1)
+
+async def get_sessions_page(db: AsyncSession, user_id: str, limit: int = 50, cursor: Optional[str] = None) -> Dict:
     """
-    Devuelve las sesiones (chats) anteriores del usuario.
+    Devuelve las sesiones del usuario de la más reciente a la más antigua
+    (orden (updated_at, id)) y el cursor de la página siguiente.
+    Usa el índice (user_id, updated_at, id).
     """
     log.info(f"Session User: {user_id}")
 
-    result = await db.execute(
-        select(ChatSession).where(ChatSession.user_id == user_id).order_by(ChatSession.updated_at.desc())
+    result = await db.execute(sessions_page_query(user_id, limit, cursor))
+    rows = result.all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "sessions": [
+            {
+                "session_id": str(session.id),
+                "title": session.title or f"Chat {session.created_at.strftime('%Y-%m-%d %H:%M')}",
+                "created_at": session.created_at.isoformat(),
+                "updated_at": session.updated_at.isoformat()
+            }
+            for session in rows
+        ],
+        "next_cursor": encode_cursor(rows[-1].updated_at, rows[-1].id) if has_more else None,
+    }
+
+# ======================================================
+# 🔎 Función: Buscar en el historial de chats del usuario
+# ======================================================
+# Debe coincidir con la configuración del trigger de la migración 4 (y de services/backfill.py)
+SEARCH_CONFIG = "spanish"
+HEADLINE_OPTIONS = "StartSel=**, StopSel=**, MaxWords=25, MinWords=8, MaxFragments=2, FragmentDelimiter=\" … \""
+
+def encode_search_cursor(rank: float, chat_id) -> str:
+    raw = json.dumps([rank, str(chat_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_search_cursor(cursor: str) -> Tuple[float, uuid.UUID]:
+    """Lanza ValueError si el cursor no es válido."""
+    try:
+        rank, chat_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return float(rank), uuid.UUID(chat_id)
+    except Exception as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+
+def search_sessions_query(user_id: str, q: str, limit: int = 20, cursor: Optional[str] = None):
+    query = func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), q)
+    rank = func.ts_rank_cd(ChatMessage.search_vector, query)
+
+    hits = (
+        select(
+            ChatMessage.chat_id,
+            ChatMessage.content,
+            ChatMessage.timestamp,
+            rank.label("rank"),
+            func.row_number().over(
+                partition_by=ChatMessage.chat_id,
+                order_by=(rank.desc(), ChatMessage.timestamp.desc()),
+            ).label("pos"),
+            func.count().over(partition_by=ChatMessage.chat_id).label("matches"),
+        )
+        # user_id desnormalizado: el GIN (user_id, search_vector) solo recorre los mensajes del usuario
+        .where(ChatMessage.user_id == user_id, ChatMessage.search_vector.op("@@")(query))
+        .subquery()
     )
+    best = select(hits).where(hits.c.pos == 1)
+    if cursor:
+        last_rank, last_id = decode_search_cursor(cursor)
+        best = best.where(tuple_(hits.c.rank, hits.c.chat_id) < tuple_(last_rank, last_id))
+    page = best.order_by(hits.c.rank.desc(), hits.c.chat_id.desc()).limit(limit + 1).subquery()
 
-    sessions = result.scalars().all()  
-    
-    return [
-        {
-            "session_id": str(session.id),
-            "title": session.title or f"Chat {session.created_at.strftime('%Y-%m-%d %H:%M')}",
-            "created_at": session.created_at.isoformat(),
-            "updated_at": session.updated_at.isoformat()
-        }
-        for session in sessions
-    ]
+    return (
+        select(
+            page.c.chat_id, page.c.rank, page.c.matches, page.c.timestamp,
+            ChatSession.title, ChatSession.updated_at,
+            func.ts_headline(cast(SEARCH_CONFIG, REGCONFIG), page.c.content, query, HEADLINE_OPTIONS).label("snippet"),
+        )
+        .join(ChatSession, ChatSession.id == page.c.chat_id)
+        .order_by(page.c.rank.desc(), page.c.chat_id.desc())
+    )
+
+async def search_sessions(db: AsyncSession, user_id: str, q: str, limit: int = 20, cursor: Optional[str] = None) -> Dict:
+    """
+    Busca `q` (sintaxis web: "frase exacta", -excluir, OR) en los mensajes de
+    los chats del usuario. Devuelve una fila por sesión, ordenadas por la
+    relevancia de su mejor mensaje (ts_rank_cd), con un fragmento resaltado
+    de ese mensaje y el número de mensajes que coinciden. Paginación por
+    keyset sobre (rank, chat_id); el fragmento solo se calcula para la página.
+    """
+    result = await db.execute(search_sessions_query(user_id, q, limit, cursor))
+    rows = result.all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    return {
+        "results": [
+            {
+                "session_id": str(r.chat_id),
+                "title": r.title,
+                "updated_at": r.updated_at.isoformat(),
+                "snippet": r.snippet,
+                "matched_at": r.timestamp.isoformat(),
+                "matches": r.matches,
+                "rank": r.rank,
+            }
+            for r in rows
+        ],
+        "next_cursor": encode_search_cursor(rows[-1].rank, rows[-1].chat_id) if has_more else None,
+    }
 
 # ======================================================
 # ⚡ Función: Obtener contexto inmediato (desde Redis)
 # ======================================================
-async def get_recent_history(chat_id: str) -> List[Dict]:
+async def get_recent_history(chat_id: str, db: Optional[AsyncSession] = None) -> List[Dict]:
     """
-    Recupera los últimos mensajes recientes desde Redis.
+    Recupera los últimos mensajes desde Redis. Si la caché está fría (o Redis
+    no responde) los lee de PostgreSQL y vuelve a sembrar la caché.
     """
+    chat_id = str(chat_id)
     try:
-        return await get_history(chat_id)
+        history = await get_history(chat_id)
+        if history is not None:
+            return history
     except Exception as e:
         log.error(f"❌ Error recuperando historial Redis: {e}")
+
+    if db is None:
         return []
+    page = await get_history_page(db, chat_id, limit=settings.MEMORY_WINDOW)
+    history = [{"id": m["id"], "role": m["role"], "content": m["content"]} for m in page["history"]]
+    try:
+        await seed_history(chat_id, history)
+    except Exception as e:
+        log.warning(f"⚠️ No se pudo sembrar la memoria Redis de {chat_id}: {e}")
+    return history
+
+def budget_memory(history: List[Dict], max_tokens: int = None) -> List[Dict]:
+    """
+    Recorta el historial al presupuesto de tokens del slot `memory`,
+    conservando los mensajes más recientes completos.
+    """
+    max_tokens = max_tokens or settings.MEMORY_MAX_TOKENS
+    selected, used = [], 0
+    for m in reversed(history):
+        tokens = count_tokens(m["content"])
+        if used + tokens > max_tokens:
+            break
+        selected.append(m)
+        used += tokens
+    return list(reversed(selected))
+
+def memory_window(history: List[Dict], summary_until_id=None, max_tokens: int = None) -> List[Dict]:
+    """
+    Ventana cruda del prompt: los mensajes posteriores al cursor del resumen
+    (como mucho los últimos MEMORY_WINDOW), recortados a tokens. Lo que queda
+    fuera lo compacta services/summarizer.py en el resumen, así no hay
+    mensajes que no estén ni en el resumen ni en la ventana. Si el cursor no
+    está en `history`, todos sus mensajes son posteriores a él.
+    """
+    ids = [m.get("id") for m in history]
+    if summary_until_id is not None and str(summary_until_id) in ids:
+        history = history[ids.index(str(summary_until_id)) + 1:]
+    return budget_memory(history[-settings.MEMORY_WINDOW:], max_tokens)
 
 # ======================================================
 # 🧹 Función: Borrar un chat (solo en PostgreSQL)
 # ======================================================
+def delete_session_queries(chat_id) -> List:
+    return [
+        ChatMessage.__table__.delete().where(ChatMessage.chat_id == chat_id),
+        ChatArchive.__table__.delete().where(ChatArchive.chat_id == chat_id),
+        ChatSession.__table__.delete().where(ChatSession.id == chat_id),
+    ]
+
 async def delete_session(db: AsyncSession, chat_id: str):
     """
     Elimina un hilo completo (solo para administradores o limpieza).
     """
-    await db.execute(ChatMessage.__table__.delete().where(ChatMessage.chat_id == chat_id))
-    await db.execute(ChatSession.__table__.delete().where(ChatSession.id == chat_id))
+    for statement in delete_session_queries(chat_id):
+        await db.execute(statement)
     await db.commit()
+    await clear_history(str(chat_id))
+    try:
+        await forget_chat(str(chat_id))
+    except Exception as e:
+        log.error(f"⚠️ Error borrando la memoria semántica de {chat_id}: {e}")
     log.warning(f"🗑️ Sesión eliminada: {chat_id}")
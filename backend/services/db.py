@@ -1,13 +1,16 @@
 # backend/services/db.py
 
 import os
+import time
 import uuid
 from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Integer, JSON
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Integer, JSON, Index, LargeBinary, text
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from core.config import settings
+from services import metrics
 
 DATABASE_URL = settings.DATABASE_ADMIN_URL
 
@@ -21,14 +24,46 @@ class ChatSession(Base):
     title = Column(String, default=f"Chat {datetime.now(timezone.utc)}")
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    # Resumen acumulado de los mensajes hasta (summary_until, summary_until_id); ver services/summarizer.py
+    summary = Column(Text, nullable=True)
+    summary_until = Column(DateTime, nullable=True)
+    summary_until_id = Column(UUID(as_uuid=True), nullable=True)
+    # Mensajes movidos a chat_archives (ver services/archiver.py); NULL = mensajes en chat_messages
+    archived_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Lista de chats del usuario paginada por (updated_at, id)
+        Index("ix_chat_sessions_user_updated", "user_id", "updated_at", "id"),
+    )
 
 class ChatMessage(Base):
+    # Particionada por rango mensual de `timestamp` (migración 5): la clave primaria incluye la columna de partición
     __tablename__ = "chat_messages"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     chat_id = Column(UUID(as_uuid=True), ForeignKey("chat_sessions.id"))
     role = Column(String)
     content = Column(Text)
-    timestamp = Column(DateTime, default=datetime.now(timezone.utc))
+    timestamp = Column(DateTime, primary_key=True, default=datetime.now(timezone.utc))
+    # to_tsvector('spanish', content), mantenido por trigger (migración 4); ver services/conversation.search_sessions
+    search_vector = Column(TSVECTOR, nullable=True)
+    # Copia de chat_sessions.user_id (migración 7) para filtrar la búsqueda sin join
+    user_id = Column(String, nullable=True)
+
+    __table_args__ = (
+        # Historial de un chat paginado por (timestamp, id)
+        Index("ix_chat_messages_chat_ts", "chat_id", "timestamp", "id"),
+        # La búsqueda usa el GIN (user_id, search_vector) que crea services/backfill.py
+        # tras rellenar las filas existentes (necesita la extensión btree_gin)
+    )
+
+class ChatArchive(Base):
+    """Mensajes de un chat frío: JSON comprimido con zlib, uno por sesión."""
+    __tablename__ = "chat_archives"
+    chat_id = Column(UUID(as_uuid=True), ForeignKey("chat_sessions.id"), primary_key=True)
+    archived_at = Column(DateTime, default=datetime.now(timezone.utc))
+    message_count = Column(Integer)
+    last_message_at = Column(DateTime)
+    payload = Column(LargeBinary)
 
 # 🆕 NUEVAS TABLAS para gestión documental
 class Document(Base):
@@ -41,9 +76,20 @@ class Document(Base):
     current_version = Column(Integer, default=1)
     document_type = Column(String(20), default='user_private')  # 'user_private', 'public_base'
     status = Column(String(20), default='active')
+    chunks_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
     last_updated = Column(DateTime, default=datetime.now(timezone.utc))
-    metadata = Column(JSON)  # Para tags, descripción, etc.
+    doc_metadata = Column("metadata", JSON)  # Para tags, descripción, etc. ("metadata" es reservado en declarative)
+
+    __table_args__ = (
+        # Un mismo archivo activo una sola vez por usuario
+        Index("uq_documents_user_file_hash_active", "user_id", "file_hash", unique=True,
+              postgresql_where=text("status = 'active'")),
+        # Reporte de duplicados sobre documentos activos
+        Index("ix_documents_active_hash", "file_hash", "user_id", "chunks_count",
+              postgresql_where=text("status = 'active'")),
+        Index("ix_documents_status_created", "status", "created_at"),
+    )
 
 class DocumentVersion(Base):
     __tablename__ = "document_versions"
@@ -55,24 +101,101 @@ class DocumentVersion(Base):
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
     chunks_count = Column(Integer)
 
+    __table_args__ = (
+        Index("ix_document_versions_document", "document_id", "version"),
+    )
+
+class DocumentChunk(Base):
+    __tablename__ = "document_chunks"
+    chunk_id = Column(String(200), primary_key=True)  # misma clave primaria que en Milvus
+    doc_id = Column(UUID(as_uuid=True), index=True)  # sin FK: los chunks se escriben antes que el documento
+    chunk_index = Column(Integer, nullable=True)
+    content_hash = Column(String(16))  # para re-ingesta incremental de versiones
+    text = Column(Text)  # PostgreSQL comprime (TOAST) los textos largos
+    chunk_metadata = Column("metadata", JSON, nullable=True)  # solo campos propios del chunk
+
 class UploadTransaction(Base):
     __tablename__ = "upload_transactions"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     doc_id = Column(String, index=True)  # ID del documento en Milvus
     user_id = Column(String)
-    status = Column(String(20), default='pending')  # 'pending', 'completed', 'failed'
+    status = Column(String(20), default='pending')  # 'queued', 'pending', 'completed', 'failed', 'cleaned'
+    stage = Column(String(20), nullable=True)  # etapa del job de ingesta: parsing, chunking, embedding...
+    progress = Column(JSON, nullable=True)  # contadores por etapa
+    job = Column(JSON, nullable=True)  # datos para que un worker procese el archivo
+    error = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.now(timezone.utc))
     updated_at = Column(DateTime, default=datetime.now(timezone.utc))
 
+    __table_args__ = (
+        # cleanup_worker: transacciones pendientes antiguas
+        Index("ix_upload_transactions_pending_created", "created_at",
+              postgresql_where=text("status = 'pending'")),
+    )
+
 # 🧠 Conexión
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Pool que mide cuánto espera cada checkout (cola del pool + conexión
+    nueva si hace falta) y lo exporta en services.metrics por rol de pool.
+    """
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            role = self.logging_name or "db"
+            metrics.observe(f"db_pool_wait_ms_{role}", (time.perf_counter() - t0) * 1000)
+            metrics.set_gauge(f"db_pool_checked_out_{role}", self.checkedout())
+
+
+def _make_engine(url: str, role: str, pool_size: int, max_overflow: int):
+    connect_args = {}
+    if "asyncpg" in url:
+        # Caché de sentencias preparadas de asyncpg y del dialecto de SQLAlchemy
+        connect_args = {
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        }
+    return create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        poolclass=TimedQueuePool,
+        pool_logging_name=role,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+# Escrituras (y lecturas que necesitan ver lo recién escrito) van al primario
+engine = _make_engine(DATABASE_URL, "write", settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
 AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
+# Lecturas tolerantes a un poco de retraso (historial, listas de chats, reportes) van a la réplica
+read_engine = (
+    _make_engine(settings.DATABASE_READ_URL, "read", settings.DB_READ_POOL_SIZE, settings.DB_READ_MAX_OVERFLOW)
+    if settings.DATABASE_READ_URL else engine
+)
+AsyncReadSessionLocal = sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False)
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
-# 🛠️ Inicialización automática
+async def get_read_db():
+    async with AsyncReadSessionLocal() as session:
+        yield session
+
+# 🛠️ Inicialización automática: tablas nuevas + migraciones versionadas (services/migrations.py)
 async def init_db():
+    from services.migrations import run_migrations, ensure_partitions
+
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+    await run_migrations()
+    await ensure_partitions()
\ No newline at end of file
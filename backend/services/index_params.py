@@ -0,0 +1,140 @@
+# backend/services/index_params.py
+
+import math
+import time
+import logging
+from typing import Dict, Any, Optional, Tuple
+from core.config import settings
+
+log = logging.getLogger(__name__)
+
+# Parámetro de búsqueda que controla recall vs. latencia según el tipo de índice
+SEARCH_PARAM_BY_INDEX = {
+    "IVF_FLAT": "nprobe",
+    "IVF_SQ8": "nprobe",
+    "IVF_PQ": "nprobe",
+    "HNSW": "ef",
+    "HNSW_SQ": "ef",
+    "DISKANN": "search_list",
+    "FLAT": None,
+    "AUTOINDEX": None,
+}
+
+# Caché del índice real de cada colección (tipo + parámetros de construcción).
+# Expira tras MILVUS_INDEX_CACHE_TTL_S: scripts/migrate_index.py puede cambiar
+# el índice desde otro proceso sin que este se entere.
+_index_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+def auto_nlist(num_entities: int) -> int:
+    """
+    Regla habitual para IVF: nlist ≈ 4·√N, acotado a un rango razonable.
+    """
+    return int(min(max(4 * math.sqrt(max(num_entities, 1)), 128), 65536))
+
+
+def build_index_params(num_entities: Optional[int] = None, index_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Construye los parámetros de creación del índice a partir de la config
+    y del tamaño (real o esperado) de la colección.
+    """
+    index_type = (index_type or settings.MILVUS_INDEX_TYPE).upper()
+    n = num_entities or settings.MILVUS_EXPECTED_ENTITIES
+
+    if index_type not in SEARCH_PARAM_BY_INDEX:
+        raise ValueError(f"Tipo de índice no soportado: {index_type}")
+
+    if index_type.startswith("IVF"):
+        params = {"nlist": settings.MILVUS_NLIST or auto_nlist(n)}
+        if index_type == "IVF_PQ":
+            if settings.EMBEDDINGS_DIM % settings.MILVUS_PQ_M:
+                raise ValueError(f"MILVUS_PQ_M={settings.MILVUS_PQ_M} debe dividir EMBEDDINGS_DIM={settings.EMBEDDINGS_DIM}")
+            params.update({"m": settings.MILVUS_PQ_M, "nbits": settings.MILVUS_PQ_NBITS})
+    elif index_type.startswith("HNSW"):
+        params = {"M": settings.MILVUS_HNSW_M, "efConstruction": settings.MILVUS_HNSW_EF_CONSTRUCTION}
+        if index_type == "HNSW_SQ":
+            params["sq_type"] = settings.MILVUS_SQ_TYPE
+    else:
+        params = {}
+
+    return {"index_type": index_type, "metric_type": settings.MILVUS_METRIC, "params": params}
+
+
+def estimate_vector_bytes(index_type: str, params: Dict[str, Any], dim: Optional[int] = None) -> float:
+    """
+    Estimación de memoria por vector en el query node según el tipo de índice
+    (sin contar el overhead de centroides ni de segmentos).
+    """
+    dim = dim or settings.EMBEDDINGS_DIM
+    index_type = index_type.upper()
+    graph = 2 * int(params.get("M", settings.MILVUS_HNSW_M)) * 4  # aristas HNSW (int32)
+
+    if index_type == "IVF_SQ8":
+        return dim * 1
+    if index_type == "IVF_PQ":
+        return int(params.get("m", settings.MILVUS_PQ_M)) * int(params.get("nbits", settings.MILVUS_PQ_NBITS)) / 8
+    if index_type == "HNSW":
+        return dim * 4 + graph
+    if index_type == "HNSW_SQ":
+        bytes_per_dim = {"SQ6": 0.75, "SQ8": 1, "BF16": 2, "FP16": 2}.get(str(params.get("sq_type", "SQ8")).upper(), 1)
+        return dim * bytes_per_dim + graph
+    return dim * 4
+
+
+def describe_index(collection) -> Dict[str, Any]:
+    """
+    Devuelve el tipo y los parámetros del índice vectorial de la colección.
+    Se cachea por nombre (con TTL) para no consultar Milvus en cada búsqueda.
+    """
+    cached = _index_cache.get(collection.name)
+    if cached is not None and time.monotonic() - cached[0] < settings.MILVUS_INDEX_CACHE_TTL_S:
+        return cached[1]
+
+    info = {"index_type": settings.MILVUS_INDEX_TYPE.upper(), "params": {}}
+    for index in collection.indexes:
+        if index.field_name == "embedding":
+            params = dict(index.params)
+            info["index_type"] = str(params.get("index_type", info["index_type"])).upper()
+            info["params"] = params.get("params", {}) or {}
+            break
+
+    _index_cache[collection.name] = (time.monotonic(), info)
+    return info
+
+
+def invalidate_index_cache(name: Optional[str] = None):
+    if name is None:
+        _index_cache.clear()
+    else:
+        _index_cache.pop(name, None)
+
+
+def build_search_params(collection, top_k: int, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Construye los parámetros de búsqueda (nprobe / ef / search_list) según el
+    índice real de la colección, la config y overrides por petición.
+    """
+    info = describe_index(collection)
+    index_type = info["index_type"]
+    key = SEARCH_PARAM_BY_INDEX.get(index_type)
+    params: Dict[str, Any] = {}
+
+    if key == "nprobe":
+        nlist = int(info["params"].get("nlist", settings.MILVUS_NLIST or auto_nlist(settings.MILVUS_EXPECTED_ENTITIES)))
+        params["nprobe"] = settings.MILVUS_NPROBE or max(8, nlist // 64)
+    elif key == "ef":
+        params["ef"] = max(settings.MILVUS_EF or 64, top_k)
+    elif key == "search_list":
+        params["search_list"] = max(settings.MILVUS_SEARCH_LIST or 100, top_k)
+
+    if overrides:
+        unknown = set(overrides) - ({key} if key else set())
+        if unknown:
+            raise ValueError(f"Parámetros de búsqueda no soportados para {index_type}: {sorted(unknown)}")
+        params.update({k: int(v) for k, v in overrides.items()})
+        if "nprobe" in params and "nlist" in info["params"]:
+            params["nprobe"] = min(params["nprobe"], int(info["params"]["nlist"]))
+        if "ef" in params:
+            params["ef"] = max(params["ef"], top_k)
+
+    return {"metric_type": settings.MILVUS_METRIC, "params": params}
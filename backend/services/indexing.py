@@ -1,56 +1,92 @@
 # backend/services/indexing.py
 
-import logging, uuid
-from typing import Iterable, List, Dict, Any
+import logging, uuid, asyncio
+from typing import Iterable, List, Dict, Any, Callable
 from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
 from core.config import settings
 from services.embeddings import get_embeddings
+from services.chunking import chunk_words
+from services.write_coordinator import write_coordinator
+from services import chunk_store
+from services.index_params import build_index_params, invalidate_index_cache
 
 log = logging.getLogger(__name__)
 
 def _connect():
     connections.connect("default", host=settings.MILVUS_HOST, port=settings.MILVUS_PORT)
 
-def ensure_collection():
-    _connect()
-    name = settings.MILVUS_COLLECTION
+# Versión del esquema físico. La colección física se llama
+# "<MILVUS_COLLECTION>_v<N>" y MILVUS_COLLECTION es un alias que apunta a ella.
+SCHEMA_VERSION = 3
 
-    # Si la colección existe, la retorna
-    if utility.has_collection(name):
-        log.info(f"Ensure Collection: {settings.MILVUS_COLLECTION} already exists.")
-        return Collection(name)
+def physical_name(version: int = SCHEMA_VERSION) -> str:
+    return f"{settings.MILVUS_COLLECTION}_v{version}"
 
-    # Incia proceso de creación de la colección
+def resolve_collection_name(name: str = None) -> str:
+    """
+    Devuelve el nombre físico de la colección detrás de un alias.
+    """
+    name = name or settings.MILVUS_COLLECTION
+    return Collection(name).describe().get("collection_name", name)
+
+def build_schema() -> CollectionSchema:
+    """
+    Esquema con clave primaria por chunk: permite upsert y borrado puntual.
+    `doc_id` queda como campo escalar indexado para filtros y borrados por documento.
+    Solo ids, ACL y vectores: el texto y la metadata viven en PostgreSQL
+    (ver services/chunk_store.py).
+    """
     fields = [
-        FieldSchema(name="doc_id", dtype=DataType.VARCHAR, is_primary=True, max_length=64),        
-        FieldSchema(name="chunk_id", dtype=DataType.VARCHAR, max_length=200),
-        FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
-        FieldSchema(name="metadata", dtype=DataType.JSON),
+        FieldSchema(name="chunk_id", dtype=DataType.VARCHAR, is_primary=True, max_length=200),
+        FieldSchema(name="doc_id", dtype=DataType.VARCHAR, max_length=64),
         FieldSchema(name="user_id", dtype=DataType.VARCHAR, max_length=128),
         FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=settings.EMBEDDINGS_DIM),
     ]
-    
-    schema = CollectionSchema(fields=fields, description="AltheIA RAG collection")
-    
-    col = Collection(name=name, schema=schema)
-    col.create_index(
-        field_name="embedding",
-        index_params={"index_type": settings.MILVUS_INDEX_TYPE,
-                    "metric_type": settings.MILVUS_METRIC,
-                    "params": {"nlist": 1024}}
-    )
+    return CollectionSchema(fields=fields, description="AltheIA RAG collection")
+
+def create_physical_collection(name: str, num_entities: int = None) -> Collection:
+    """
+    Crea una colección física con el esquema actual, sus índices y la carga.
+    """
+    col = Collection(name=name, schema=build_schema())
+    index_params = build_index_params(num_entities)
+    col.create_index(field_name="embedding", index_params=index_params)
+    col.create_index(field_name="doc_id", index_name="doc_id_idx", index_params={"index_type": "INVERTED"})
+    invalidate_index_cache(name)
+    log.info(f"Collection {name}: index {index_params}")
 
     col.load()
-    log.info("Ensure Collection: Created successfully.")
     return col
 
+def ensure_collection():
+    _connect()
+    name = settings.MILVUS_COLLECTION
+
+    # Si la colección (o el alias) existe, la retorna
+    if utility.has_collection(name):
+        log.info(f"Ensure Collection: {settings.MILVUS_COLLECTION} already exists.")
+        return Collection(name)
+
+    # Incia proceso de creación de la colección versionada + alias
+    target = physical_name()
+    col = Collection(target) if utility.has_collection(target) else create_physical_collection(target)
+    utility.create_alias(collection_name=target, alias=name)
+    invalidate_index_cache(name)
+
+    log.info(f"Ensure Collection: Created successfully ({name} -> {target}).")
+    return Collection(name)
+
 def reset_collection_data():
     try:
         _connect()
         name = settings.MILVUS_COLLECTION
 
         if utility.has_collection(name):
-            utility.drop_collection(name)
+            target = resolve_collection_name(name)
+            if target != name:
+                utility.drop_alias(name)
+            utility.drop_collection(target)
+        invalidate_index_cache(name)
             
         log.info(f"Todos los documentos en {name} fueron eliminados correctamente")
         return {"success": True, "collection": name}
@@ -61,17 +97,10 @@ def reset_collection_data():
 
 
 def chunk_text(text: str, max_tokens: int = 150) -> List[str]:
-    words = text.split()
-    chunks, current = [], []
-    for word in words:
-        current.append(word)
-        if len(current) >= max_tokens:
-            chunks.append(" ".join(current))
-            current = []
-    if current:
-        chunks.append(" ".join(current))                
-
-    return chunks
+    """
+    Chunker original por ventanas de palabras (ver services/chunking.py).
+    """
+    return list(chunk_words([text], max_tokens))
 
 async def upsert_chunks(chunks: List[Dict[str, Any]], transaction_id: str = None):
     """
@@ -88,19 +117,43 @@ async def upsert_chunks(chunks: List[Dict[str, Any]], transaction_id: str = None
     texts = [c["text"] for c in chunks]      
     vectors = await get_embeddings(texts, input_type="passage")
     
-    doc_ids = [c["doc_id"] for c in chunks]
-    chunk_ids = [c["chunk_id"] for c in chunks]
-    metadata = [c.get("metadata", {}) for c in chunks]
-    user_ids = [c["user_id"] for c in chunks]
-
-    entities = [doc_ids, chunk_ids, texts, metadata, user_ids, vectors]    
-    
-    col.insert(entities)
-    col.flush()    
+    await chunk_store.save_chunks(chunks)
+    await mirrored_write(col, lambda c: write_chunks(c, chunks, vectors))
+    await write_coordinator.after_write(col, len(chunks), chunks[0]["user_id"] if chunks else None)
     
-    log.info(f"✅ Insertados {len(chunks)} chunks en Milvus")
+    log.info(f"✅ Upsert de {len(chunks)} chunks en Milvus")
     return len(chunks)
 
+async def mirrored_write(col: Collection, op: Callable[[Collection], Any]):
+    """
+    Aplica `op` sobre la colección activa y, si hay una reconstrucción en
+    curso, también sobre la colección sombra. La marca se consulta después
+    de escribir: si aún no estaba puesta, la copia (que empieza después) ya
+    verá esta escritura.
+    """
+    result = await asyncio.to_thread(op, col)
+    target = await write_coordinator.rebuild_target()
+    if target and target != col.name:
+        await asyncio.to_thread(op, Collection(target))
+    return result
+
+def write_chunks(col: Collection, chunks: List[Dict[str, Any]], vectors: List[List[float]]):
+    """
+    Escribe un lote de chunks ya embebidos (sin flush). El texto se guarda
+    aparte con chunk_store.save_chunks; solo se escribe aquí si la colección
+    todavía tiene el esquema v2 (antes de scripts/migrate_schema.py).
+    """
+    legacy = any(f.name == "text" for f in col.schema.fields)
+    rows = []
+    for c, vector in zip(chunks, vectors):
+        row = {"chunk_id": c["chunk_id"], "doc_id": c["doc_id"], "user_id": c["user_id"], "embedding": vector}
+        if legacy:
+            row.update(text=c["text"], metadata=c.get("metadata", {}))
+        rows.append(row)
+
+    # Upsert nativo: re-ingestar un chunk con el mismo chunk_id lo reemplaza
+    col.upsert(rows)
+
 async def delete_docs(doc_ids: List[str], user_id: str):
     col = ensure_collection()
     # Construir expresión para eliminar por doc_id
@@ -110,6 +163,33 @@ async def delete_docs(doc_ids: List[str], user_id: str):
         doc_ids_str = "', '".join(doc_ids)
         expr = f"doc_id in ['{doc_ids_str}']"
     
-    res = col.delete(expr)
-    col.flush()
-    log.info(f"Deleted docs: {doc_ids}, result={res}")
\ No newline at end of file
+    res = await mirrored_write(col, lambda c: c.delete(expr))
+    await write_coordinator.after_write(col, len(doc_ids), user_id)
+    await chunk_store.delete_doc_chunks(doc_ids)
+    log.info(f"Deleted docs: {doc_ids}, result={res}")
+
+def iter_doc_chunks(doc_id: str, output_fields: List[str], batch_size: int = 1000) -> Iterable[Dict[str, Any]]:
+    """
+    Recorre todos los chunks de un documento (consulta por lotes).
+    """
+    col = ensure_collection()
+    iterator = col.query_iterator(batch_size=batch_size, expr=f"doc_id == '{doc_id}'", output_fields=output_fields)
+    while True:
+        rows = iterator.next()
+        if not rows:
+            iterator.close()
+            break
+        yield from rows
+
+async def delete_chunks(chunk_ids: List[str], user_id: str = None):
+    """
+    Borrado puntual por clave primaria (chunk_id).
+    """
+    if not chunk_ids:
+        return
+    col = ensure_collection()
+    ids_str = "', '".join(chunk_ids)
+    res = await mirrored_write(col, lambda c: c.delete(f"chunk_id in ['{ids_str}']"))
+    await write_coordinator.after_write(col, len(chunk_ids), user_id)
+    await chunk_store.delete_chunk_rows(chunk_ids)
+    log.info(f"Deleted chunks: {len(chunk_ids)}, result={res}")
\ No newline at end of file
@@ -0,0 +1,293 @@
+# backend/services/ingest_pipeline.py
+
+import os
+import time
+import queue
+import asyncio
+import logging
+import resource
+import threading
+from typing import Dict, Any, List, Callable, Iterator, Optional, Awaitable
+from core.config import settings
+from services.loader import iter_file_parallel
+from services.chunking import chunk_stream
+from services.embeddings import get_embeddings
+from services.indexing import ensure_collection, write_chunks, mirrored_write
+from services.write_coordinator import write_coordinator
+from services import parse_cache, chunk_store
+
+log = logging.getLogger(__name__)
+
+_DONE = object()  # centinela de fin de etapa
+
+
+def _rss_bytes() -> int:
+    """RSS actual del proceso (Linux); fallback al pico de getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _new_stage() -> Dict[str, Any]:
+    return {"items": 0, "bytes": 0, "busy_s": 0.0}
+
+
+async def _drain(q: asyncio.Queue, timeout: float = 30):
+    try:
+        while await asyncio.wait_for(q.get(), timeout) is not _DONE:
+            pass
+    except asyncio.TimeoutError:
+        pass
+
+
+async def run_ingest_pipeline(
+    path: str,
+    make_chunk: Callable[[int, str], Optional[Dict[str, Any]]],
+    ext: str = None,
+    pages: Iterator[str] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    cache_key: Optional[str] = None,
+    write_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Pipeline por etapas conectadas por colas acotadas:
+        parse (páginas) -> chunk -> embed (lotes) -> insert (lotes)
+    La memoria queda acotada por el tamaño de las colas y no por el tamaño
+    del documento. `make_chunk(i, text)` construye el dict del chunk i, o
+    devuelve None para omitirlo (p. ej. chunk sin cambios en una nueva versión).
+    Devuelve el número de chunks, throughput por etapa y pico de RSS.
+    Si se pasa `on_progress`, se invoca periódicamente con la etapa y contadores.
+    Con `cache_key`, un acierto en la caché de parseo salta parse/chunk/embed
+    y va directo a la inserción; un fallo guarda chunks + vectores en la caché.
+    """
+    loop = asyncio.get_running_loop()
+    ext = ext or os.path.splitext(path)[1]
+    qsize = settings.INGEST_QUEUE_SIZE
+    batch_size = settings.INGEST_EMBED_BATCH
+
+    pages_q: "queue.Queue" = queue.Queue(maxsize=qsize)          # hilo parse -> hilo chunk
+    chunks_q: asyncio.Queue = asyncio.Queue(maxsize=qsize * batch_size)
+    batches_q: asyncio.Queue = asyncio.Queue(maxsize=qsize)
+    stop = threading.Event()
+
+    stats = {stage: _new_stage() for stage in ("parse", "chunk", "embed", "insert")}
+    done = set()
+    skipped = {"count": 0}
+
+    cached_path = parse_cache.lookup(cache_key) if cache_key else None
+    writer = None
+    # La caché solo se escribe si se insertan todos los chunks (make_chunk no omite)
+    if cache_key and not cached_path and settings.PARSE_CACHE_ENABLED and write_cache:
+        writer = await asyncio.to_thread(parse_cache.CacheWriter, cache_key)
+    rss = {"start": _rss_bytes(), "peak": 0}
+    t0 = time.perf_counter()
+
+    def _put_threadsafe(item):
+        while not stop.is_set():
+            try:
+                pages_q.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def parse_stage():
+        try:
+            source = pages if pages is not None else iter_file_parallel(path)
+            while True:
+                t = time.perf_counter()
+                page = next(source, _DONE)
+                stats["parse"]["busy_s"] += time.perf_counter() - t
+                if page is _DONE or stop.is_set():
+                    break
+                stats["parse"]["items"] += 1
+                stats["parse"]["bytes"] += len(page.encode("utf-8"))
+                _put_threadsafe(page)
+        except Exception as e:
+            _put_threadsafe(e)
+        finally:
+            done.add("parse")
+            _put_threadsafe(_DONE)
+
+    def page_iter():
+        while not stop.is_set():
+            try:
+                item = pages_q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def chunk_stage():
+        try:
+            chunker = chunk_stream(page_iter(), ext)
+            i = 0
+            while True:
+                t = time.perf_counter()
+                text = next(chunker, _DONE)
+                stats["chunk"]["busy_s"] += time.perf_counter() - t
+                if text is _DONE or stop.is_set():
+                    break
+                stats["chunk"]["items"] += 1
+                stats["chunk"]["bytes"] += len(text.encode("utf-8"))
+                chunk = make_chunk(i, text)
+                i += 1
+                if chunk is None:
+                    skipped["count"] += 1
+                    continue
+                asyncio.run_coroutine_threadsafe(chunks_q.put(chunk), loop).result()
+        except Exception as e:
+            asyncio.run_coroutine_threadsafe(chunks_q.put(e), loop).result()
+        finally:
+            done.add("chunk")
+            asyncio.run_coroutine_threadsafe(chunks_q.put(_DONE), loop).result()
+
+    async def embed_stage():
+        batch: List[Dict[str, Any]] = []
+
+        async def flush_batch():
+            t = time.perf_counter()
+            vectors = await get_embeddings([c["text"] for c in batch], input_type="passage")
+            stats["embed"]["busy_s"] += time.perf_counter() - t
+            stats["embed"]["items"] += len(batch)
+            await batches_q.put((list(batch), vectors))
+            batch.clear()
+
+        try:
+            while True:
+                item = await chunks_q.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    await flush_batch()
+            if batch:
+                await flush_batch()
+        finally:
+            done.add("embed")
+            await batches_q.put(_DONE)
+
+    acl_user = {"id": None}
+
+    async def insert_stage():
+        col = await asyncio.to_thread(ensure_collection)
+        while True:
+            item = await batches_q.get()
+            if item is _DONE:
+                break
+            chunks, vectors = item
+            t = time.perf_counter()
+            # Primero el texto: un vector visible en Milvus siempre se puede hidratar
+            await chunk_store.save_chunks(chunks)
+            await mirrored_write(col, lambda c: write_chunks(c, chunks, vectors))
+            if writer:
+                await asyncio.to_thread(writer.append, [c["text"] for c in chunks], vectors)
+            stats["insert"]["busy_s"] += time.perf_counter() - t
+            stats["insert"]["items"] += len(chunks)
+            acl_user["id"] = chunks[0]["user_id"]
+        await write_coordinator.after_write(col, stats["insert"]["items"], acl_user["id"])
+
+    def cache_stage():
+        """Acierto de caché: reemplaza parse/chunk/embed leyendo lotes del disco."""
+        try:
+            i = 0
+            for texts, vectors in parse_cache.iter_cached(cached_path, batch_size):
+                if stop.is_set():
+                    break
+                candidates = [(make_chunk(i + j, text), vector) for j, (text, vector) in enumerate(zip(texts, vectors.tolist()))]
+                i += len(texts)
+                chunks = [c for c, _ in candidates if c is not None]
+                vectors = [v for c, v in candidates if c is not None]
+                skipped["count"] += len(texts) - len(chunks)
+                if not chunks:
+                    continue
+                for stage in ("chunk", "embed"):
+                    stats[stage]["items"] += len(chunks)
+                asyncio.run_coroutine_threadsafe(batches_q.put((chunks, vectors)), loop).result()
+        finally:
+            done.update({"parse", "chunk", "embed"})
+            asyncio.run_coroutine_threadsafe(batches_q.put(_DONE), loop).result()
+
+    async def sample_rss():
+        while True:
+            rss["peak"] = max(rss["peak"], _rss_bytes())
+            await asyncio.sleep(0.05)
+
+    async def report_progress():
+        stage_names = {"parse": "parsing", "chunk": "chunking", "embed": "embedding", "insert": "inserting"}
+        while True:
+            await asyncio.sleep(settings.INGEST_PROGRESS_INTERVAL)
+            current = next((s for s in stage_names if s not in done), "insert")
+            try:
+                await on_progress({
+                    "stage": stage_names[current],
+                    "pages": stats["parse"]["items"],
+                    "chunks": stats["chunk"]["items"],
+                    "embedded": stats["embed"]["items"],
+                    "inserted": stats["insert"]["items"],
+                })
+            except Exception as e:
+                log.warning(f"⚠️ Error reportando progreso de ingesta: {e}")
+
+    sampler = asyncio.create_task(sample_rss())
+    reporter = asyncio.create_task(report_progress()) if on_progress else None
+    if cached_path:
+        log.info(f"⚡ Parse cache hit: {os.path.basename(path)} ({cache_key[:12]})")
+        stages = [insert_stage(), loop.run_in_executor(None, cache_stage)]
+    else:
+        stages = [
+            embed_stage(),
+            insert_stage(),
+            loop.run_in_executor(None, parse_stage),
+            loop.run_in_executor(None, chunk_stage),
+        ]
+    stages = [asyncio.ensure_future(s) for s in stages]
+    try:
+        await asyncio.gather(*stages)
+        if writer:
+            await asyncio.to_thread(writer.commit)
+    except BaseException:
+        stop.set()
+        # gather no cancela las demás etapas: si insert falla, embed quedaría
+        # bloqueada para siempre en batches_q.put. Se cancelan las etapas async
+        # y se vacían las colas para liberar a los hilos bloqueados en put.
+        for stage in stages:
+            stage.cancel()
+        asyncio.create_task(_drain(chunks_q))
+        asyncio.create_task(_drain(batches_q))
+        if writer:
+            await asyncio.to_thread(writer.abort)
+        raise
+    finally:
+        sampler.cancel()
+        if reporter:
+            reporter.cancel()
+        rss["peak"] = max(rss["peak"], _rss_bytes())
+
+    elapsed = time.perf_counter() - t0
+    report = {
+        "chunks": stats["insert"]["items"],
+        "skipped": skipped["count"],
+        "cache": "hit" if cached_path else ("miss" if cache_key else "off"),
+        "elapsed_s": round(elapsed, 3),
+        # RSS de todo el proceso (API + otros jobs en curso), no solo de esta ingesta
+        "process_rss_start_mb": round(rss["start"] / 2**20, 1),
+        "process_rss_peak_mb": round(rss["peak"] / 2**20, 1),
+        "stages": {
+            name: {
+                **s,
+                "busy_s": round(s["busy_s"], 3),
+                "items_s": round(s["items"] / max(s["busy_s"], 1e-6), 1),
+                "mb_s": round(s["bytes"] / 2**20 / max(s["busy_s"], 1e-6), 2) if s["bytes"] else None,
+            }
+            for name, s in stats.items()
+        },
+    }
+    log.info(f"📊 Ingest pipeline {os.path.basename(path)}: {report}")
+    return report
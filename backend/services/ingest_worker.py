@@ -0,0 +1,215 @@
+# backend/services/ingest_worker.py
+"""
+Jobs de ingesta asíncronos sobre Redis Streams.
+
+El API guarda el archivo en el spool compartido, registra el job en
+`upload_transactions` (registro durable) y publica su id en el stream.
+Los workers (dentro del API o como procesos aparte en otros nodos) lo
+consumen con un consumer group:
+
+    python -m services.ingest_worker --workers 4
+"""
+
+import os
+import socket
+import asyncio
+import argparse
+import logging
+from typing import Dict, Any, List
+from redis.exceptions import ResponseError
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.config import settings
+from services.db import AsyncSessionLocal
+from services.memory import redis_client
+from services.ingestion import ingest_document, ingest_new_version
+from services.transaction_manager import transaction_manager, DuplicateDocumentError
+from services.write_coordinator import write_coordinator
+
+log = logging.getLogger(__name__)
+
+FINAL_STATUSES = ("completed", "failed", "cleaned", "duplicate")
+
+
+async def enqueue_ingest_job(db: AsyncSession, upload: Dict[str, Any], user_id: str, document_type: str = "user_private", mode: str = "new") -> str:
+    """
+    Registra el job en PostgreSQL y lo publica en el stream. Devuelve el job id.
+    `mode`: "new" (documento nuevo) o "version" (nueva versión incremental).
+    """
+    job = {**upload, "document_type": document_type, "mode": mode}
+    try:
+        job_id = await transaction_manager.begin_upload_transaction(db, upload["doc_id"], user_id, status="queued", job=job)
+        await redis_client.xadd(settings.INGEST_STREAM, {"job_id": job_id})
+    except Exception:
+        if os.path.exists(upload["tmp_path"]):
+            os.remove(upload["tmp_path"])
+        raise
+    log.info(f"📥 Job de ingesta encolado: {job_id} ({upload['filename']})")
+    return job_id
+
+
+async def submit_upload(db: AsyncSession, upload: Dict[str, Any], user_id: str, document_type: str = "user_private") -> Dict[str, Any]:
+    """
+    Punto de entrada de los endpoints de carga: si el usuario ya tiene un
+    documento activo con el mismo hash, devuelve ese doc_id sin re-ingestar;
+    si no, encola el job.
+    """
+    existing = await transaction_manager.find_active_document(db, user_id, upload["file_hash"])
+    if existing is not None:
+        if os.path.exists(upload["tmp_path"]):
+            os.remove(upload["tmp_path"])
+        log.info(f"♻️ Upload duplicado de {user_id}: {upload['filename']} -> doc {existing.id}")
+        return {
+            "doc_id": str(existing.id),
+            "chunks": existing.chunks_count or 0,
+            "status": "duplicate",
+            "message": "Document already uploaded"
+        }
+
+    job_id = await enqueue_ingest_job(db, upload, user_id, document_type)
+    return {
+        "doc_id": upload["doc_id"],
+        "chunks": 0,
+        "job_id": job_id,
+        "status": "queued",
+        "message": "Document queued for ingestion"
+    }
+
+
+async def submit_version(db: AsyncSession, upload: Dict[str, Any], document) -> Dict[str, Any]:
+    """
+    Encola la re-ingesta incremental de una nueva versión de `document`.
+    """
+    if upload["file_hash"] == document.file_hash:
+        if os.path.exists(upload["tmp_path"]):
+            os.remove(upload["tmp_path"])
+        return {
+            "doc_id": str(document.id),
+            "chunks": document.chunks_count or 0,
+            "status": "unchanged",
+            "message": "The file matches the current version"
+        }
+
+    upload = {
+        **upload,
+        "doc_id": str(document.id),
+        "file_metadata": {**upload["file_metadata"], "doc_version": (document.current_version or 1) + 1},
+    }
+    job_id = await enqueue_ingest_job(db, upload, document.user_id, document.document_type, mode="version")
+    return {
+        "doc_id": str(document.id),
+        "chunks": 0,
+        "job_id": job_id,
+        "status": "queued",
+        "message": "New version queued for ingestion"
+    }
+
+
+async def _ensure_group():
+    try:
+        await redis_client.xgroup_create(settings.INGEST_STREAM, settings.INGEST_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def _update_progress(job_id: str, progress: Dict[str, Any]):
+    async with AsyncSessionLocal() as db:
+        await transaction_manager.update_job(db, job_id, stage=progress["stage"], progress=progress)
+
+
+async def process_job(job_id: str):
+    async with AsyncSessionLocal() as db:
+        tx = await transaction_manager.get_job(db, job_id)
+        if tx is None or tx.status in FINAL_STATUSES:
+            log.info(f"Job {job_id} inexistente o ya finalizado, se omite")
+            return
+
+        job = tx.job or {}
+
+        # Otro job del mismo archivo pudo terminar mientras este esperaba
+        existing = await transaction_manager.find_active_document(db, tx.user_id, job.get("file_hash"))
+        if existing is not None:
+            if os.path.exists(job.get("tmp_path", "")):
+                os.remove(job["tmp_path"])
+            await transaction_manager.update_job(db, job_id, status="duplicate", stage="duplicate",
+                                                 progress={"existing_doc_id": str(existing.id)})
+            return
+
+        await transaction_manager.update_job(db, job_id, status="pending", stage="parsing")
+        try:
+            on_progress = lambda progress: _update_progress(job_id, progress)
+            if job.get("mode") == "version":
+                result = await ingest_new_version(db, job, job_id, on_progress=on_progress)
+            else:
+                result = await ingest_document(
+                    db, job, tx.user_id, job.get("document_type", "user_private"),
+                    transaction_id=job_id, on_progress=on_progress,
+                )
+            await transaction_manager.update_job(db, job_id, progress=result["stats"])
+        except DuplicateDocumentError as e:
+            log.info(f"♻️ Job de ingesta {job_id}: duplicado de {e.existing_doc_id}")
+        except Exception as e:
+            log.error(f"❌ Job de ingesta {job_id} falló: {e}")
+
+
+async def _heartbeat(consumer: str, msg_id: str):
+    """
+    Re-reclama el mensaje periódicamente para que su idle time no supere
+    INGEST_CLAIM_IDLE_MS mientras el job sigue en proceso.
+    """
+    interval = settings.INGEST_CLAIM_IDLE_MS / 1000 / 3
+    while True:
+        await asyncio.sleep(interval)
+        await redis_client.xclaim(settings.INGEST_STREAM, settings.INGEST_GROUP, consumer, 0, [msg_id], justid=True)
+
+
+async def worker_loop(consumer: str):
+    await _ensure_group()
+    log.info(f"👷 Worker de ingesta iniciado: {consumer}")
+
+    while True:
+        try:
+            # Primero, mensajes de workers caídos; luego mensajes nuevos
+            claimed = await redis_client.xautoclaim(
+                settings.INGEST_STREAM, settings.INGEST_GROUP, consumer,
+                min_idle_time=settings.INGEST_CLAIM_IDLE_MS, start_id="0-0", count=1
+            )
+            messages = claimed[1]
+            if not messages:
+                resp = await redis_client.xreadgroup(settings.INGEST_GROUP, consumer, {settings.INGEST_STREAM: ">"}, count=1, block=5000)
+                messages = resp[0][1] if resp else []
+
+            for msg_id, fields in messages:
+                heartbeat = asyncio.create_task(_heartbeat(consumer, msg_id))
+                try:
+                    await process_job(fields["job_id"])
+                finally:
+                    heartbeat.cancel()
+                await redis_client.xack(settings.INGEST_STREAM, settings.INGEST_GROUP, msg_id)
+
+        except asyncio.CancelledError:
+            log.info(f"Worker de ingesta detenido: {consumer}")
+            raise
+        except Exception as e:
+            log.error(f"❌ Error en worker de ingesta {consumer}: {e}")
+            await asyncio.sleep(5)
+
+
+def start_workers(count: int, prefix: str = None) -> List[asyncio.Task]:
+    prefix = prefix or f"{socket.gethostname()}-{os.getpid()}"
+    return [asyncio.create_task(worker_loop(f"{prefix}-{i}")) for i in range(count)]
+
+
+async def _run(count: int):
+    await asyncio.gather(*start_workers(count), write_coordinator.run_periodic())
+
+
+if __name__ == "__main__":
+    from core.logging import configure_logging
+
+    parser = argparse.ArgumentParser(description="Workers de ingesta (Redis Streams)")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    configure_logging()
+    asyncio.run(_run(args.workers))
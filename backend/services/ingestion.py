@@ -0,0 +1,191 @@
+# backend/services/ingestion.py
+
+import os
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.utils import chunk_factory
+from services.ingest_pipeline import run_ingest_pipeline
+from services import parse_cache
+from services.transaction_manager import transaction_manager, DuplicateDocumentError
+from services.indexing import delete_chunks
+from services import chunk_store
+from services.chunk_store import chunk_hash
+from services.db import engine
+
+log = logging.getLogger(__name__)
+
+# Clave del advisory lock de versiones (junto con hashtext(doc_id))
+VERSION_LOCK_KEY = 7342003
+
+async def ingest_document(
+    db: AsyncSession,
+    upload: Dict[str, Any],
+    user_id: str,
+    document_type: str = "user_private",
+    transaction_id: Optional[str] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    """
+    Ingesta de un archivo ya guardado (ver core.utils.prepare_upload) con
+    transacción distribuida Milvus + PostgreSQL. Si se pasa `transaction_id`
+    se reutiliza el registro existente (job encolado).
+    """
+    doc_id = upload["doc_id"]
+
+    try:
+        # 1. PREPARE: Registrar la transacción
+        if transaction_id is None:
+            transaction_id = await transaction_manager.begin_upload_transaction(db, doc_id, user_id)
+
+        # 2. COMMIT FASE 1: parse -> chunk -> embed -> insert en Milvus
+        key = parse_cache.cache_key(upload["file_hash"], os.path.splitext(upload["tmp_path"])[1])
+        report = await run_ingest_pipeline(upload["tmp_path"], chunk_factory(upload), on_progress=on_progress, cache_key=key)
+
+        # 3. COMMIT FASE 2: Registrar en PostgreSQL
+        document_data = {
+            "id": doc_id,
+            "user_id": user_id,
+            "original_filename": upload["filename"],
+            "file_hash": upload["file_hash"],
+            "chunks_count": report["chunks"],
+            "document_type": document_type,
+            "metadata": {**upload.get("file_metadata", {}), "chunk_count": report["chunks"]}
+        }
+        await transaction_manager.commit_upload(db, transaction_id, document_data)
+
+        log.info(f"✅ Upload completado: {doc_id} - {report['chunks']} chunks")
+        return {"doc_id": doc_id, "chunks": report["chunks"], "stats": report}
+
+    except DuplicateDocumentError as e:
+        # Se borran los chunks propios; el job queda como duplicado del documento ganador
+        await transaction_manager.rollback_upload(db, transaction_id, doc_id, status="duplicate",
+                                                  progress={"existing_doc_id": e.existing_doc_id})
+        raise
+
+    except Exception as e:
+        # COMPENSACIÓN: Revertir cambios en caso de error
+        if transaction_id:
+            await transaction_manager.rollback_upload(db, transaction_id, doc_id, error=str(e))
+        raise
+
+    finally:
+        if os.path.exists(upload["tmp_path"]):
+            os.remove(upload["tmp_path"])
+
+
+@asynccontextmanager
+async def _version_lock(doc_id: str):
+    """
+    Serializa los jobs de versión de un mismo documento entre workers: cada
+    uno compara contra los chunks que dejó el anterior. Advisory lock de
+    sesión en una conexión propia, retenida mientras dura la re-ingesta.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        params = {"k": VERSION_LOCK_KEY, "d": str(doc_id)}
+        await conn.execute(text("SELECT pg_advisory_lock(:k, hashtext(:d))"), params)
+        try:
+            yield
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:k, hashtext(:d))"), params)
+
+
+async def ingest_new_version(
+    db: AsyncSession,
+    upload: Dict[str, Any],
+    transaction_id: str,
+    on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    """
+    Re-ingesta incremental de una nueva versión de `upload["doc_id"]`:
+    compara los chunks nuevos con los actuales por hash de contenido, embebe e
+    inserta solo los nuevos, borra los que desaparecieron y registra la versión.
+    Dos versiones del mismo documento no corren a la vez (_version_lock).
+    """
+    async with _version_lock(upload["doc_id"]):
+        return await _ingest_new_version(db, upload, transaction_id, on_progress)
+
+
+async def _ingest_new_version(
+    db: AsyncSession,
+    upload: Dict[str, Any],
+    transaction_id: str,
+    on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    doc_id = upload["doc_id"]
+    inserted: List[str] = []
+
+    try:
+        # Chunks actuales del documento: hash de contenido -> [(chunk_id, chunk_index)]
+        existing = await chunk_store.doc_chunk_hashes(doc_id)
+        taken = {cid for ids in existing.values() for cid, _ in ids}
+
+        base = chunk_factory(upload)
+        occurrences: Dict[str, int] = {}
+        kept = set()
+        reindexed: Dict[str, int] = {}
+
+        def make_chunk(i: int, text: str):
+            # Cada ocurrencia de un mismo texto es un chunk distinto: (hash, ocurrencia)
+            h = chunk_hash(text)
+            n = occurrences.get(h, 0)
+            occurrences[h] = n + 1
+            current = existing.get(h, [])
+            if n < len(current):
+                # sin cambios: se conserva el chunk y su vector, con su nueva posición
+                chunk_id, index = current[n]
+                kept.add(chunk_id)
+                if index != i:
+                    reindexed[chunk_id] = i
+                return None
+            k = n
+            while f"{doc_id}-{h}-{k}" in taken:
+                k += 1
+            chunk = base(i, text)
+            chunk["chunk_id"] = f"{doc_id}-{h}-{k}"
+            taken.add(chunk["chunk_id"])
+            inserted.append(chunk["chunk_id"])
+            return chunk
+
+        report = await run_ingest_pipeline(upload["tmp_path"], make_chunk, on_progress=on_progress, write_cache=False)
+
+        removed = [cid for ids in existing.values() for cid, _ in ids if cid not in kept]
+        total = report["chunks"] + report["skipped"]
+        version = await transaction_manager.commit_version(db, transaction_id, doc_id, upload["file_hash"], total, upload["filename"])
+
+        try:
+            await delete_chunks(removed, upload["acl_user_id"])
+        except Exception as e:
+            log.error(f"⚠️ Error borrando chunks obsoletos de doc {doc_id}: {e}")
+        try:
+            await chunk_store.reindex_chunks(reindexed)
+        except Exception as e:
+            log.error(f"⚠️ Error actualizando chunk_index de doc {doc_id}: {e}")
+
+        stats = {
+            **report,
+            "version": version,
+            "total_chunks": total,
+            "new_chunks": report["chunks"],
+            "reused_chunks": report["skipped"],
+            "removed_chunks": len(removed),
+            "embedding_calls_saved": round(report["skipped"] / total, 4) if total else 0.0,
+        }
+        log.info(f"✅ Versión {version} de {doc_id}: {stats['new_chunks']} nuevos, {stats['reused_chunks']} reutilizados, {stats['removed_chunks']} borrados")
+        return {"doc_id": doc_id, "chunks": total, "stats": stats}
+
+    except Exception as e:
+        # COMPENSACIÓN: solo se borran los chunks nuevos; los actuales siguen intactos
+        try:
+            await delete_chunks(inserted, upload["acl_user_id"])
+        except Exception as cleanup_error:
+            log.error(f"⚠️ Error revirtiendo chunks nuevos de doc {doc_id}: {cleanup_error}")
+        await transaction_manager.update_job(db, transaction_id, status="failed", stage="failed", error=str(e))
+        raise
+
+    finally:
+        if os.path.exists(upload["tmp_path"]):
+            os.remove(upload["tmp_path"])
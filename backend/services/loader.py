@@ -1,8 +1,22 @@
 import os
-from typing import List
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Iterator
 import pandas as pd
 from docx import Document
 from PyPDF2 import PdfReader
+from openpyxl import load_workbook
+from core.config import settings
+from services.chunking import ROW_HEADER_PREFIX, escape_row
+
+log = logging.getLogger(__name__)
+
+# Versión de los parsers (cambiarla invalida la caché de parseo)
+PARSER_VERSION = "3"
 
 
 def load_txt(path: str) -> str:
@@ -17,15 +31,12 @@ def load_docx(path: str) -> str:
 
 def load_pdf(path: str) -> str:
     reader = PdfReader(path)
-    return "\n".join([page.extract_text() for page in reader.pages if page.extract_text()])
+    texts = (page.extract_text() for page in reader.pages)
+    return "\n".join([t for t in texts if t])
 
 
 def load_excel(path: str) -> str:
-    df = pd.read_excel(path, sheet_name=None)  # todas las hojas
-    texts = []
-    for sheet, data in df.items():
-        texts.append(data.astype(str).apply(" ".join, axis=1).str.cat(sep="\n"))
-    return "\n".join(texts)
+    return "".join(iter_excel(path))
 
 
 def load_file(path: str) -> str:
@@ -40,3 +51,263 @@ def load_file(path: str) -> str:
         return load_excel(path)
     else:
         raise ValueError(f"Formato no soportado: {ext}")
+
+
+
+# ======================================================
+# Lectura incremental (por bloques / páginas / filas)
+# ======================================================
+def iter_txt(path: str, block_size: int = 64 * 1024) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block
+
+
+def iter_docx(path: str) -> Iterator[str]:
+    doc = Document(path)
+    for p in doc.paragraphs:
+        if p.text.strip():
+            yield p.text + "\n"
+
+
+def iter_pdf(path: str) -> Iterator[str]:
+    reader = PdfReader(path)
+    for page in reader.pages:
+        text = page.extract_text()
+        if text:
+            yield text + "\n\n"
+
+
+def iter_excel_pandas(path: str) -> Iterator[str]:
+    df = pd.read_excel(path, sheet_name=None)
+    for sheet, data in df.items():
+        for row in data.astype(str).itertuples(index=False):
+            yield " ".join(row) + "\n"
+        yield "\n"
+
+
+def _cell(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def iter_excel(path: str, block_size: int = 32 * 1024) -> Iterator[str]:
+    """
+    Lectura en streaming con openpyxl (read_only): fila a fila, sin DataFrames.
+    Por cada hoja emite una línea de contexto "# <hoja>: <encabezados>" que el
+    chunker de filas repite en cada chunk. El texto se entrega en bloques.
+    """
+    if os.path.splitext(path)[1].lower() == ".xls":
+        # openpyxl no lee el formato binario antiguo
+        yield from iter_excel_pandas(path)
+        return
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    buffer, size = [], 0
+    try:
+        for ws in wb.worksheets:
+            headers = None
+            for row in ws.iter_rows(values_only=True):
+                cells = [_cell(v) for v in row]
+                while cells and not cells[-1]:
+                    cells.pop()
+                if not cells:
+                    continue
+                if headers is None:
+                    headers = cells
+                    line = f"{ROW_HEADER_PREFIX}{ws.title}: {' | '.join(headers)}\n"
+                else:
+                    line = escape_row(" | ".join(cells)) + "\n"
+                buffer.append(line)
+                size += len(line)
+                if size >= block_size:
+                    yield "".join(buffer)
+                    buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        wb.close()
+
+
+def iter_file(path: str) -> Iterator[str]:
+    """
+    Igual que load_file pero entrega el texto por partes para no
+    materializar el documento completo en memoria.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in [".txt", ".md"]:
+        return iter_txt(path)
+    elif ext == ".docx":
+        return iter_docx(path)
+    elif ext == ".pdf":
+        return iter_pdf(path)
+    elif ext in [".xls", ".xlsx"]:
+        return iter_excel(path)
+    else:
+        raise ValueError(f"Formato no soportado: {ext}")
+
+
+# ======================================================
+# Parseo en un pool de procesos (fuera del event loop)
+# ======================================================
+_pool: ProcessPoolExecutor | None = None
+_manager = None
+_pool_lock = threading.Lock()  # iter_file_parallel corre en hilos del executor
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: no heredar hilos/conexiones del proceso del API
+            _pool = ProcessPoolExecutor(max_workers=settings.PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            log.info(f"Pool de parseo iniciado con {settings.PARSE_WORKERS} procesos")
+        return _pool
+
+
+def reset_parse_pool(pool: ProcessPoolExecutor, reason: str):
+    """
+    Termina los procesos de `pool` y deja que el siguiente get_parse_pool cree
+    uno nuevo. Un proceso colgado en un archivo patológico no se puede
+    interrumpir de otra forma y seguiría ocupando su slot. Los parseos que
+    compartían ese pool fallan con BrokenProcessPool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return  # otro hilo ya lo reemplazó
+        _pool = None
+    log.warning(f"♻️ Reiniciando el pool de parseo: {reason}")
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _get_manager():
+    """Manager para colas acotadas entre los procesos de parseo y el API."""
+    global _manager
+    if _manager is None:
+        _manager = multiprocessing.get_context("spawn").Manager()
+    return _manager
+
+
+def shutdown_parse_pool():
+    global _pool, _manager
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+    if _manager is not None:
+
+        _manager.shutdown()
+        _manager = None
+
+
+def pdf_page_count(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+def extract_pdf_pages(path: str, start: int, end: int) -> List[str]:
+    reader = PdfReader(path)
+    texts = []
+    for page in reader.pages[start:end]:
+        text = page.extract_text()
+        if text:
+            texts.append(text + "\n\n")
+    return texts
+
+
+def stream_parts(path: str, out, stop):
+    """
+    Corre en el pool: parsea con iter_file y envía las partes por una cola
+    acotada. Termina con None, o con ("error", mensaje) si falla.
+    """
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        for part in iter_file(path):
+            if not put(part):
+                return
+    except Exception as e:
+        put(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        put(None)
+
+
+def iter_file_parallel(path: str) -> Iterator[str]:
+    """
+    Igual que iter_file, pero el parseo CPU-bound corre en el pool de procesos
+    con un timeout por archivo (PARSE_TIMEOUT). Los PDF grandes se reparten por
+    rangos de páginas entre los procesos, con una ventana acotada de tareas en
+    vuelo, y las páginas se entregan en orden.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in [".txt", ".md"]:
+        yield from iter_txt(path)  # solo I/O
+        return
+
+    pool = get_parse_pool()
+    deadline = time.monotonic() + settings.PARSE_TIMEOUT
+
+    def timed_out():
+        # Dejar de esperar no libera el proceso: se termina el pool
+        reset_parse_pool(pool, f"timeout parseando {os.path.basename(path)}")
+        return TimeoutError(f"Tiempo de parseo excedido ({settings.PARSE_TIMEOUT}s): {os.path.basename(path)}")
+
+    def result(future):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 and not future.done():
+            raise timed_out()
+        try:
+            return future.result(timeout=max(remaining, 0))
+        except TimeoutError:
+            raise timed_out()
+
+    if ext != ".pdf":
+        manager = _get_manager()
+        out, stop = manager.Queue(maxsize=settings.INGEST_QUEUE_SIZE * 4), manager.Event()
+        future = pool.submit(stream_parts, path, out, stop)
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise timed_out()
+                try:
+                    item = out.get(timeout=min(remaining, 1.0))
+                except queue.Empty:
+                    if future.done() and future.exception():
+                        raise future.exception()
+                    continue
+                if item is None:
+                    break
+                if isinstance(item, tuple):
+                    raise RuntimeError(f"Error parseando {os.path.basename(path)}: {item[1]}")
+                yield item
+        finally:
+            stop.set()
+        return
+
+    total = result(pool.submit(pdf_page_count, path))
+    step = settings.PARSE_PDF_PAGES_PER_TASK
+    ranges = [(i, min(i + step, total)) for i in range(0, total, step)]
+    window = max(settings.PARSE_WORKERS * 2, 1)
+    in_flight = []
+    try:
+        for start, end in ranges:
+            in_flight.append(pool.submit(extract_pdf_pages, path, start, end))
+            if len(in_flight) >= window:
+                yield from result(in_flight.pop(0))
+        while in_flight:
+            yield from result(in_flight.pop(0))
+    finally:
+        for future in in_flight:
+            future.cancel()
@@ -1,6 +1,7 @@
 # backend/services/memory.py
 
 import os, json, redis.asyncio as redis
+from typing import List, Dict, Optional
 from core.config import settings
 
 REDIS_URL = settings.REDIS_URL
@@ -17,21 +18,57 @@ redis_client = redis.from_url(
         health_check_interval=30       # Health check cada 30s
 )
 
-async def save_message(chat_id: str, role: str, content: str, limit: int = 10):
+def _key(chat_id: str) -> str:
+    return f"chat:{chat_id}:history"
+
+def _entry(role: str, content: str, message_id: Optional[str] = None) -> str:
+    # El id permite cortar la ventana en el cursor del resumen (services/conversation.memory_window)
+    entry = {"role": role, "content": content}
+    if message_id:
+        entry["id"] = str(message_id)
+    return json.dumps(entry)
+
+async def save_message(chat_id: str, role: str, content: str, limit: int = None, message_id: Optional[str] = None):
+    """
+    Agrega un mensaje al historial de Redis, mantiene solo los últimos N y
+    renueva el TTL en un solo viaje (MULTI/EXEC). Usa RPUSHX: si la caché
+    está fría no crea una lista parcial; la próxima lectura la siembra
+    desde PostgreSQL.
+    """
+    limit = limit or settings.MEMORY_WINDOW
+    entry = _entry(role, content, message_id)
+    key = _key(chat_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.rpushx(key, entry)
+        pipe.ltrim(key, -limit, -1)
+        pipe.expire(key, settings.MEMORY_TTL_S)
+        await pipe.execute()
+
+async def seed_history(chat_id: str, messages: List[Dict[str, str]], limit: int = None):
     """
-    Guarda un mensaje en el historial de Redis y mantiene solo los últimos N.
+    Reemplaza el historial en caché (caché fría -> cargada desde PostgreSQL).
     """
-    entry = json.dumps({"role": role, "content": content})
-    key = f"chat:{chat_id}:history"
-    await redis_client.rpush(key, entry)
-    await redis_client.ltrim(key, -limit, -1)
+    limit = limit or settings.MEMORY_WINDOW
+    key = _key(chat_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        if messages:
+            pipe.rpush(key, *[_entry(m["role"], m["content"], m.get("id")) for m in messages[-limit:]])
+            pipe.expire(key, settings.MEMORY_TTL_S)
+        await pipe.execute()
 
-async def get_history(chat_id: str):
+async def get_history(chat_id: str) -> Optional[List[Dict[str, str]]]:
     """
-    Recupera la conversación reciente desde Redis.
+    Recupera la conversación reciente desde Redis y renueva el TTL.
+    Devuelve None si la caché está fría (clave inexistente).
     """
-    key = f"chat:{chat_id}:history"
-    messages = await redis_client.lrange(key, 0, -1)
+    key = _key(chat_id)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.lrange(key, 0, -1)
+        pipe.expire(key, settings.MEMORY_TTL_S)
+        messages, exists = await pipe.execute()
+    if not exists:
+        return None
     return [json.loads(m) for m in messages]
 
 async def clear_history(chat_id: str):
@@ -0,0 +1,107 @@
+# backend/services/message_writer.py
+
+import time
+import asyncio
+import logging
+from typing import Dict, Any, List, Tuple
+from sqlalchemy.dialects.postgresql import insert
+from core.config import settings
+from services.db import AsyncSessionLocal, ChatMessage
+from services import metrics
+
+log = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    """
+    Escritura diferida (write-behind) de mensajes de chat.
+
+    Los mensajes de todas las peticiones se encolan y un único consumidor los
+    persiste en INSERTs multi-fila cada CHAT_WRITE_FLUSH_MS ms o al juntar
+    CHAT_WRITE_BATCH filas. `submit` devuelve un futuro que se resuelve cuando
+    la fila ya está confirmada en PostgreSQL.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._batch: List[Tuple[Dict[str, Any], asyncio.Future]] = []  # lote en curso (sobrevive a la cancelación)
+        self._running = False
+
+    def submit(self, row: Dict[str, Any]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        if not self._running:
+            # Sin consumidor (scripts, tests): escritura directa
+            task = asyncio.ensure_future(self._write([(row, future)]))
+            task.add_done_callback(lambda t: t.exception())
+            return future
+        self._queue.put_nowait((row, future))
+        metrics.set_gauge("chat_write_queue_depth", self._queue.qsize())
+        return future
+
+    async def _fill_batch(self):
+        self._batch.append(await self._queue.get())
+        if self._queue.qsize() < settings.CHAT_WRITE_BATCH - 1:
+            # Ventana corta para que otras peticiones se sumen al mismo INSERT
+            await asyncio.sleep(settings.CHAT_WRITE_FLUSH_MS / 1000)
+        while len(self._batch) < settings.CHAT_WRITE_BATCH and not self._queue.empty():
+            self._batch.append(self._queue.get_nowait())
+
+    async def _write(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        t0 = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                # ON CONFLICT: si una cancelación llega durante el COMMIT no se sabe si
+                # se confirmó; reescribir el lote en drain() no debe chocar con la PK
+                await db.execute(insert(ChatMessage.__table__).values([row for row, _ in batch]).on_conflict_do_nothing())
+                await db.commit()
+                # Confirmado: se resuelve ya (antes de cerrar la sesión) para que
+                # drain() no vuelva a encolar un lote que ya está en PostgreSQL
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+        except Exception as e:
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                return
+            if len(batch) == 1:
+                log.error(f"❌ Error guardando mensaje de chat {batch[0][0]['chat_id']}: {e}")
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+            # Una fila inválida no debe tumbar el lote: se reintenta fila a fila
+            log.warning(f"⚠️ Falló un lote de {len(batch)} mensajes, reintentando uno a uno: {e}")
+            for item in batch:
+                await self._write([item])
+            return
+
+        metrics.observe("chat_write_batch_size", len(batch))
+        metrics.observe("chat_write_flush_ms", (time.perf_counter() - t0) * 1000)
+
+    async def run(self):
+        """Consumidor de la cola; al cancelarse persiste lo pendiente."""
+        self._running = True
+        try:
+            while True:
+                await self._fill_batch()
+                metrics.set_gauge("chat_write_queue_depth", self._queue.qsize())
+                await self._write(self._batch)
+                self._batch = []
+        except asyncio.CancelledError:
+            self._running = False
+            await self.drain()
+            raise
+
+    async def drain(self):
+        pending = [item for item in self._batch if not item[1].done()]
+        self._batch = []
+        if pending:
+            await self._write(pending)
+        while not self._queue.empty():
+            batch = []
+            while not self._queue.empty() and len(batch) < settings.CHAT_WRITE_BATCH:
+                batch.append(self._queue.get_nowait())
+            await self._write(batch)
+        metrics.set_gauge("chat_write_queue_depth", 0)
+
+
+message_writer = MessageWriter()
@@ -0,0 +1,59 @@
+# backend/services/metrics.py
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any
+
+log = logging.getLogger(__name__)
+
+# Métricas en memoria del proceso (expuestas en /health/metrics)
+_histograms: Dict[str, deque] = {}
+_gauges: Dict[str, float] = {}
+_counters: Dict[str, float] = {}
+
+WINDOW = 1000  # últimas N observaciones por histograma
+
+
+def observe(name: str, value: float):
+    _histograms.setdefault(name, deque(maxlen=WINDOW)).append(value)
+
+
+def set_gauge(name: str, value: float):
+    _gauges[name] = value
+
+
+def incr(name: str, value: float = 1):
+    _counters[name] = _counters.get(name, 0) + value
+
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def snapshot() -> Dict[str, Any]:
+    histograms = {}
+    for name, values in _histograms.items():
+        if values:
+            histograms[name] = {
+                "count": len(values),
+                "p50": round(_percentile(values, 0.50), 3),
+                "p95": round(_percentile(values, 0.95), 3),
+                "p99": round(_percentile(values, 0.99), 3),
+                "max": round(max(values), 3),
+            }
+    return {"histograms": histograms, "gauges": dict(_gauges), "counters": dict(_counters)}
+
+
+async def monitor_event_loop(interval: float = 0.1):
+    """
+    Mide el retraso del event loop: cuánto se pasa un sleep de su plazo.
+    Un valor alto indica trabajo bloqueante en el hilo del loop.
+    """
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag_ms = (time.perf_counter() - t0 - interval) * 1000
+        observe("event_loop_lag_ms", max(lag_ms, 0.0))
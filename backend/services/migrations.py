@@ -0,0 +1,248 @@
+# backend/services/migrations.py
+"""
+Migraciones versionadas del esquema PostgreSQL.
+
+`init_db` crea las tablas nuevas con `Base.metadata.create_all`, pero eso no
+modifica tablas existentes (columnas o índices nuevos). Cada migración es una
+lista de sentencias idempotentes que se aplica una sola vez y queda
+registrada en `schema_migrations`. Los índices se crean con CONCURRENTLY
+para no bloquear escrituras en tablas grandes.
+
+Uso manual (desde backend/):
+    python -m services.migrations            # aplica las pendientes
+    python -m services.migrations --status
+"""
+
+import asyncio
+import argparse
+import logging
+from typing import List, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from core.config import settings
+from services.db import engine
+
+log = logging.getLogger(__name__)
+
+# Clave del advisory lock: evita que dos réplicas del API migren a la vez
+LOCK_KEY = 7342001
+
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "columnas de jobs de ingesta y contador de chunks en tablas existentes", [
+        "ALTER TABLE upload_transactions ADD COLUMN IF NOT EXISTS stage VARCHAR(20)",
+        "ALTER TABLE upload_transactions ADD COLUMN IF NOT EXISTS progress JSON",
+        "ALTER TABLE upload_transactions ADD COLUMN IF NOT EXISTS job JSON",
+        "ALTER TABLE upload_transactions ADD COLUMN IF NOT EXISTS error TEXT",
+        "ALTER TABLE documents ADD COLUMN IF NOT EXISTS chunks_count INTEGER DEFAULT 0",
+    ]),
+    (2, "índices compuestos y parciales para chat, documentos y jobs", [
+        # Historial por chat ordenado por (timestamp, id)
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_messages_chat_ts ON chat_messages (chat_id, timestamp, id)",
+        # Lista de chats del usuario ordenada por (updated_at, id)
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_sessions_user_updated ON chat_sessions (user_id, updated_at, id)",
+        # cleanup_worker: transacciones pendientes antiguas
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_upload_transactions_pending_created "
+        "ON upload_transactions (created_at) WHERE status = 'pending'",
+        # Reporte de duplicados: solo documentos activos, agrupados por hash
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_active_hash "
+        "ON documents (file_hash, user_id, chunks_count) WHERE status = 'active'",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_status_created ON documents (status, created_at)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_versions_document ON document_versions (document_id, version)",
+    ]),
+    (3, "resumen acumulado por sesión de chat", [
+        "ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS summary TEXT",
+        "ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS summary_until TIMESTAMP",
+        "ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS summary_until_id UUID",
+    ]),
+    (4, "búsqueda de texto completo en mensajes de chat (tsvector spanish + GIN)", [
+        # Columna nullable sin DEFAULT: no reescribe la tabla ni la bloquea
+        "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS search_vector TSVECTOR",
+        "CREATE OR REPLACE FUNCTION chat_messages_search_vector() RETURNS trigger AS $$ "
+        "BEGIN NEW.search_vector := to_tsvector('spanish', coalesce(NEW.content, '')); RETURN NEW; END "
+        "$$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS trg_chat_messages_search_vector ON chat_messages",
+        "CREATE TRIGGER trg_chat_messages_search_vector BEFORE INSERT OR UPDATE OF content ON chat_messages "
+        "FOR EACH ROW EXECUTE FUNCTION chat_messages_search_vector()",
+        # Los mensajes existentes se rellenan por lotes fuera del arranque, y el
+        # índice GIN se crea después (services/backfill.py)
+    ]),
+    (5, "chat_messages particionada por mes y archivo de chats fríos", [
+        "ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP",
+        # La tabla actual pasa a ser la partición histórica (MINVALUE .. inicio del mes siguiente).
+        # Todo lo pesado se hace antes del cambio y sin bloquear escrituras:
+        # índice único (id, timestamp) para la nueva PK y CHECK validado para el rango.
+        "UPDATE chat_messages SET timestamp = now() WHERE timestamp IS NULL",
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_messages_id_ts ON chat_messages (id, timestamp)",
+        """DO $$
+        BEGIN
+            IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('chat_messages')) = 'r'
+               AND NOT EXISTS (SELECT 1 FROM pg_constraint
+                               WHERE conrelid = to_regclass('chat_messages') AND conname = 'chat_messages_legacy_bound') THEN
+                EXECUTE format(
+                    'ALTER TABLE chat_messages ADD CONSTRAINT chat_messages_legacy_bound '
+                    'CHECK (timestamp IS NOT NULL AND timestamp < %L) NOT VALID',
+                    date_trunc('month', now()) + interval '1 month');
+            END IF;
+        END $$""",
+        """DO $$
+        BEGIN
+            IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('chat_messages')) = 'r' THEN
+                ALTER TABLE chat_messages VALIDATE CONSTRAINT chat_messages_legacy_bound;
+            END IF;
+        END $$""",
+        # Cambio atómico: renombrar, crear la tabla padre y adjuntar la histórica (sin reescribir ni reindexar)
+        """DO $$
+        BEGIN
+            IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('chat_messages')) <> 'r' THEN
+                RETURN;
+            END IF;
+            ALTER TABLE chat_messages ALTER COLUMN timestamp SET NOT NULL;
+            DROP TRIGGER IF EXISTS trg_chat_messages_search_vector ON chat_messages;
+            ALTER TABLE chat_messages RENAME TO chat_messages_legacy;
+            ALTER TABLE chat_messages_legacy RENAME CONSTRAINT chat_messages_pkey TO chat_messages_legacy_pkey;
+            ALTER TABLE chat_messages_legacy ADD CONSTRAINT chat_messages_legacy_id_ts UNIQUE USING INDEX ix_chat_messages_id_ts;
+            ALTER INDEX ix_chat_messages_chat_ts RENAME TO chat_messages_legacy_chat_ts;
+            ALTER INDEX IF EXISTS ix_chat_messages_search RENAME TO chat_messages_legacy_search;
+
+            CREATE TABLE chat_messages (LIKE chat_messages_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp);
+            ALTER TABLE chat_messages ADD PRIMARY KEY (id, timestamp);
+            ALTER TABLE chat_messages ADD FOREIGN KEY (chat_id) REFERENCES chat_sessions (id);
+            CREATE INDEX ix_chat_messages_chat_ts ON chat_messages (chat_id, timestamp, id);
+            CREATE TRIGGER trg_chat_messages_search_vector BEFORE INSERT OR UPDATE OF content ON chat_messages
+                FOR EACH ROW EXECUTE FUNCTION chat_messages_search_vector();
+
+            EXECUTE format(
+                'ALTER TABLE chat_messages ATTACH PARTITION chat_messages_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+                date_trunc('month', now()) + interval '1 month');
+            CREATE TABLE chat_messages_default PARTITION OF chat_messages DEFAULT;
+        END $$""",
+    ]),
+    (6, "unicidad de documentos activos por usuario y hash en bases existentes", [
+        # Entre duplicados activos se conserva el más reciente; el resto queda
+        # como 'duplicate' (sus chunks dejan de hidratarse en la recuperación)
+        "UPDATE documents d SET status = 'duplicate', last_updated = now() "
+        "FROM (SELECT id, row_number() OVER (PARTITION BY user_id, file_hash "
+        "      ORDER BY last_updated DESC NULLS LAST, created_at DESC NULLS LAST, id) AS rn "
+        "      FROM documents WHERE status = 'active') dup "
+        "WHERE d.id = dup.id AND dup.rn > 1",
+        # Un CREATE CONCURRENTLY interrumpido deja un índice inválido que IF NOT EXISTS no reconstruiría
+        """DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_index i WHERE i.indexrelid = to_regclass('uq_documents_user_file_hash_active')
+                       AND NOT i.indisvalid) THEN
+                DROP INDEX uq_documents_user_file_hash_active;
+            END IF;
+        END $$""",
+        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_documents_user_file_hash_active "
+        "ON documents (user_id, file_hash) WHERE status = 'active'",
+    ]),
+    (7, "user_id desnormalizado en chat_messages para la búsqueda por usuario", [
+        # Nullable sin DEFAULT: solo toca el catálogo. El relleno de las filas existentes
+        # y el índice GIN (user_id, search_vector) van por lotes en services/backfill.py
+        "ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS user_id VARCHAR",
+        "CREATE EXTENSION IF NOT EXISTS btree_gin",
+        # Los mensajes nuevos lo traen de store_message; el trigger cubre el resto (restauraciones, scripts)
+        "CREATE OR REPLACE FUNCTION chat_messages_user_id() RETURNS trigger AS $$ "
+        "BEGIN IF NEW.user_id IS NULL THEN SELECT user_id INTO NEW.user_id FROM chat_sessions WHERE id = NEW.chat_id; END IF; "
+        "RETURN NEW; END $$ LANGUAGE plpgsql",
+        "DROP TRIGGER IF EXISTS trg_chat_messages_user_id ON chat_messages",
+        "CREATE TRIGGER trg_chat_messages_user_id BEFORE INSERT ON chat_messages "
+        "FOR EACH ROW EXECUTE FUNCTION chat_messages_user_id()",
+    ]),
+]
+
+# Particiones mensuales de chat_messages: chat_messages_pYYYY_MM. Un mes ya
+# cubierto (p. ej. por chat_messages_legacy) se salta; si la partición DEFAULT
+# ya tiene filas de ese mes no se puede crear y queda un aviso en el log de PostgreSQL.
+ENSURE_PARTITIONS_SQL = """DO $$
+DECLARE
+    m timestamp;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('chat_messages')) <> 'p' THEN
+        RETURN;
+    END IF;
+    FOR m IN SELECT generate_series(date_trunc('month', now()),
+                                    date_trunc('month', now()) + interval '{months} months',
+                                    interval '1 month') LOOP
+        BEGIN
+            EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF chat_messages FOR VALUES FROM (%L) TO (%L)',
+                           'chat_messages_p' || to_char(m, 'YYYY_MM'), m, m + interval '1 month');
+        EXCEPTION
+            WHEN invalid_object_definition THEN NULL;
+            WHEN check_violation THEN
+                RAISE WARNING 'chat_messages_default tiene filas de %, no se crea su partición', to_char(m, 'YYYY-MM');
+        END;
+    END LOOP;
+END $$"""
+
+
+async def applied_versions(conn: AsyncConnection) -> List[int]:
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " description TEXT,"
+        " applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+    ))
+    result = await conn.execute(text("SELECT version FROM schema_migrations ORDER BY version"))
+    return list(result.scalars())
+
+
+async def apply_migrations(conn: AsyncConnection) -> List[int]:
+    """
+    Aplica las migraciones pendientes sobre `conn`, que debe estar en modo
+    AUTOCOMMIT (CREATE INDEX CONCURRENTLY no admite transacciones).
+    """
+    done = set(await applied_versions(conn))
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version in done:
+            continue
+        log.info(f"🛠️ Migración {version}: {description}")
+        for sql in statements:
+            await conn.execute(text(sql))
+        await conn.execute(
+            text("INSERT INTO schema_migrations (version, description) VALUES (:v, :d)"),
+            {"v": version, "d": description},
+        )
+        applied.append(version)
+    return applied
+
+
+async def run_migrations() -> List[int]:
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": LOCK_KEY})
+        try:
+            applied = await apply_migrations(conn)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": LOCK_KEY})
+    if applied:
+        log.info(f"✅ Migraciones aplicadas: {applied}")
+    return applied
+
+
+async def ensure_partitions(months_ahead: int = None) -> None:
+    """Crea las particiones mensuales del mes actual y de los `months_ahead` siguientes."""
+    months = int(settings.CHAT_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead)
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(ENSURE_PARTITIONS_SQL.format(months=months)))
+
+
+async def _status():
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        done = set(await applied_versions(conn))
+    for version, description, _ in MIGRATIONS:
+        print(f"{'✔' if version in done else '·'} {version:03d} {description}")
+
+
+if __name__ == "__main__":
+    from core.logging import configure_logging
+
+    parser = argparse.ArgumentParser(description="Migraciones del esquema PostgreSQL")
+    parser.add_argument("--status", action="store_true")
+    args = parser.parse_args()
+
+    configure_logging()
+    asyncio.run(_status() if args.status else run_migrations())
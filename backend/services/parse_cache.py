@@ -0,0 +1,159 @@
+# backend/services/parse_cache.py
+"""
+Caché direccionada por contenido de chunks + embeddings.
+
+Clave: SHA-256 del archivo + versión del parser + versión/config del chunker
++ modelo de embeddings. Cada entrada es un directorio en PARSE_CACHE_DIR con:
+    chunks.jsonl   un texto de chunk por línea (JSON)
+    vectors.f32    vectores float32 concatenados
+    meta.json      número de chunks y dimensión
+La escritura es incremental (por lotes) y se publica con un rename atómico.
+El tamaño total se acota a PARSE_CACHE_MAX_MB con expulsión LRU (mtime).
+Un archivo sin chunks (p. ej. un PDF escaneado) también se cachea, con
+count = 0 y vectors.f32 vacío.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+from core.config import settings
+from services.loader import PARSER_VERSION
+from services.chunking import CHUNKER_VERSION, get_chunker
+
+log = logging.getLogger(__name__)
+
+# Directorios temporales más viejos que esto son de writers que murieron
+STALE_TMP_S = 24 * 3600
+
+
+def cache_key(file_hash: str, ext: str) -> str:
+    chunker = get_chunker(ext).__name__
+    parts = [
+        file_hash, ext.lower(),
+        f"parser={PARSER_VERSION}", f"chunker={chunker}:{CHUNKER_VERSION}",
+        f"tokens={settings.CHUNK_MAX_TOKENS}:{settings.CHUNK_OVERLAP_TOKENS}",
+        f"emb={settings.EMBEDDINGS_MODEL}:{settings.EMBEDDINGS_DIM}",
+    ]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _entry_dir(key: str) -> str:
+    return os.path.join(settings.PARSE_CACHE_DIR, key[:2], key)
+
+
+def lookup(key: str) -> Optional[str]:
+    if not settings.PARSE_CACHE_ENABLED:
+        return None
+    path = _entry_dir(key)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    os.utime(path)  # LRU
+    return path
+
+
+def iter_cached(path: str, batch_size: int) -> Iterator[Tuple[List[str], np.ndarray]]:
+    """
+    Lee una entrada por lotes: (textos, vectores). Los vectores se leen con
+    memmap, sin cargar el archivo completo.
+    """
+    with open(os.path.join(path, "meta.json"), "r") as f:
+        meta = json.load(f)
+    if not meta["count"]:
+        return  # np.memmap no admite archivos vacíos
+    vectors = np.memmap(os.path.join(path, "vectors.f32"), dtype=np.float32, mode="r", shape=(meta["count"], meta["dim"]))
+
+    texts: List[str] = []
+    start = 0
+    with open(os.path.join(path, "chunks.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            texts.append(json.loads(line))
+            if len(texts) >= batch_size:
+                yield texts, np.array(vectors[start:start + len(texts)])
+                start += len(texts)
+                texts = []
+    if texts:
+        yield texts, np.array(vectors[start:start + len(texts)])
+
+
+class CacheWriter:
+    """
+    Escribe una entrada de forma incremental en un directorio temporal.
+    `commit()` la publica; `abort()` la descarta.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.final_dir = _entry_dir(key)
+        self.tmp_dir = f"{self.final_dir}.tmp-{os.getpid()}-{time.time_ns()}"
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        self._texts = open(os.path.join(self.tmp_dir, "chunks.jsonl"), "w", encoding="utf-8")
+        self._vectors = open(os.path.join(self.tmp_dir, "vectors.f32"), "wb")
+        self.count = 0
+        self.dim = None
+
+    def append(self, texts: List[str], vectors: List[List[float]]):
+        arr = np.asarray(vectors, dtype=np.float32)
+        self.dim = arr.shape[1]
+        for text in texts:
+            self._texts.write(json.dumps(text, ensure_ascii=False) + "\n")
+        self._vectors.write(arr.tobytes())
+        self.count += len(texts)
+
+    def commit(self):
+        self._texts.close()
+        self._vectors.close()
+        with open(os.path.join(self.tmp_dir, "meta.json"), "w") as f:
+            json.dump({"count": self.count, "dim": self.dim or settings.EMBEDDINGS_DIM, "created_at": time.time()}, f)
+        try:
+            os.rename(self.tmp_dir, self.final_dir)
+        except OSError:
+            # Otro worker publicó la misma entrada
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        evict()
+
+    def abort(self):
+        self._texts.close()
+        self._vectors.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def _dir_size(path: str) -> int:
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+
+def evict(max_bytes: Optional[int] = None):
+    """
+    Expulsa las entradas menos usadas hasta quedar bajo PARSE_CACHE_MAX_MB.
+    """
+    max_bytes = max_bytes if max_bytes is not None else settings.PARSE_CACHE_MAX_MB * 2**20
+    root = settings.PARSE_CACHE_DIR
+    if not os.path.isdir(root):
+        return
+
+    entries = []
+    now = time.time()
+    for shard in os.scandir(root):
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            if not entry.is_dir():
+                continue
+            if ".tmp-" in entry.name:
+                if now - entry.stat().st_mtime > STALE_TMP_S:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    log.info(f"🧹 Parse cache: eliminado temporal huérfano {entry.name}")
+                continue
+            entries.append((entry.stat().st_mtime, _dir_size(entry.path), entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        log.info(f"🧹 Parse cache: expulsada {os.path.basename(path)} ({size / 2**20:.1f} MB)")
@@ -0,0 +1,215 @@
+# backend/services/rebuild.py
+
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, Callable, List, Set
+from pymilvus import Collection, utility
+from core.config import settings
+from services.embeddings import get_embeddings
+from services.indexing import _connect, SCHEMA_VERSION, physical_name, resolve_collection_name, create_physical_collection
+from services.index_params import invalidate_index_cache
+from services.write_coordinator import write_coordinator
+from services import chunk_store
+
+log = logging.getLogger(__name__)
+
+FIELDS = ["chunk_id", "doc_id", "text", "metadata", "user_id", "embedding"]
+
+# Estado de la reconstrucción en curso (un proceso = una reconstrucción a la vez)
+_state: Dict[str, Any] = {"status": "idle"}
+_lock = asyncio.Lock()
+
+# Pasadas de puesta al día antes de rendirse si los conteos no cuadran
+MAX_CATCHUP_PASSES = 3
+
+
+def get_rebuild_status() -> Dict[str, Any]:
+    state = dict(_state)
+    if state.get("status") == "running" and state.get("started_at"):
+        elapsed = time.time() - state["_t0"]
+        state["elapsed_s"] = round(elapsed, 1)
+        state["throughput_chunks_s"] = round(state.get("copied", 0) / max(elapsed, 1e-6), 1)
+    state.pop("_t0", None)
+    return state
+
+
+async def copy_chunks(
+    source: Collection,
+    target: Collection,
+    batch_size: int = 1000,
+    reembed: bool = False,
+    on_batch: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Copia los chunks de `source` a `target` por lotes (upsert idempotente).
+    Con `reembed=True` recalcula los vectores a partir del texto almacenado.
+    Si `source` aún guarda el texto (esquema v2), lo vuelca al chunk store.
+    """
+    fields = _source_fields(source, reembed)
+    iterator = await asyncio.to_thread(
+        source.query_iterator, batch_size=batch_size, expr="chunk_id != ''",
+        output_fields=fields, consistency_level="Strong",
+    )
+    copied = 0
+    while True:
+        rows = await asyncio.to_thread(iterator.next)
+        if not rows:
+            iterator.close()
+            break
+        await _copy_rows(rows, source, target, reembed)
+        copied += len(rows)
+        if on_batch:
+            on_batch(copied)
+    await asyncio.to_thread(target.flush)
+    return copied
+
+
+def _source_fields(source: Collection, reembed: bool) -> List[str]:
+    source_fields = {f.name for f in source.schema.fields}
+    return [f for f in FIELDS if f in source_fields and not (reembed and f == "embedding")]
+
+
+async def _copy_rows(rows: List[Dict[str, Any]], source: Collection, target: Collection, reembed: bool):
+    legacy = any(f.name == "text" for f in source.schema.fields)
+    target_fields = [f.name for f in target.schema.fields]
+    if legacy:
+        await chunk_store.save_chunks(rows)
+    if reembed:
+        if legacy:
+            texts = [r["text"] for r in rows]
+        else:
+            stored = await chunk_store.fetch_texts([r["chunk_id"] for r in rows])
+            texts = [stored.get(r["chunk_id"], "") for r in rows]
+        vectors = await get_embeddings(texts, input_type="passage")
+        for r, vector in zip(rows, vectors):
+            r["embedding"] = vector
+    await asyncio.to_thread(target.upsert, [{f: r[f] for f in target_fields} for r in rows])
+
+
+async def _chunk_ids(col: Collection, batch_size: int = 10000) -> Set[str]:
+    iterator = await asyncio.to_thread(
+        col.query_iterator, batch_size=batch_size, expr="chunk_id != ''",
+        output_fields=["chunk_id"], consistency_level="Strong",
+    )
+    ids: Set[str] = set()
+    while True:
+        rows = await asyncio.to_thread(iterator.next)
+        if not rows:
+            iterator.close()
+            return ids
+        ids.update(r["chunk_id"] for r in rows)
+
+
+async def _count(col: Collection) -> int:
+    result = await asyncio.to_thread(col.query, expr="", output_fields=["count(*)"], consistency_level="Strong")
+    return int(result[0]["count(*)"])
+
+
+async def catch_up(source: Collection, target: Collection, batch_size: int = 1000, reembed: bool = False) -> Dict[str, int]:
+    """
+    Pone la sombra al día con la fuente comparando chunk_ids: copia los que
+    faltan y borra los que sobran (p. ej. un delete que llegó mientras la
+    copia tenía la fila en memoria). Las escrituras concurrentes ya se
+    duplican en la sombra (indexing.mirrored_write); se lee la sombra antes
+    que la fuente para no borrar una fila recién escrita en ambas.
+    """
+    target_ids = await _chunk_ids(target)
+    source_ids = await _chunk_ids(source)
+    missing = sorted(source_ids - target_ids)
+    extra = sorted(target_ids - source_ids)
+
+    fields = _source_fields(source, reembed)
+    for i in range(0, len(missing), batch_size):
+        ids_str = "', '".join(missing[i:i + batch_size])
+        rows = await asyncio.to_thread(
+            source.query, expr=f"chunk_id in ['{ids_str}']", output_fields=fields, consistency_level="Strong",
+        )
+        if rows:
+            await _copy_rows(rows, source, target, reembed)
+    for i in range(0, len(extra), batch_size):
+        ids_str = "', '".join(extra[i:i + batch_size])
+        await asyncio.to_thread(target.delete, f"chunk_id in ['{ids_str}']")
+    return {"missing": len(missing), "extra": len(extra)}
+
+
+async def rebuild_collection(reembed: bool = False, batch_size: int = 1000, keep_old: bool = False):
+    """
+    Reconstrucción sin downtime:
+    1. Crea una colección sombra versionada.
+    2. La repuebla desde la colección activa (vectores guardados o re-embedding)
+       mientras las escrituras nuevas se duplican en ella (marca en Redis).
+    3. Pasada de puesta al día hasta que los conteos de fuente y sombra cuadran.
+    4. Repunta el alias MILVUS_COLLECTION de forma atómica. La fuente solo se
+       borra si los conteos cuadraron; si no, la reconstrucción falla sin tocarla.
+    """
+    if _lock.locked():
+        raise RuntimeError("Ya hay una reconstrucción en curso")
+
+    async with _lock:
+        _connect()
+        alias = settings.MILVUS_COLLECTION
+        shadow = f"{physical_name(SCHEMA_VERSION)}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+        _state.clear()
+        _state.update({
+            "status": "running", "stage": "creating", "source": None, "shadow": shadow,
+            "reembed": reembed, "copied": 0, "total": 0,
+            "started_at": datetime.utcnow().isoformat(), "_t0": time.time(),
+        })
+
+        try:
+            source_name = await asyncio.to_thread(resolve_collection_name, alias)
+            source = Collection(source_name)
+            await asyncio.to_thread(source.load)
+            _state.update({"source": source_name, "total": source.num_entities})
+
+            target = await asyncio.to_thread(create_physical_collection, shadow, source.num_entities)
+            await write_coordinator.set_rebuild_target(shadow)
+
+            _state["stage"] = "copying"
+            copied = await copy_chunks(source, target, batch_size, reembed, on_batch=lambda n: _state.update(copied=n))
+
+            _state["stage"] = "catching_up"
+            for attempt in range(1, MAX_CATCHUP_PASSES + 1):
+                diff = await catch_up(source, target, batch_size, reembed)
+                source_count, target_count = await _count(source), await _count(target)
+                _state.update(catch_up=diff, source_count=source_count, target_count=target_count)
+                log.info(f"🔁 Puesta al día {attempt}: {diff}, fuente={source_count} sombra={target_count}")
+                if source_count == target_count:
+                    break
+            else:
+                raise RuntimeError(f"Los conteos no cuadran tras {MAX_CATCHUP_PASSES} pasadas "
+                                   f"(fuente={source_count}, sombra={target_count}); la fuente se conserva")
+
+            _state["stage"] = "swapping"
+            if source_name == alias:
+                # Colección v1 sin alias: se renombra para liberar el nombre
+                await asyncio.to_thread(utility.rename_collection, alias, f"{alias}_v1")
+                source_name = f"{alias}_v1"
+                await asyncio.to_thread(utility.create_alias, collection_name=shadow, alias=alias)
+            else:
+                await asyncio.to_thread(utility.alter_alias, collection_name=shadow, alias=alias)
+            invalidate_index_cache(alias)
+            await write_coordinator.set_rebuild_target(None)
+
+            if not keep_old:
+                _state["stage"] = "dropping_old"
+                await asyncio.to_thread(utility.drop_collection, source_name)
+
+            _state.update({"status": "completed", "stage": "done", "copied": copied,
+                           "finished_at": datetime.utcnow().isoformat()})
+            log.info(f"✅ Rebuild completado: {alias} -> {shadow} ({copied} chunks)")
+
+        except Exception as e:
+            log.error(f"❌ Error en rebuild de {alias}: {e}")
+            _state.update({"status": "failed", "error": str(e), "finished_at": datetime.utcnow().isoformat()})
+            try:
+                await write_coordinator.set_rebuild_target(None)
+            except Exception as marker_error:
+                log.error(f"⚠️ Error quitando la marca de reconstrucción: {marker_error}")
+            try:
+                if utility.has_collection(shadow) and resolve_collection_name(alias) != shadow:
+                    utility.drop_collection(shadow)
+            except Exception as cleanup_error:
+                log.error(f"⚠️ Error limpiando colección sombra {shadow}: {cleanup_error}")
@@ -1,68 +1,198 @@
 # app/services/retrieval.py
 
+import asyncio
 import logging
-from typing import List, Dict, Any
+import numpy as np
+from typing import List, Dict, Any, Optional, AsyncIterator
 from pymilvus import connections, Collection
+from pymilvus.exceptions import MilvusException
 from sympy.geometry import entity
 from core.config import settings
 from services.embeddings import get_embeddings
+from services.index_params import build_search_params, invalidate_index_cache
+from services.write_coordinator import write_coordinator
+from services import chunk_store
 
 log = logging.getLogger(__name__)
 
 def _connect():
     connections.connect("default", host=settings.MILVUS_HOST, port=settings.MILVUS_PORT)
 
+# La colección se carga una vez por proceso y no se libera por petición:
+# release() la descarga de los query nodes para todas las búsquedas en curso.
+_loaded = False
+
 def _get_collection() -> Collection:
+    global _loaded
     _connect()
-    return Collection(settings.MILVUS_COLLECTION)
+    collection = Collection(settings.MILVUS_COLLECTION)
+    if not _loaded:
+        collection.load()
+        _loaded = True
+    return collection
+
+def exact_score(query: List[float], vector: List[float]) -> float:
+    """
+    Score exacto con los vectores originales, en la misma convención que
+    devuelve Milvus para la métrica configurada.
+    """
+    q = np.asarray(query, dtype=np.float32)
+    v = np.asarray(vector, dtype=np.float32)
+    metric = settings.MILVUS_METRIC.upper()
+    if metric == "L2":
+        return float(((q - v) ** 2).sum())
+    if metric == "COSINE":
+        return float(q @ v / max(np.linalg.norm(q) * np.linalg.norm(v), 1e-12))
+    return float(q @ v)
+
+def _search(
+    collection: Collection,
+    vectors: List[List[float]],
+    limit: int,
+    search_params: Optional[Dict[str, Any]] = None,
+    consistency_level: Optional[str] = None,
+):
+    """
+    Búsqueda ANN común. Con MILVUS_RESCORE se piden más candidatos y se
+    recalcula su score con el vector original (útil con índices cuantizados).
+    Es bloqueante: se llama con asyncio.to_thread.
+    """
+    rescore = settings.MILVUS_RESCORE
+    candidates = limit * (settings.MILVUS_RESCORE_FACTOR if rescore else 1)
+    output_fields = ["doc_id", "chunk_id", "user_id"]
+    if rescore:
+        output_fields.append("embedding")
+
+    def search():
+        return collection.search(
+            data=vectors,
+            anns_field="embedding",
+            param=build_search_params(collection, candidates, search_params),
+            limit=candidates,
+            output_fields=output_fields,
+            consistency_level=consistency_level or settings.MILVUS_CONSISTENCY_LEVEL,
+        )
+
+    try:
+        results = search()
+    except MilvusException as e:
+        # El índice pudo cambiar en otro proceso (p. ej. IVF -> HNSW) o la colección
+        # quedó descargada (reinicio de Milvus): se re-describe, se carga y se reintenta una vez
+        log.warning(f"⚠️ Búsqueda rechazada por Milvus ({e}); re-describiendo el índice de {collection.name}")
+        invalidate_index_cache(collection.name)
+        collection.load()
+        results = search()
+    if not rescore:
+        return [[(hit, hit.score) for hit in hits] for hits in results]
+
+    return [
+        [(hit, exact_score(query, hit.entity.get('embedding'))) for hit in hits]
+        for query, hits in zip(vectors, results)
+    ]
+
+def _filter_hits(scored_hits, user_id: str) -> List[Dict[str, Any]]:
+    """
+    Aplica el filtro de acceso (PUBLIC o dueño) sobre los hits de una
+    consulta y los devuelve ordenados por score (sin texto todavía).
+    """
+    filtered_docs = []
+    for hit, score in scored_hits:
+        doc_user_id = hit.entity.get('user_id')
+
+        # Verificar permisos
+        if doc_user_id == "PUBLIC" or (user_id and doc_user_id == user_id):
+            filtered_docs.append({
+                'doc_id': hit.entity.get('doc_id'),
+                'chunk_id': hit.entity.get('chunk_id'),
+                'user_id': doc_user_id,
+                'score': score,
+            })
+
+    # Ordenar por score (en L2 menor distancia = mejor)
+    filtered_docs.sort(key=lambda x: x['score'], reverse=settings.MILVUS_METRIC.upper() != "L2")
+    return filtered_docs
 
-async def retrieve_context(query: str, user_id: str):
-    collection = _get_collection()
-    collection.load()
+async def _hydrate(candidates: List[List[Dict[str, Any]]], limit: int) -> List[List[Dict[str, Any]]]:
+    """
+    Completa texto y metadata de los candidatos de todas las consultas con una
+    sola lectura a PostgreSQL, descarta los de documentos inactivos y corta en `limit`.
+    """
+    rows = await chunk_store.fetch_chunks(c['chunk_id'] for hits in candidates for c in hits)
+    hydrated = []
+    for hits in candidates:
+        final = []
+        for c in hits:
+            row = rows.get(c['chunk_id'])
+            if row is None:
+                continue
+            final.append({**c, 'text': row['text'], 'metadata': row['metadata']})
+            if len(final) == limit:
+                break
+        hydrated.append(final)
+    return hydrated
+
+async def retrieve_context(
+    query: str,
+    user_id: str,
+    search_params: Optional[Dict[str, Any]] = None,
+    vector: Optional[List[float]] = None,
+):
+    """
+    `vector` permite reutilizar el embedding de la pregunta ya calculado
+    (p. ej. compartido con la búsqueda en la memoria semántica).
+    """
+    collection = await asyncio.to_thread(_get_collection)
     
     log.info(f"Retrieval from milvus schema '{collection.name}' with user '{user_id}'")
     
     # Fase 1: Búsqueda semántica sin filtros
-    vectors = await get_embeddings([query], input_type="query")  # << aquí
-    search_params = {"metric_type": settings.MILVUS_METRIC, "params": {"nprobe": 16}}    
+    vectors = [vector] if vector is not None else await get_embeddings([query], input_type="query")
     log.info(f"Vectors: {len(vectors)}")
     
     # Buscar más resultados de los necesarios para tener margen
     limit = settings.MILVUS_TOP_K
-    initial_results = collection.search(
-        data=vectors,
-        anns_field="embedding",
-        param=search_params,
-        limit=limit*3,
-        output_fields=["doc_id", "chunk_id", "text", "user_id", "metadata"]
-    )
+    consistency = await write_coordinator.consistency_for(user_id)
+    initial_results = await asyncio.to_thread(_search, collection, vectors, limit*3, search_params, consistency)
     log.info(f"Inital results: {len(initial_results)}")
         
-    # Fase 2: Filtrar por acceso Y estado del documento
-    filtered_docs = []
-    for hits in initial_results:
-        for hit in hits:
-            
-            doc_user_id = hit.entity.get('user_id')            
-            metadata = hit.entity.get('metadata', {})
-            document_status = metadata.get('document_status', 'active')  # ← NUEVO: obtener estado
-
-            # Verificar permisos Y que el documento esté activo
-            if (doc_user_id == "PUBLIC" or (user_id and doc_user_id == user_id)) and document_status == "active":
-                filtered_docs.append({
-                    'doc_id': hit.entity.get('doc_id'),
-                    'chunk_id': hit.entity.get('chunk_id'),
-                    'text': hit.entity.get('text'),
-                    'user_id': doc_user_id,
-                    'score': hit.score,
-                    'metadata': metadata
-                })
-
-    # Ordenar por score y limitar
-    filtered_docs.sort(key=lambda x: x['score'], reverse=True)
-    final_results = filtered_docs[:limit]    
-    
-    collection.release()
+    # Fase 2: Filtrar por acceso; Fase 3: hidratar texto y descartar documentos inactivos
+    candidates = [_filter_hits(scored_hits, user_id) for scored_hits in initial_results]
+    final_results = []
+    for hits in await _hydrate(candidates, limit):
+        final_results.extend(hits)
 
     log.info(f"Final results: {len(final_results)}")
-    return final_results
\ No newline at end of file
+    return final_results
+
+async def retrieve_context_batch(
+    queries: List[str],
+    user_id: str,
+    top_k: Optional[int] = None,
+    search_params: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Recupera contexto para varias preguntas a la vez:
+    - Un solo llamado de embeddings para todas las preguntas.
+    - Una sola búsqueda multi-vector en Milvus.
+    - Produce (yield) los resultados filtrados por ACL pregunta por pregunta.
+    """
+    collection = await asyncio.to_thread(_get_collection)
+
+    log.info(f"Batch retrieval from milvus schema '{collection.name}' with user '{user_id}', queries={len(queries)}")
+
+    vectors = await get_embeddings(queries, input_type="query")
+    if len(vectors) != len(queries):
+        raise RuntimeError(f"Embeddings incompletos: {len(vectors)} de {len(queries)} preguntas")
+
+    limit = top_k or settings.MILVUS_TOP_K
+    consistency = await write_coordinator.consistency_for(user_id)
+    results = await asyncio.to_thread(_search, collection, vectors, limit*3, search_params, consistency)
+
+    hydrated = await _hydrate([_filter_hits(scored_hits, user_id) for scored_hits in results], limit)
+
+    for i, hits in enumerate(hydrated):
+        yield {
+            "index": i,
+            "query": queries[i],
+            "results": hits,
+        }
\ No newline at end of file
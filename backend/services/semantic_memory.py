@@ -0,0 +1,184 @@
+# backend/services/semantic_memory.py
+
+import time
+import uuid
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional
+from pymilvus import Collection, CollectionSchema, FieldSchema, DataType, connections, utility
+from sqlalchemy import select
+from core.config import settings
+from services.db import AsyncReadSessionLocal, ChatMessage
+from services.embeddings import get_embeddings
+from services.index_params import build_index_params, build_search_params
+from services.chunking import count_tokens
+from services.write_coordinator import write_coordinator
+from services import metrics
+
+log = logging.getLogger(__name__)
+
+_collection: Optional[Collection] = None
+
+
+def memory_collection_name() -> str:
+    return settings.MILVUS_MEMORY_COLLECTION or f"{settings.MILVUS_COLLECTION}_memory"
+
+
+def ensure_memory_collection() -> Collection:
+    """
+    Colección de memoria semántica: un vector por turno (pregunta + respuesta).
+    `user_id` es partition key, así la búsqueda filtrada por usuario solo toca
+    su partición. El texto no se guarda aquí: se hidrata desde chat_messages.
+    """
+    global _collection
+    if _collection is not None:
+        return _collection
+
+    connections.connect("default", host=settings.MILVUS_HOST, port=settings.MILVUS_PORT)
+    name = memory_collection_name()
+    if utility.has_collection(name):
+        col = Collection(name)
+    else:
+        schema = CollectionSchema(fields=[
+            FieldSchema(name="turn_id", dtype=DataType.VARCHAR, is_primary=True, max_length=64),  # id del mensaje del usuario
+            FieldSchema(name="answer_id", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="user_id", dtype=DataType.VARCHAR, max_length=128, is_partition_key=True),
+            FieldSchema(name="chat_id", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="created_at", dtype=DataType.INT64),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=settings.EMBEDDINGS_DIM),
+        ], description="AltheIA semantic chat memory")
+        col = Collection(name=name, schema=schema, num_partitions=settings.MEMORY_NUM_PARTITIONS)
+        col.create_index(field_name="embedding", index_params=build_index_params(index_type="HNSW"))
+        col.create_index(field_name="chat_id", index_name="chat_id_idx", index_params={"index_type": "INVERTED"})
+        log.info(f"Memory collection {name} creada")
+    col.load()
+    _collection = col
+    return col
+
+
+def turn_text(question: str, answer: str) -> str:
+    return f"user: {question}\nassistant: {answer}"[:settings.MEMORY_TURN_MAX_CHARS]
+
+
+async def recall_turns(user_id: str, vector: List[float], exclude_chat_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Turnos pasados del usuario más parecidos a la pregunta (vector ya
+    calculado), hidratados desde PostgreSQL y recortados a MEMORY_RECALL_MAX_TOKENS.
+    """
+    if settings.MEMORY_RECALL_TOP_K <= 0:
+        return []
+    t0 = time.perf_counter()
+    col = await asyncio.to_thread(ensure_memory_collection)
+    expr = f'user_id == "{user_id}"'
+    if exclude_chat_id:
+        expr += f' and chat_id != "{exclude_chat_id}"'
+    top_k = settings.MEMORY_RECALL_TOP_K
+    results = await asyncio.to_thread(
+        col.search,
+        data=[vector],
+        anns_field="embedding",
+        param=build_search_params(col, top_k),
+        limit=top_k,
+        expr=expr,
+        output_fields=["answer_id", "chat_id"],
+    )
+
+    higher_is_better = settings.MILVUS_METRIC.upper() != "L2"
+    hits = [
+        h for h in results[0]
+        if not higher_is_better or h.score >= settings.MEMORY_RECALL_MIN_SCORE
+    ]
+    if not hits:
+        return []
+
+    ids = [uuid.UUID(h.id) for h in hits] + [uuid.UUID(h.entity.get("answer_id")) for h in hits]
+    async with AsyncReadSessionLocal() as db:  # turnos de otros chats: tolera retraso de la réplica
+        rows = (await db.execute(
+            select(ChatMessage.id, ChatMessage.content, ChatMessage.timestamp).where(ChatMessage.id.in_(ids))
+        )).all()
+    by_id = {str(r.id): r for r in rows}
+
+    turns, used = [], 0
+    for h in hits:
+        question, answer = by_id.get(h.id), by_id.get(h.entity.get("answer_id"))
+        if question is None or answer is None:
+            continue  # chat borrado o archivado
+        tokens = count_tokens(question.content) + count_tokens(answer.content)
+        if used + tokens > settings.MEMORY_RECALL_MAX_TOKENS:
+            break
+        used += tokens
+        turns.append({
+            "chat_id": h.entity.get("chat_id"),
+            "question": question.content,
+            "answer": answer.content,
+            "timestamp": question.timestamp.isoformat(),
+            "score": h.score,
+        })
+    metrics.observe("memory_recall_ms", (time.perf_counter() - t0) * 1000)
+    return turns
+
+
+async def forget_chat(chat_id: str):
+    col = await asyncio.to_thread(ensure_memory_collection)
+    await asyncio.to_thread(col.delete, f'chat_id == "{chat_id}"')
+
+
+class MemoryIndexer:
+    """
+    Embebe los turnos terminados fuera del camino de la petición, en lotes
+    (una llamada de embeddings por lote), y los inserta en la colección de memoria.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def submit(self, user_id: str, chat_id, question_id, answer_id, question: str, answer: str):
+        if settings.MEMORY_RECALL_TOP_K <= 0 or not answer.strip():
+            return
+        self._queue.put_nowait({
+            "turn_id": str(question_id),
+            "answer_id": str(answer_id),
+            "user_id": user_id,
+            "chat_id": str(chat_id),
+            "created_at": int(time.time()),
+            "text": turn_text(question, answer),
+        })
+        metrics.set_gauge("memory_index_queue_depth", self._queue.qsize())
+
+    async def _index(self, batch: List[Dict[str, Any]]):
+        vectors = await get_embeddings([t["text"] for t in batch], input_type="passage")
+        col = await asyncio.to_thread(ensure_memory_collection)
+        rows = [{**{k: v for k, v in t.items() if k != "text"}, "embedding": vector} for t, vector in zip(batch, vectors)]
+        await asyncio.to_thread(col.upsert, rows)
+        await write_coordinator.after_write(col, len(rows))
+        metrics.observe("memory_index_batch_size", len(rows))
+
+    def _take(self) -> List[Dict[str, Any]]:
+        batch = []
+        while not self._queue.empty() and len(batch) < settings.MEMORY_EMBED_BATCH:
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def run(self):
+        try:
+            while True:
+                batch = [await self._queue.get()]
+                await asyncio.sleep(settings.MEMORY_INDEX_DELAY_S)  # juntar turnos de varias peticiones
+                batch += self._take()
+                metrics.set_gauge("memory_index_queue_depth", self._queue.qsize())
+                try:
+                    await self._index(batch)
+                except Exception as e:
+                    log.error(f"❌ Error indexando {len(batch)} turnos en la memoria semántica: {e}")
+        except asyncio.CancelledError:
+            # Al apagar: intento final con lo pendiente
+            pending = self._take()
+            if pending:
+                try:
+                    await self._index(pending)
+                except Exception as e:
+                    log.error(f"❌ Se perdieron {len(pending)} turnos sin indexar: {e}")
+            raise
+
+
+memory_indexer = MemoryIndexer()
@@ -0,0 +1,118 @@
+# backend/services/summarizer.py
+
+import asyncio
+import logging
+import uuid
+from typing import Set
+from sqlalchemy import select, update, tuple_
+from core.config import settings
+from services.db import AsyncSessionLocal, ChatSession, ChatMessage
+from services.inference import call_llm
+from services import metrics
+
+log = logging.getLogger(__name__)
+
+
+async def summarize_session(chat_id: str) -> bool:
+    """
+    Compacta en el resumen acumulado de la sesión los mensajes posteriores al
+    último resumido que ya no caben en la ventana cruda del prompt (ver
+    services/conversation.memory_window). Entonces deja en crudo como mucho
+    SUMMARY_KEEP_MESSAGES mensajes y MEMORY_MAX_TOKENS - SUMMARY_TRIGGER_TOKENS
+    tokens, para que el siguiente resumen tarde unos turnos. La sesión de BD
+    no se mantiene abierta durante la llamada al LLM. Devuelve True si
+    actualizó el resumen.
+    """
+    from core.graph import render_prompt
+    from services.conversation import memory_window, budget_memory
+
+    chat_uuid = uuid.UUID(str(chat_id))
+    async with AsyncSessionLocal() as db:
+        session = (await db.execute(
+            select(ChatSession.summary, ChatSession.summary_until, ChatSession.summary_until_id)
+            .where(ChatSession.id == chat_uuid)
+        )).one_or_none()
+        if session is None:
+            return False
+
+        # Solo mensajes nuevos (posteriores al cursor del resumen), en orden cronológico
+        query = select(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.timestamp).where(ChatMessage.chat_id == chat_uuid)
+        if session.summary_until is not None:
+            query = query.where(tuple_(ChatMessage.timestamp, ChatMessage.id) > tuple_(session.summary_until, session.summary_until_id))
+        rows = (await db.execute(
+            query.order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+            .limit(settings.SUMMARY_MAX_NEW_MESSAGES + settings.MEMORY_WINDOW)
+        )).all()
+
+    messages = [{"role": m.role, "content": m.content or ""} for m in rows]
+    if len(memory_window(messages)) == len(messages):
+        return False  # todo lo posterior al cursor está en la ventana cruda
+
+    keep_tokens = max(settings.MEMORY_MAX_TOKENS - settings.SUMMARY_TRIGGER_TOKENS, 0)
+    keep = budget_memory(messages[-settings.SUMMARY_KEEP_MESSAGES:], keep_tokens) if settings.SUMMARY_KEEP_MESSAGES > 0 else []
+    pending = rows[:len(rows) - len(keep)]
+    if not pending:
+        return False
+
+    prompt = render_prompt(
+        "summary.j2",
+        summary=session.summary,
+        messages=[{"role": m.role, "content": m.content} for m in pending],
+        max_words=settings.SUMMARY_MAX_WORDS,
+    )
+    summary = (await call_llm(prompt)).strip()
+
+    last = pending[-1]
+    # Update condicional: si otro proceso avanzó el cursor, se descarta este resumen.
+    # updated_at se conserva para no reordenar la lista de chats.
+    cursor_unchanged = (
+        ChatSession.summary_until.is_(None) if session.summary_until is None
+        else tuple_(ChatSession.summary_until, ChatSession.summary_until_id) == tuple_(session.summary_until, session.summary_until_id)
+    )
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(ChatSession)
+            .where(ChatSession.id == chat_uuid, cursor_unchanged)
+            .values(summary=summary, summary_until=last.timestamp, summary_until_id=last.id, updated_at=ChatSession.updated_at)
+        )
+        await db.commit()
+
+    if result.rowcount:
+        metrics.incr("chat_summaries")
+        metrics.observe("chat_summary_messages", len(pending))
+        log.info(f"📝 Resumen de {chat_id} actualizado con {len(pending)} mensajes")
+    return bool(result.rowcount)
+
+
+class Summarizer:
+    """
+    Cola en proceso de sesiones por resumir, fuera del camino de la petición.
+    Las solicitudes repetidas de una misma sesión se agrupan.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: Set[str] = set()
+
+    def schedule(self, chat_id: str):
+        chat_id = str(chat_id)
+        if chat_id in self._pending:
+            return
+        self._pending.add(chat_id)
+        self._queue.put_nowait(chat_id)
+        metrics.set_gauge("chat_summary_queue_depth", self._queue.qsize())
+
+    async def run(self):
+        while True:
+            chat_id = await self._queue.get()
+            self._pending.discard(chat_id)
+            metrics.set_gauge("chat_summary_queue_depth", self._queue.qsize())
+            try:
+                # Varias pasadas si el atraso supera SUMMARY_MAX_NEW_MESSAGES
+                while await summarize_session(chat_id):
+                    pass
+            except Exception as e:
+                log.error(f"❌ Error resumiendo la sesión {chat_id}: {e}")
+
+
+summarizer = Summarizer()
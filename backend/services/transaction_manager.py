@@ -6,16 +6,73 @@ from datetime import datetime
 from typing import Dict, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update
+from sqlalchemy import update, func
+from sqlalchemy.exc import IntegrityError
 from services.db import UploadTransaction, Document, DocumentVersion
 from services.indexing import delete_docs
 
 log = logging.getLogger(__name__)
 
+# Índice único parcial de la migración 6: un solo documento activo por (user_id, file_hash)
+ACTIVE_DOCUMENT_INDEX = "uq_documents_user_file_hash_active"
+
+class DuplicateDocumentError(Exception):
+    """Otro job registró antes el mismo archivo como documento activo del usuario."""
+
+    def __init__(self, existing_doc_id: str):
+        super().__init__(f"Documento duplicado de {existing_doc_id}")
+        self.existing_doc_id = existing_doc_id
+
+def _as_uuid(value) -> Optional[uuid.UUID]:
+    """UUID del valor, o None si no es un UUID válido (ids que vienen de la URL)."""
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+# Sentencias compartidas con scripts/check_query_plans.py (EXPLAIN ANALYZE)
+def document_query(doc_uuid: uuid.UUID, for_update: bool = False):
+    query = select(Document).where(Document.id == doc_uuid)
+    return query.with_for_update() if for_update else query
+
+def job_query(job_id: uuid.UUID):
+    return select(UploadTransaction).where(UploadTransaction.id == job_id)
+
+def update_job_query(transaction_id, **values):
+    return (
+        update(UploadTransaction)
+        .where(UploadTransaction.id == transaction_id)
+        .values(**values, updated_at=datetime.utcnow())
+    )
+
+def active_document_query(user_id: str, file_hash: str):
+    return (
+        select(Document)
+        .where(Document.user_id == user_id, Document.file_hash == file_hash, Document.status == 'active')
+        .limit(1)
+    )
+
+def duplicate_report_query(limit: int = 100):
+    return (
+        select(
+            Document.file_hash,
+            func.count(Document.id).label("copies"),
+            func.count(func.distinct(Document.user_id)).label("users"),
+            func.sum(Document.chunks_count).label("total_chunks"),
+            func.max(Document.chunks_count).label("max_chunks"),
+            func.min(Document.original_filename).label("filename"),
+        )
+        .where(Document.status == 'active')
+        .group_by(Document.file_hash)
+        .having(func.count(Document.id) > 1)
+        .order_by((func.sum(Document.chunks_count) - func.max(Document.chunks_count)).desc())
+        .limit(limit)
+    )
+
 class TransactionManager:
     
-    async def begin_upload_transaction(self, db: AsyncSession, doc_id: str, user_id: str) -> str:
-        """Iniciar transacción distribuida para upload"""
+    async def begin_upload_transaction(self, db: AsyncSession, doc_id: str, user_id: str, status: str = 'pending', job: Optional[Dict] = None) -> str:
+        """Iniciar transacción distribuida para upload (o registrar un job de ingesta encolado)"""
         transaction_id = str(uuid.uuid4())
         
         # Registrar intento en PostgreSQL
@@ -23,7 +80,9 @@ class TransactionManager:
             id=transaction_id,
             doc_id=doc_id,
             user_id=user_id,
-            status='pending',
+            status=status,
+            stage='queued' if status == 'queued' else None,
+            job=job,
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow()
         )
@@ -46,7 +105,7 @@ class TransactionManager:
                 document_type=document_data.get("document_type", "user_private"),
                 status="active",
                 chunks_count=document_data["chunks_count"],
-                metadata=document_data.get("metadata", {})
+                doc_metadata=document_data.get("metadata", {})
             )
             db.add(document)
             
@@ -66,18 +125,81 @@ class TransactionManager:
             await db.execute(
                 update(UploadTransaction)
                 .where(UploadTransaction.id == transaction_id)
-                .values(status='completed', updated_at=datetime.utcnow())
+                .values(status='completed', stage='completed', updated_at=datetime.utcnow())
             )
             
             await db.commit()
             log.info(f"✅ Transacción completada: {transaction_id}")
             
+        except IntegrityError as e:
+            await db.rollback()
+            # Dos subidas del mismo archivo pasaron a la vez el chequeo previo: gana la primera en registrar
+            existing = None
+            if ACTIVE_DOCUMENT_INDEX in str(e.orig):
+                existing = await self.find_active_document(db, document_data["user_id"], document_data["file_hash"])
+            if existing is None:
+                log.error(f"❌ Error en commit_upload: {e}")
+                raise
+            log.info(f"♻️ Transacción {transaction_id}: el archivo ya está activo como {existing.id}")
+            raise DuplicateDocumentError(str(existing.id)) from e
+
         except Exception as e:
             await db.rollback()
             log.error(f"❌ Error en commit_upload: {e}")
             raise
     
-    async def rollback_upload(self, db: AsyncSession, transaction_id: str, doc_id: str):
+    async def commit_version(self, db: AsyncSession, transaction_id: str, document_id: str, file_hash: str, chunks_count: int, filename: str = None) -> int:
+        """Registrar una nueva versión de un documento existente"""
+        try:
+            doc_uuid = _as_uuid(document_id)
+            document = None
+            if doc_uuid is not None:
+                result = await db.execute(document_query(doc_uuid, for_update=True))
+                document = result.scalar_one_or_none()
+            if document is None:
+                raise LookupError(f"Documento {document_id} no encontrado")
+            new_version = (document.current_version or 1) + 1
+
+            document.current_version = new_version
+            document.file_hash = file_hash
+            document.chunks_count = chunks_count
+            document.last_updated = datetime.utcnow()
+            if filename:
+                document.original_filename = filename
+
+            db.add(DocumentVersion(
+                id=uuid.uuid4(),
+                document_id=document.id,
+                version=new_version,
+                file_hash=file_hash,
+                doc_id=document_id,
+                chunks_count=chunks_count,
+                created_at=datetime.utcnow()
+            ))
+
+            await db.execute(
+                update(UploadTransaction)
+                .where(UploadTransaction.id == transaction_id)
+                .values(status='completed', stage='completed', updated_at=datetime.utcnow())
+            )
+            await db.commit()
+            log.info(f"✅ Versión {new_version} registrada para doc {document_id}")
+            return new_version
+
+        except Exception as e:
+            await db.rollback()
+            log.error(f"❌ Error en commit_version: {e}")
+            raise
+
+    async def get_document(self, db: AsyncSession, document_id: str) -> Optional[Document]:
+        doc_uuid = _as_uuid(document_id)
+        if doc_uuid is None:
+            return None
+        result = await db.execute(document_query(doc_uuid))
+        return result.scalar_one_or_none()
+
+    async def rollback_upload(self, db: AsyncSession, transaction_id: str, doc_id: str, error: Optional[str] = None,
+                              status: str = "failed", progress: Optional[Dict] = None):
         """Revertir transacción fallida - eliminar chunks de Milvus"""
         try:
             # 1. Eliminar chunks de Milvus si se insertaron
@@ -88,18 +210,56 @@ class TransactionManager:
             log.error(f"⚠️  Error en rollback Milvus: {e}")
         
         try:
-            # 2. Marcar transacción como fallida
+            # 2. Marcar transacción como fallida (o duplicada)
+            values = {"status": status, "stage": status, "error": error, "updated_at": datetime.utcnow()}
+            if progress is not None:
+                values["progress"] = progress
             await db.execute(
                 update(UploadTransaction)
                 .where(UploadTransaction.id == transaction_id)
-                .values(status='failed', updated_at=datetime.utcnow())
+                .values(**values)
             )
             await db.commit()
-            log.info(f"🗑️  Transacción marcada como fallida: {transaction_id}")
+            log.info(f"🗑️  Transacción marcada como {status}: {transaction_id}")
             
         except Exception as e:
             log.error(f"⚠️  Error marcando transacción como fallida: {e}")
     
+    async def update_job(self, db: AsyncSession, transaction_id: str, **values):
+        """Actualizar estado / etapa / progreso de un job de ingesta"""
+        await db.execute(update_job_query(transaction_id, **values))
+        await db.commit()
+
+    async def get_job(self, db: AsyncSession, transaction_id: str) -> Optional[UploadTransaction]:
+        job_id = _as_uuid(transaction_id)
+        if job_id is None:
+            return None
+        result = await db.execute(job_query(job_id))
+        return result.scalar_one_or_none()
+
+    async def find_active_document(self, db: AsyncSession, user_id: str, file_hash: str) -> Optional[Document]:
+        """Documento activo del usuario con el mismo contenido (para evitar duplicados)"""
+        result = await db.execute(active_document_query(user_id, file_hash))
+        return result.scalar_one_or_none()
+
+    async def duplicate_storage_report(self, db: AsyncSession, limit: int = 100) -> Dict:
+        """Archivos activos repetidos entre usuarios y chunks redundantes en Milvus"""
+        result = await db.execute(duplicate_report_query(limit))
+        rows = result.all()
+        items = [{
+            "file_hash": r.file_hash,
+            "filename": r.filename,
+            "copies": r.copies,
+            "users": r.users,
+            "total_chunks": int(r.total_chunks or 0),
+            "redundant_chunks": int((r.total_chunks or 0) - (r.max_chunks or 0)),
+        } for r in rows]
+        return {
+            "duplicated_files": len(items),
+            "redundant_chunks": sum(i["redundant_chunks"] for i in items),
+            "items": items,
+        }
+
     async def check_transaction_exists(self, db: AsyncSession, transaction_id: str) -> bool:
         """Verificar si una transacción ya fue procesada"""
         result = await db.execute(
@@ -0,0 +1,114 @@
+# backend/services/write_coordinator.py
+
+import time
+import asyncio
+import logging
+from typing import Dict, Optional
+from pymilvus import Collection
+from core.config import settings
+from services.memory import redis_client
+from services import metrics
+
+log = logging.getLogger(__name__)
+
+RECENT_WRITE_KEY = "milvus:recent_write:{}"
+# Colección sombra de una reconstrucción en curso (services/rebuild.py): las escrituras se duplican en ella
+REBUILD_TARGET_KEY = "milvus:rebuild_target"
+
+
+class WriteCoordinator:
+    """
+    Centraliza la política de flush de Milvus y el read-your-writes.
+
+    MILVUS_FLUSH_POLICY:
+      - "auto":    no se llama flush; Milvus sella segmentos por tamaño/tiempo.
+      - "batched": flush cada MILVUS_FLUSH_INTERVAL s o al acumular MILVUS_FLUSH_MAX_ROWS filas.
+      - "always":  flush tras cada escritura (comportamiento anterior).
+
+    Los datos no sellados ya son buscables; el flush solo sella segmentos. Para
+    que quien acaba de escribir vea sus cambios (aunque lo haya hecho un worker
+    en otro proceso) se marca en Redis una escritura reciente por ACL y esas
+    búsquedas usan consistencia Strong durante MILVUS_RYW_WINDOW_S.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, int] = {}
+        self._collections: Dict[str, Collection] = {}
+        self._lock = asyncio.Lock()
+
+    async def after_write(self, col: Collection, rows: int, acl_user_id: Optional[str] = None):
+        if acl_user_id:
+            try:
+                await redis_client.set(RECENT_WRITE_KEY.format(acl_user_id), int(time.time()), ex=settings.MILVUS_RYW_WINDOW_S)
+            except Exception as e:
+                log.warning(f"⚠️ No se pudo marcar escritura reciente de {acl_user_id}: {e}")
+
+        policy = settings.MILVUS_FLUSH_POLICY
+        if policy == "always":
+            await self._flush(col)
+        elif policy == "batched":
+            self._collections[col.name] = col
+            self._pending[col.name] = self._pending.get(col.name, 0) + rows
+            metrics.set_gauge("milvus_unflushed_rows", sum(self._pending.values()))
+            if self._pending[col.name] >= settings.MILVUS_FLUSH_MAX_ROWS:
+                await self._flush(col)
+
+    async def _flush(self, col: Collection):
+        async with self._lock:
+            t0 = time.perf_counter()
+            await asyncio.to_thread(col.flush)
+            metrics.observe("milvus_flush_ms", (time.perf_counter() - t0) * 1000)
+            self._pending.pop(col.name, None)
+            metrics.set_gauge("milvus_unflushed_rows", sum(self._pending.values()))
+
+    async def flush_all(self):
+        for name in list(self._pending):
+            col = self._collections.get(name)
+            if col is not None:
+                try:
+                    await self._flush(col)
+                except Exception as e:
+                    log.error(f"❌ Error en flush de {name}: {e}")
+
+    async def run_periodic(self):
+        """Tarea de fondo para la política "batched"."""
+        try:
+            while True:
+                await asyncio.sleep(settings.MILVUS_FLUSH_INTERVAL)
+                if settings.MILVUS_FLUSH_POLICY == "batched":
+                    await self.flush_all()
+        except asyncio.CancelledError:
+            await self.flush_all()
+            raise
+
+    async def consistency_for(self, user_id: Optional[str]) -> str:
+        """
+        Strong si el usuario (o la base pública) escribió hace poco;
+        si no, el nivel configurado (Bounded por defecto).
+        """
+        keys = [RECENT_WRITE_KEY.format("PUBLIC")]
+        if user_id:
+            keys.append(RECENT_WRITE_KEY.format(user_id))
+        try:
+            if any(await redis_client.mget(keys)):
+                return "Strong"
+        except Exception as e:
+            log.warning(f"⚠️ No se pudo consultar escrituras recientes: {e}")
+            return "Strong"
+        return settings.MILVUS_CONSISTENCY_LEVEL
+
+    async def set_rebuild_target(self, name: Optional[str]):
+        if name:
+            await redis_client.set(REBUILD_TARGET_KEY, name)
+        else:
+            await redis_client.delete(REBUILD_TARGET_KEY)
+
+    async def rebuild_target(self) -> Optional[str]:
+        try:
+            return await redis_client.get(REBUILD_TARGET_KEY)
+        except Exception as e:
+            log.warning(f"⚠️ No se pudo consultar la reconstrucción en curso: {e}")
+            return None
+
+
+write_coordinator = WriteCoordinator()
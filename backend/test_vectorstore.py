@@ -41,10 +41,8 @@ def insert_dummy_vector():
         print(col.schema)
 
         entity = [            
+            ["doc_test-0"],               # chunk_id (PK)
             ["doc_test"],                 # doc_id
-            ["doc_test-0"],               # chunk_id
-            ["texto de prueba"],          # text
-            [{"source":"test"}],          # metadata
             ["PUBLIC"],                   # user_id
             [[0.1]*1024]                  # embedding
         ]
@@ -0,0 +1,41 @@
+# backend/tests/test_archiver.py
+
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from services.archiver import _pack, _unpack
+
+
+def _rows(n):
+    return [
+        SimpleNamespace(id=uuid.uuid4(), role="user" if i % 2 == 0 else "assistant",
+                        content=f"mensaje {i} con acentos: canción, año, ¿qué?", timestamp=datetime(2026, 1, 1, 12) + timedelta(seconds=i, microseconds=i))
+        for i in range(n)
+    ]
+
+
+def test_pack_unpack_round_trip():
+    chat_id = uuid.uuid4()
+    rows = _rows(5)
+    restored = _unpack(_pack(rows), chat_id)
+    assert restored == [
+        {"id": r.id, "chat_id": chat_id, "role": r.role, "content": r.content, "timestamp": r.timestamp}
+        for r in rows
+    ]
+
+
+def test_pack_compresses_repetitive_history():
+    rows = _rows(200)
+    raw = sum(len(r.content.encode("utf-8")) for r in rows)
+    assert len(_pack(rows)) < raw
+
+
+def test_pack_keeps_empty_and_null_content():
+    rows = _rows(2)
+    rows[0].content, rows[1].content = "", None
+    restored = _unpack(_pack(rows), uuid.uuid4())
+    assert [m["content"] for m in restored] == ["", None]
+
+
+def test_unpack_empty_archive():
+    assert _unpack(_pack([]), uuid.uuid4()) == []
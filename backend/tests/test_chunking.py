@@ -0,0 +1,63 @@
+# backend/tests/test_chunking.py
+
+import pytest
+from services.chunking import chunk_sentences, chunk_rows, chunk_words, count_tokens, escape_row
+
+
+LONG_SENTENCE = " ".join(["palabra,", "otra.", "(dato)", "x-y-z"] * 40)
+
+
+@pytest.mark.parametrize("max_tokens,overlap", [(50, 10), (20, 19), (8, 4)])
+def test_sentence_chunks_respect_token_budget(max_tokens, overlap):
+    text = f"Introducción breve. {LONG_SENTENCE}\n\nOtro párrafo corto. {LONG_SENTENCE}"
+    chunks = list(chunk_sentences([text], max_tokens, overlap))
+    assert chunks
+    assert all(count_tokens(c) <= max_tokens for c in chunks)
+
+
+def test_word_longer_than_budget_is_split_without_losing_text():
+    url = "https://example.com/" + "/".join(["seg"] * 30)
+    chunks = list(chunk_sentences([url], 10, 0))
+    assert all(count_tokens(c) <= 10 for c in chunks)
+    assert "".join(c.replace("\n", "").replace(" ", "") for c in chunks) == url
+
+
+def test_overlap_repeats_tail_of_previous_chunk():
+    text = " ".join(f"Oración número {i}." for i in range(30))
+    chunks = list(chunk_sentences([text], 12, 4))
+    assert len(chunks) > 1
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert nxt.split("\n")[0] in prev.split("\n")
+
+
+def test_heading_starts_new_chunk():
+    text = "Texto inicial del documento.\n# Sección dos\nContenido de la sección."
+    chunks = list(chunk_sentences([text], 100, 10))
+    assert chunks[1].startswith("# Sección dos")
+
+
+def test_rows_repeat_header_and_never_split_lines():
+    lines = ["# Hoja1 | a | b"] + [f"fila {i} | {i} | {i * 2}" for i in range(50)]
+    chunks = list(chunk_rows(["\n".join(lines)], 30))
+    assert len(chunks) > 1
+    assert all(c.startswith("Hoja1 | a | b") for c in chunks)
+    body = [line for c in chunks for line in c.split("\n")[1:]]
+    assert body == lines[1:]
+
+
+def test_rows_cap_oversized_header():
+    header = "# Hoja1: " + " | ".join(f"columna {i}" for i in range(40))
+    lines = [header] + [f"fila {i} | {i}" for i in range(20)]
+    chunks = list(chunk_rows(["\n".join(lines)], 30))
+    assert all(count_tokens(c) <= 30 for c in chunks)
+    assert len(chunks) < 20
+
+
+def test_rows_escaped_data_row_is_not_a_header():
+    lines = ["# Hoja1: # de pedido | total", escape_row("# de pedido 17 | 40"), "fila | 2"]
+    chunks = list(chunk_rows(["\n".join(lines)], 100))
+    assert chunks == ["Hoja1: # de pedido | total\n# de pedido 17 | 40\nfila | 2"]
+
+
+def test_words_chunker_handles_words_split_across_pieces():
+    assert list(chunk_words(["uno do", "s tres"], 2)) == ["uno dos", "tres"]
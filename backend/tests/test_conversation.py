@@ -0,0 +1,70 @@
+# backend/tests/test_conversation.py
+
+import uuid
+import pytest
+from datetime import datetime
+from services.chunking import count_tokens
+from services.conversation import encode_cursor, decode_cursor, encode_search_cursor, decode_search_cursor, budget_memory, memory_window
+
+
+def test_history_cursor_round_trip():
+    ts, row_id = datetime(2026, 3, 1, 12, 30, 5, 123456), uuid.uuid4()
+    cursor = encode_cursor(ts, row_id)
+    assert decode_cursor(cursor) == (ts, row_id)
+
+
+def test_history_cursor_is_url_safe():
+    cursor = encode_cursor(datetime(2026, 1, 1), uuid.uuid4())
+    assert all(c.isalnum() or c in "-_=" for c in cursor)
+
+
+def test_search_cursor_round_trip():
+    chat_id = uuid.uuid4()
+    assert decode_search_cursor(encode_search_cursor(0.0375, chat_id)) == (0.0375, chat_id)
+
+
+@pytest.mark.parametrize("cursor", ["", "no-es-base64!", "W10=", encode_search_cursor(0.5, uuid.uuid4())])
+def test_invalid_history_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("cursor", ["", "W10=", encode_cursor(datetime(2026, 1, 1), "no-uuid")])
+def test_invalid_search_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_search_cursor(cursor)
+
+
+def _msg(role, n):
+    return {"role": role, "content": " ".join(f"w{n}" for _ in range(n))}
+
+
+def test_budget_memory_keeps_most_recent_messages_within_budget():
+    history = [_msg("user", 40), _msg("assistant", 30), _msg("user", 20), _msg("assistant", 10)]
+    selected = budget_memory(history, max_tokens=35)
+    assert selected == history[2:]
+    assert sum(count_tokens(m["content"]) for m in selected) <= 35
+
+
+def test_budget_memory_stops_at_first_message_that_does_not_fit():
+    # No salta mensajes: un hueco en medio de la conversación confunde al modelo
+    history = [_msg("user", 1), _msg("assistant", 50), _msg("user", 5)]
+    assert budget_memory(history, max_tokens=10) == history[2:]
+
+
+def test_budget_memory_keeps_everything_that_fits_in_order():
+    history = [_msg("user", 3), _msg("assistant", 4)]
+    assert budget_memory(history, max_tokens=100) == history
+    assert budget_memory([], max_tokens=100) == []
+
+
+def test_budget_memory_drops_a_last_message_larger_than_the_budget():
+    assert budget_memory([_msg("user", 5), _msg("assistant", 50)], max_tokens=10) == []
+
+
+def test_memory_window_starts_after_the_summary_cursor():
+    ids = [str(uuid.uuid4()) for _ in range(4)]
+    history = [{**_msg("user", 2), "id": i} for i in ids]
+    assert memory_window(history, uuid.UUID(ids[1]), max_tokens=100) == history[2:]
+    # Cursor fuera de la ventana (o entradas sin id): todo es posterior al cursor
+    assert memory_window(history, uuid.uuid4(), max_tokens=100) == history
@@ -3,6 +3,7 @@ import uuid
 import streamlit as st
 from shared import utils
 from services.api import chat_with_bot, chat_with_bot_stream, rephrase_text
+from components.chats_user import load_older_messages
 
 
 def chat_interface():
@@ -10,6 +11,7 @@ def chat_interface():
     print(f"[START] Chat ID: {st.session_state.chat_id}")    
     #st.write("#### 🧠 Chat general (con documentos públicos o tus propios archivos)")
 
+    load_older_messages()
     for msg in st.session_state.chat_history:        
         st.chat_message(msg["role"]).markdown(msg["content"])
         
@@ -26,6 +28,9 @@ def chat_interface():
             st.session_state.chat_history.append({"role": "assistant", "content": answer}) 
             
             chat_id_from_backend = chat_response["chat_id"]
+            if st.session_state.chat_id != chat_id_from_backend:
+                st.session_state.pop("user_chats", None)  # chat nuevo: refrescar la lista
+                st.session_state.user_chats_stale = True
             st.session_state.chat_id = chat_id_from_backend
 
             
@@ -45,6 +50,7 @@ def chat_interface_stream():
     print(f"[START] Chat ID: {st.session_state.chat_id}")    
 
     # Mostrar historial de mensajes
+    load_older_messages()
     for msg in st.session_state.chat_history:        
         st.chat_message(msg["role"]).markdown(msg["content"])
     
@@ -83,6 +89,9 @@ def chat_interface_stream():
                     # Actualizar chat_id si viene en el primer chunk
                     if "chat_id" in chunk and not chat_id_from_backend:
                         chat_id_from_backend = chunk["chat_id"]
+                        if st.session_state.chat_id != chat_id_from_backend:
+                            st.session_state.pop("user_chats", None)  # chat nuevo: refrescar la lista
+                            st.session_state.user_chats_stale = True
                         st.session_state.chat_id = chat_id_from_backend
                     
                     # Acumular contenido
@@ -3,8 +3,13 @@ from services import api
 
 def get_user_chats():
     with st.sidebar.expander("💭 Mis Chats", expanded=False):
-        # --- Obtener chats ---
-        chats = api.get_user_chats()
+        # --- Obtener chats (primera página; se cachea entre reruns) ---
+        # Tras crear un chat se lee del primario: la réplica puede no verlo aún
+        if "user_chats" not in st.session_state:
+            page = api.get_user_chats_page(consistent=st.session_state.pop("user_chats_stale", False))
+            st.session_state.user_chats = page["sessions"]
+            st.session_state.user_chats_cursor = page["next_cursor"]
+        chats = st.session_state.user_chats
         if not chats:
             st.info("No hay chats anteriores")
             return
@@ -14,7 +19,9 @@ def get_user_chats():
         with col1:
             if st.button("✨ Nuevo", use_container_width=True, type="primary", help="Nuevo Chat"):
                 st.session_state.chat_history = []
+                st.session_state.history_cursor = None
                 st.session_state.chat_id = None
+                st.session_state.pop("user_chats", None)
                 st.session_state.new_chat_mode = True
                 st.rerun()
     
@@ -43,13 +50,72 @@ def get_user_chats():
             placeholder="Chats anteriores"
         )
 
+        # --- Más chats (siguiente página) ---
+        if st.session_state.get("user_chats_cursor"):
+            if st.button("Ver más chats", use_container_width=True):
+                page = api.get_user_chats_page(st.session_state.user_chats_cursor)
+                st.session_state.user_chats += page["sessions"]
+                st.session_state.user_chats_cursor = page["next_cursor"]
+                st.rerun()
+
         # --- Cargar chat seleccionado ---
         if selected_title:
-            chat_id = chat_options[selected_title]
-            if st.session_state.get("chat_id") != chat_id:
-                st.session_state.chat_id = chat_id
-                chats_data = api.get_chat_history(chat_id)
-                st.session_state.chat_history = chats_data["history"]
+            open_chat(chat_options[selected_title])
+
+        # --- Buscar en el historial ---
+        search_chats()
+
+
+def open_chat(chat_id: str):
+    if st.session_state.get("chat_id") != chat_id:
+        st.session_state.chat_id = chat_id
+        chats_data = api.get_chat_history(chat_id)
+        st.session_state.chat_history = chats_data["history"]
+        st.session_state.history_cursor = chats_data["next_cursor"]
+
+
+def search_chats():
+    """Buscador de chats por contenido (resultados por relevancia, con fragmento)."""
+    q = st.text_input("Buscar en mis chats", placeholder="🔎 Buscar en mis chats", label_visibility="collapsed")
+    if len(q.strip()) < 2:
+        return
+
+    # Nueva búsqueda: primera página; se conserva entre reruns mientras no cambie el texto
+    if st.session_state.get("chat_search_q") != q:
+        page = api.search_chats(q)
+        st.session_state.chat_search_q = q
+        st.session_state.chat_search_results = page["results"]
+        st.session_state.chat_search_cursor = page["next_cursor"]
+
+    results = st.session_state.chat_search_results
+    if not results:
+        st.caption("Sin coincidencias")
+        return
+
+    for hit in results:
+        if st.button(f"💬 {hit['title']}", key=f"search_{hit['session_id']}", use_container_width=True):
+            open_chat(hit["session_id"])
+            st.rerun()
+        st.caption(hit["snippet"])
+
+    if st.session_state.get("chat_search_cursor"):
+        if st.button("Más resultados", use_container_width=True):
+            page = api.search_chats(q, st.session_state.chat_search_cursor)
+            st.session_state.chat_search_results += page["results"]
+            st.session_state.chat_search_cursor = page["next_cursor"]
+            st.rerun()
+
+
+def load_older_messages():
+    """Botón para anteponer la página anterior del historial del chat abierto."""
+    cursor = st.session_state.get("history_cursor")
+    if not cursor or not st.session_state.get("chat_id"):
+        return
+    if st.button("⬆️ Mensajes anteriores", use_container_width=True):
+        data = api.get_chat_history(st.session_state.chat_id, before=cursor)
+        st.session_state.chat_history = data["history"] + st.session_state.chat_history
+        st.session_state.history_cursor = data["next_cursor"]
+        st.rerun()
 
 # Función para mostrar el panel de gestión (se llamará desde app.py)
 def show_chat_management_modal():
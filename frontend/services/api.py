@@ -98,14 +98,40 @@ def reset_vectorstore() -> bool:
     return r.json()
 
 
-def get_user_chats() -> List[Dict]:
+def get_user_chats_page(cursor: str = None, limit: int = 50, consistent: bool = False) -> Dict:
+    """
+    Página de chats: {"sessions": [...], "next_cursor": str | None}.
+    `consistent=True` la lee del primario (tras crear un chat).
+    """
     session = _session()
-    r = session.get(f"{BACKEND_URL}/chat/sessions", headers=_headers())
+    params = {"limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    if consistent:
+        params["consistent"] = "true"
+    r = session.get(f"{BACKEND_URL}/chat/sessions", params=params, headers=_headers())
     r.raise_for_status()
     return r.json()
 
-def get_chat_history(session_id: str) -> List[Dict]:
+def get_user_chats(limit: int = 50) -> List[Dict]:
+    return get_user_chats_page(limit=limit)["sessions"]
+
+def search_chats(q: str, cursor: str = None, limit: int = 20) -> Dict:
+    """Búsqueda en el historial: {"results": [...], "next_cursor": str | None}."""
+    session = _session()
+    params = {"q": q, "limit": limit}
+    if cursor:
+        params["cursor"] = cursor
+    r = session.get(f"{BACKEND_URL}/chat/search", params=params, headers=_headers())
+    r.raise_for_status()
+    return r.json()
+
+def get_chat_history(session_id: str, before: str = None, limit: int = 50) -> Dict:
+    """Mensajes más recientes (o anteriores a `before`): {"history": [...], "next_cursor": ...}."""
     session = _session()
-    r = session.get(f"{BACKEND_URL}/chat/history/{session_id}", headers=_headers())
+    params = {"limit": limit}
+    if before:
+        params["before"] = before
+    r = session.get(f"{BACKEND_URL}/chat/history/{session_id}", params=params, headers=_headers())
     r.raise_for_status()
     return r.json()    
\ No newline at end of file